@@ -0,0 +1,200 @@
+from typing import List, Optional
+
+from fastapi import FastAPI, HTTPException
+from fastapi.responses import PlainTextResponse, Response, StreamingResponse
+from pydantic import BaseModel, Field
+
+from batch import SERVICE_TAG_PATTERN, HostLimiter, RateBudget
+from cache import get_cache
+from dell_api import get_dell_drivers
+from endpoints import get_endpoint_selector
+from exports import bulk_export_name, export_markdown, iter_ndjson, iter_zip
+from jobs import get_job_queue
+from logging_setup import setup_logging
+from metrics import render_metrics
+from reports import REPORT_FORMATS, RESULT_FORMATS, iter_report, render_result, report_file_name
+from store import get_store
+
+# Bulk export formats: media type and the generator producing the body
+EXPORT_FORMATS = {
+    "zip": ("application/zip", iter_zip),
+    "ndjson": ("application/x-ndjson", iter_ndjson),
+}
+
+app = FastAPI(
+    title="Dell Driver Scraper API",
+    description="Headless access to Dell driver lookups for automation.",
+)
+
+# The API logs to logs/api.jsonl, apart from the Streamlit app sharing the logs directory
+setup_logging(name="api")
+
+
+class LookupRequest(BaseModel):
+    service_tag: str
+    hedge: int = Field(1, ge=1, le=6, description="Number of top driver endpoints to race")
+
+
+class BatchRequest(BaseModel):
+    service_tags: List[str]
+    per_host: int = Field(4, ge=1, le=32)
+    rate: float = Field(2.0, gt=0, le=50)
+    hedge: int = Field(1, ge=1, le=6, description="Number of top driver endpoints to race")
+
+
+def _check_tag(service_tag):
+    service_tag = service_tag.strip().upper()
+    if not SERVICE_TAG_PATTERN.match(service_tag):
+        raise HTTPException(status_code=422, detail=f"Invalid service tag: {service_tag}")
+    return service_tag
+
+
+def _check_tag_list(service_tags):
+    # Comma-separated tags from a query string; None (every stored tag) when empty
+    tags = [_check_tag(tag) for tag in (service_tags or "").split(",") if tag.strip()]
+    return list(dict.fromkeys(tags)) or None
+
+
+def _latest_result(service_tag):
+    result = get_store().latest(_check_tag(service_tag))
+    if result is None:
+        raise HTTPException(status_code=404, detail=f"No results for {service_tag}")
+    return result
+
+
+# Handlers that query SQLite, render exports or contact Dell are plain functions: FastAPI runs
+# them in its threadpool, so a slow query or large render never stalls the event loop
+@app.get("/health")
+def health():
+    return {"status": "ok", "cache": get_cache().stats()}
+
+
+@app.post("/lookup")
+def lookup(request: LookupRequest):
+    """Retrieve drivers for one service tag (served from the response cache when fresh)."""
+    service_tag = _check_tag(request.service_tag)
+    fetch_id = get_dell_drivers(service_tag, hedge=request.hedge)
+    return get_store().get_result(fetch_id)
+
+
+@app.post("/batch", status_code=202)
+def batch_lookup(request: BatchRequest):
+    """
+    Queue a lookup per service tag and return their jobs immediately (poll
+    /jobs/{job_id}). The batch's requests share one rate budget.
+    """
+    service_tags = list(dict.fromkeys(_check_tag(tag) for tag in request.service_tags))
+    if not service_tags:
+        raise HTTPException(status_code=422, detail="No service tags given")
+    limiter = HostLimiter(per_host=request.per_host, budget=RateBudget(rate=request.rate))
+    queue = get_job_queue()
+    job_ids = {tag: queue.submit(tag, hedge=request.hedge, throttle=limiter.throttle) for tag in service_tags}
+    return {tag: queue.get(job_id) for tag, job_id in job_ids.items()}
+
+
+@app.post("/jobs", status_code=202)
+def submit_job(request: LookupRequest):
+    """Queue a lookup in the background and return its job id immediately."""
+    job_id = get_job_queue().submit(_check_tag(request.service_tag), hedge=request.hedge)
+    return get_job_queue().get(job_id)
+
+
+@app.get("/jobs/{job_id}")
+def job_status(job_id: str):
+    job = get_job_queue().get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown job {job_id}")
+    return job
+
+
+@app.get("/results")
+def results():
+    """Service tags that have stored results."""
+    return {"service_tags": get_store().list_tags()}
+
+
+@app.get("/results/{service_tag}")
+def result(service_tag: str):
+    """Latest stored result for a service tag, without contacting Dell."""
+    return _latest_result(service_tag)
+
+
+@app.get("/results/{service_tag}/markdown", response_class=PlainTextResponse)
+def result_markdown(service_tag: str):
+    return export_markdown(_latest_result(service_tag))
+
+
+@app.get("/results/{service_tag}/report")
+def result_report(service_tag: str, format: str = "html"):
+    """Latest stored result rendered as md, html or csv (rendered once per content, then cached)."""
+    if format not in RESULT_FORMATS:
+        raise HTTPException(status_code=422, detail=f"Unknown report format: {format}")
+    result = _latest_result(service_tag)
+    content = render_result(result, format)
+    return Response(content=content, headers={"Content-Type": RESULT_FORMATS[format]})
+
+
+@app.get("/results/{service_tag}/history")
+def result_history(service_tag: str):
+    """Previous fetches for a service tag, newest first."""
+    return get_store().history(_check_tag(service_tag))
+
+
+@app.get("/export")
+async def export(format: str = "zip", service_tags: Optional[str] = None):
+    """
+    Latest results of many tags as one streamed download, built while it is
+    sent: ?format=zip|ndjson&service_tags=GPN01Q2,ABC1234 (all tags by default).
+    """
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=422, detail=f"Unknown export format: {format}")
+    service_tags = _check_tag_list(service_tags)
+    media_type, iter_export = EXPORT_FORMATS[format]
+    # The generator runs in the threadpool as the client reads, one result at a time
+    return StreamingResponse(iter_export(get_store().iter_latest(service_tags)), media_type=media_type,
+                             headers={"Content-Disposition": f'attachment; filename="{bulk_export_name(format)}"'})
+
+
+@app.get("/report")
+async def fleet_report(format: str = "csv", service_tags: Optional[str] = None):
+    """
+    Fleet-wide driver report (csv, html or xlsx) of the latest stored result
+    per tag, built from the result store without contacting Dell and streamed.
+    """
+    if format not in REPORT_FORMATS:
+        raise HTTPException(status_code=422, detail=f"Unknown or unavailable report format: {format}")
+    service_tags = _check_tag_list(service_tags)
+    return StreamingResponse(iter_report(get_store().iter_latest(service_tags), format),
+                             headers={"Content-Type": REPORT_FORMATS[format],
+                                      "Content-Disposition": f'attachment; filename="{report_file_name(format)}"'})
+
+
+@app.get("/changes")
+def changes(since: Optional[str] = None, service_tag: Optional[str] = None, limit: int = 10000):
+    """Delta feed of added/updated/removed drivers, e.g. ?since=2024-05-01T00:00:00."""
+    if service_tag:
+        service_tag = _check_tag(service_tag)
+    return get_store().changes(service_tag=service_tag, since=since, limit=limit)
+
+
+@app.get("/drivers")
+def drivers(service_tag: Optional[str] = None, product: Optional[str] = None, name: Optional[str] = None,
+            category: Optional[str] = None, released_before: Optional[str] = None,
+            released_after: Optional[str] = None, latest_only: bool = True, limit: int = 1000):
+    """Query stored driver records across tags, e.g. ?category=BIOS&released_before=2023-01-01."""
+    return get_store().find_drivers(service_tag=service_tag, product=product, name=name, category=category,
+                                    released_before=released_before, released_after=released_after,
+                                    latest_only=latest_only, limit=limit)
+
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus metrics: stage and endpoint timings, status codes, cache hits, retries, in-flight lookups."""
+    body, content_type = render_metrics()
+    return Response(content=body, headers={"Content-Type": content_type})
+
+
+@app.get("/endpoints")
+async def endpoints():
+    """Health of the Dell driver endpoints as learned by the endpoint selector."""
+    return get_endpoint_selector().snapshot()
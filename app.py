@@ -1,14 +1,21 @@
+import time
+
+# Start of this script run, taken before the imports so the first run's timing includes them
+RUN_STARTED = time.perf_counter()
+
 import streamlit as st
-import json
 import os
-import base64
-from datetime import datetime
-import subprocess
-import time
-import requests
-from PIL import Image
-from io import BytesIO
-import random
+from collections import deque
+
+from logging_setup import setup_logging
+from metrics import STAGE_SECONDS, start_metrics_server
+from ollama_pool import DEFAULT_OLLAMA_SERVERS
+
+# The lookup pipeline (dell_api via jobs/batch), chat/retrieval, exports and PIL
+# are imported where they are first needed, so a page load doesn't pay for them
+
+# The app logs to logs/app.jsonl, apart from the API sharing the logs directory
+setup_logging(name="app")
 
 # Set page configuration
 st.set_page_config(
@@ -61,414 +68,140 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
-# Function to create directories if they don't exist
+# Function to create directories if they don't exist (once per process, not on every rerun)
+@st.cache_resource
 def create_directories():
-    directories = ['data', 'data/json', 'data/markdown', 'logs', 'config']
+    directories = ['data', 'logs', 'config']
     for directory in directories:
         os.makedirs(directory, exist_ok=True)
 
 # Create necessary directories
 create_directories()
 
+# Expose Prometheus metrics for lookups run by the UI when DELL_METRICS_PORT is set
+start_metrics_server()
+
+# Process-wide handles, created on first use and shared by every session and rerun
+@st.cache_resource
+def job_queue():
+    from jobs import get_job_queue
+    return get_job_queue()
+
+@st.cache_resource
+def result_store():
+    from store import get_store
+    return get_store()
+
+@st.cache_resource
+def response_cache():
+    from cache import get_cache
+    return get_cache()
+
+@st.cache_resource
+def endpoint_selector():
+    from endpoints import get_endpoint_selector
+    return get_endpoint_selector()
+
+# Ollama backends shared by all sessions; health checks run in the background from the first page load
+@st.cache_resource
+def ollama_pool():
+    from ollama_pool import get_ollama_pool
+    pool = get_ollama_pool()
+    pool.start_health_checks()
+    return pool
+
+# Rerun timings shared by all sessions in this process: the first (cold) run and the most recent runs
+@st.cache_resource
+def run_timings():
+    return {"cold_start": None, "recent": deque(maxlen=200)}
+
+# Function to read the logo file; cached per modification time, so it's only read again after an upload
+@st.cache_data(max_entries=4)
+def read_logo(logo_path, modified):
+    with open(logo_path, "rb") as f:
+        return f.read()
+
 # Load company logo if available
 def load_company_logo():
     logo_path = "config/company_logo.png"
     if os.path.exists(logo_path):
-        return Image.open(logo_path)
+        return read_logo(logo_path, os.path.getmtime(logo_path))
     return None
 
 # Function to upload and save company logo
 def upload_company_logo():
     logo_file = st.file_uploader("Upload Company Logo (PNG format recommended)", type=['png', 'jpg', 'jpeg'])
     if logo_file is not None:
-        logo_image = Image.open(logo_file)
-        logo_image.save("config/company_logo.png")
-        st.success("Logo uploaded successfully!")
-        return logo_image
+        # The uploader keeps returning the file on every rerun; only convert and save it once
+        upload_key = (logo_file.name, logo_file.size)
+        if st.session_state.get("saved_logo") != upload_key:
+            from PIL import Image
+            Image.open(logo_file).save("config/company_logo.png")
+            st.session_state.saved_logo = upload_key
+            st.success("Logo uploaded successfully!")
+        return logo_file.getvalue()
     return None
 
-# Function to create download link for files
-def get_download_link(file_path, link_text):
-    with open(file_path, 'rb') as f:
-        data = f.read()
-    b64 = base64.b64encode(data).decode()
-    href = f'<a href="data:file/txt;base64,{b64}" download="{os.path.basename(file_path)}">{link_text}</a>'
-    return href
+# Browser-facing address of the REST API, which streams bulk exports
+DELL_API_URL = os.environ.get("DELL_API_URL", "http://localhost:8000").rstrip("/")
+
+# Bulk downloads offered by the REST API: label -> path and query
+BULK_EXPORTS = {
+    "Zip (JSON + Markdown per tag)": "export?format=zip",
+    "NDJSON": "export?format=ndjson",
+    "CSV report": "report?format=csv",
+    "HTML report": "report?format=html",
+    "Excel report (XLSX)": "report?format=xlsx",
+}
 
-# Function to retrieve driver information for a Dell service tag
-def get_dell_drivers(service_tag):
+# Function to load a stored result and its changes for display
+@st.cache_data(max_entries=32)
+def load_result_view(fetch_id, job_id):
     """
-    Retrieve driver information for a Dell service tag using Dell's official API
-    without using any web scraping or browser automation.
+    Stored results don't change, so reruns reuse the view; job_id is only
+    part of the cache key, so a new lookup that re-checked the same snapshot
+    picks up its last_checked time.
     """
-    import json
-    import requests
-    import time
-    from datetime import datetime
-    import os
-    import random
-    
-    # Create log directory if it doesn't exist
-    os.makedirs("logs", exist_ok=True)
-    
-    # Create a log file for troubleshooting
-    log_file = f"logs/dell_api_{service_tag}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.log"
-    
-    def log_message(message):
-        """Helper function to log messages"""
-        with open(log_file, "a", encoding='utf-8') as f:
-            timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            f.write(f"[{timestamp}] {message}\n")
-        st.info(message)
-    
-    log_message(f"Starting driver retrieval for service tag: {service_tag}")
-    
-    # Product information for fallback
-    product_info = {"product_name": "Dell Device"}
-    results = []
-    
-    try:
-        # Enhanced headers that mimic a real browser more closely
-        headers = {
-            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/122.0.0.0 Safari/537.36",
-            "Accept": "application/json, text/plain, */*",
-            "Accept-Language": "en-US,en;q=0.9",
-            "Referer": f"https://www.dell.com/support/home/en-us/product-support/servicetag/{service_tag}/overview",
-            "Origin": "https://www.dell.com",
-            "sec-ch-ua": '"Not-A.Brand";v="99", "Chromium";v="122", "Google Chrome";v="122"',
-            "sec-ch-ua-mobile": "?0",
-            "sec-ch-ua-platform": '"Windows"',
-            "Sec-Fetch-Dest": "empty",
-            "Sec-Fetch-Mode": "cors",
-            "Sec-Fetch-Site": "same-origin",
-            "Connection": "keep-alive",
-            "Cache-Control": "no-cache",
-            "Pragma": "no-cache"
-        }
-        
-        # Add a session cookie to make the request look more legitimate
-        session = requests.Session()
-        session.cookies.set("dell-cookie-consent", "1", domain=".dell.com", path="/")
-        session.cookies.set("_abck", f"random_value_{int(time.time())}", domain=".dell.com", path="/")
-        
-        # First, try to get product information
-        product_api_url = f"https://www.dell.com/support/components/product/api/{service_tag}?isRefresh=false"
-        
-        log_message(f"Fetching product info from: {product_api_url}")
-        
-        try:
-            # Add a small random delay to make requests appear more human-like
-            time.sleep(random.uniform(1.0, 2.5))
-            
-            product_response = session.get(product_api_url, headers=headers, timeout=30)
-            
-            log_message(f"Product API returned status code: {product_response.status_code}")
-            
-            if product_response.status_code == 200:
-                try:
-                    product_data = product_response.json()
-                    log_message(f"Product API response received: {len(str(product_data))} bytes")
-                    
-                    # Save the raw API response for debugging
-                    with open(f"logs/{service_tag}_product_api.json", "w", encoding='utf-8') as f:
-                        json.dump(product_data, f, indent=4)
-                    
-                    # Extract product name and other details
-                    if "productName" in product_data:
-                        product_info["product_name"] = product_data["productName"]
-                        log_message(f"Found product name: {product_info['product_name']}")
-                    
-                    if "systemConfig" in product_data:
-                        product_info["system_config"] = product_data["systemConfig"]
-                    
-                    if "productLineDescription" in product_data:
-                        product_info["product_line"] = product_data["productLineDescription"]
-                        
-                except Exception as e:
-                    log_message(f"Error parsing product API response: {str(e)}")
-            else:
-                log_message(f"Response content: {product_response.text[:200]}...")
-                
-        except Exception as e:
-            log_message(f"Error calling product API: {str(e)}")
-        
-        # Now, try to get driver data
-        log_message("Fetching driver information...")
-        
-        # Try multiple API endpoints as Dell has several
-        api_endpoints = [
-            f"https://www.dell.com/support/driver-api/drivers/driverslist/{service_tag}",
-            f"https://www.dell.com/support/driver-api/en-us/driverslist/{service_tag}",
-            f"https://www.dell.com/support/component-api/drivers/list/{service_tag}",
-            f"https://www.dell.com/support/component-api/en-us/drivers/list/{service_tag}",
-            f"https://www.dell.com/support/home/api/drivers/downloads/{service_tag}",
-            f"https://www.dell.com/support/home/en-us/api/drivers/downloads/{service_tag}"
-        ]
-        
-        driver_data_found = False
-        
-        for api_url in api_endpoints:
-            log_message(f"Trying API endpoint: {api_url}")
-            
-            try:
-                # Add different delay for each attempt to avoid rate limiting
-                time.sleep(random.uniform(1.5, 3.0))
-                
-                # Update referer for each request to look more legitimate
-                headers["Referer"] = f"https://www.dell.com/support/home/en-us/product-support/servicetag/{service_tag}/drivers"
-                
-                driver_response = session.get(api_url, headers=headers, timeout=30)
-                
-                log_message(f"Driver API returned status code: {driver_response.status_code}")
-                
-                if driver_response.status_code == 200:
-                    try:
-                        driver_data = driver_response.json()
-                        log_message(f"Driver API response received: {len(str(driver_data))} bytes")
-                        
-                        # Save the raw API response for debugging
-                        with open(f"logs/{service_tag}_driver_api.json", "w", encoding='utf-8') as f:
-                            json.dump(driver_data, f, indent=4)
-                        
-                        # Process the driver data based on API response structure
-                        if isinstance(driver_data, dict) and "Drivers" in driver_data:
-                            # First API format
-                            drivers_list = driver_data["Drivers"]
-                            log_message(f"Found {len(drivers_list)} drivers in API response")
-                            
-                            for driver in drivers_list:
-                                driver_info = {}
-                                
-                                if "DriverName" in driver:
-                                    driver_info["name"] = driver["DriverName"]
-                                elif "Name" in driver:
-                                    driver_info["name"] = driver["Name"]
-                                    
-                                if "DriverType" in driver:
-                                    driver_info["category"] = driver["DriverType"]
-                                elif "Category" in driver:
-                                    driver_info["category"] = driver["Category"]
-                                
-                                if "DriverVersion" in driver:
-                                    driver_info["version"] = driver["DriverVersion"]
-                                elif "Version" in driver:
-                                    driver_info["version"] = driver["Version"]
-                                
-                                if "ReleaseDate" in driver:
-                                    driver_info["release_date"] = driver["ReleaseDate"]
-                                
-                                if "Importance" in driver:
-                                    driver_info["importance"] = driver["Importance"]
-                                    
-                                if "Description" in driver:
-                                    driver_info["description"] = driver["Description"]
-                                    
-                                if "FileFrmtInfo" in driver and "HttpFileLocation" in driver["FileFrmtInfo"]:
-                                    driver_info["download_url"] = driver["FileFrmtInfo"]["HttpFileLocation"]
-                                elif "DownloadURL" in driver:
-                                    driver_info["download_url"] = driver["DownloadURL"]
-                                
-                                if driver_info and "name" in driver_info:
-                                    results.append(driver_info)
-                                
-                            driver_data_found = True
-                            break
-                            
-                        elif isinstance(driver_data, list):
-                            # Second API format (list of drivers)
-                            log_message(f"Found {len(driver_data)} drivers in API response")
-                            
-                            for driver in driver_data:
-                                driver_info = {}
-                                
-                                for key_name, target_name in [
-                                    ("name", "name"),
-                                    ("title", "name"),
-                                    ("category", "category"),
-                                    ("driverType", "category"),
-                                    ("version", "version"),
-                                    ("driverVersion", "version"),
-                                    ("releaseDate", "release_date"),
-                                    ("importance", "importance"),
-                                    ("description", "description"),
-                                    ("downloadUrl", "download_url")
-                                ]:
-                                    if key_name in driver:
-                                        driver_info[target_name] = driver[key_name]
-                                
-                                if driver_info and "name" in driver_info:
-                                    results.append(driver_info)
-                            
-                            driver_data_found = True
-                            break
-                    
-                    except Exception as e:
-                        log_message(f"Error parsing driver API response: {str(e)}")
-                elif driver_response.status_code == 403:
-                    log_message(f"Access forbidden. Response content: {driver_response.text[:200]}...")
-                else:
-                    log_message(f"Unexpected status code. Response content: {driver_response.text[:200]}...")
-                    
-            except Exception as e:
-                log_message(f"Error calling driver API: {str(e)}")
-                
-        # Try an alternative approach - direct product support page
-        if not driver_data_found:
-            log_message("All API attempts failed. Trying alternative approach...")
-            
-            try:
-                # Use a different approach - get the HTML of the drivers page and extract information
-                support_url = f"https://www.dell.com/support/home/en-us/product-support/servicetag/{service_tag}/drivers"
-                
-                # Update headers to look like a browser
-                headers["Accept"] = "text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,image/apng,*/*;q=0.8,application/signed-exchange;v=b3;q=0.7"
-                
-                # Add a delay
-                time.sleep(random.uniform(1.0, 2.0))
-                
-                support_response = session.get(support_url, headers=headers, timeout=30)
-                
-                log_message(f"Support page returned status code: {support_response.status_code}")
-                
-                if support_response.status_code == 200:
-                    # Save the HTML for debugging
-                    with open(f"logs/{service_tag}_support_page.html", "w", encoding='utf-8') as f:
-                        f.write(support_response.text)
-                    
-                    # Extract product name from HTML if we don't have it yet
-                    if product_info["product_name"] == "Dell Device":
-                        import re
-                        title_match = re.search(r'<title>(.*?)</title>', support_response.text)
-                        if title_match:
-                            title = title_match.group(1)
-                            if " - " in title:
-                                product_info["product_name"] = title.split(" - ")[0].strip()
-                                log_message(f"Extracted product name from page title: {product_info['product_name']}")
-            
-            except Exception as e:
-                log_message(f"Error fetching support page: {str(e)}")
-                
-        if not driver_data_found and product_info["product_name"] != "Dell Device":
-            # If we have product info but no drivers, create a reference driver
-            log_message("No drivers found through API, creating reference link")
-            results.append({
-                "name": "Dell Support Website",
-                "category": "Support",
-                "description": f"Drivers for {product_info['product_name']}. We couldn't automatically retrieve the driver list, but you can find them at the Dell support website.",
-                "download_url": f"https://www.dell.com/support/home/en-us/product-support/servicetag/{service_tag}/drivers"
-            })
-
-    except Exception as e:
-        log_message(f"Error during API operations: {str(e)}")
-        import traceback
-        log_message(traceback.format_exc())
-    
-    if not results:
-        log_message("No driver information retrieved. Creating a generic link.")
-        results.append({
-            "name": "Dell Support Website",
-            "category": "Support",
-            "description": "We couldn't automatically retrieve the driver list, but you can find drivers at the Dell support website.",
-            "download_url": f"https://www.dell.com/support/home/en-us/product-support/servicetag/{service_tag}/drivers"
-        })
-    
-    log_message(f"Retrieved {len(results)} driver entries")
-    
-    # Create a timestamp for the file names
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    
-    # Create JSON output
-    output = {
-        "service_tag": service_tag,
-        "product_info": product_info,
-        "timestamp": datetime.now().isoformat(),
-        "drivers": results
+    from exports import export_file_name
+    result = result_store().get_result(fetch_id)
+    changed = result["last_checked"] == result["timestamp"]
+    return {
+        "result": result,
+        "json_name": export_file_name(result, "json"),
+        "md_name": export_file_name(result, "md"),
+        "changes": result_store().changes(fetch_id=fetch_id) if changed else None,
     }
-    
-    # Save JSON to file
-    json_filename = f"data/json/{service_tag}_{timestamp}.json"
-    with open(json_filename, 'w', encoding='utf-8') as f:
-        json.dump(output, f, indent=4)
-    
-    # Convert to Markdown
-    markdown_content = f"# Dell Driver Information for {service_tag}\n\n"
-    markdown_content += f"## Product: {product_info.get('product_name', 'Unknown Dell Device')}\n\n"
-    markdown_content += f"**Date Retrieved:** {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n\n"
-    
-    if "product_line" in product_info:
-        markdown_content += f"**Product Line:** {product_info['product_line']}\n\n"
-    
-    if "system_config" in product_info:
-        markdown_content += f"**System Configuration:** {product_info['system_config']}\n\n"
-    
-    markdown_content += "## Available Drivers\n\n"
-    
-    for idx, driver in enumerate(results, 1):
-        markdown_content += f"### {idx}. {driver.get('name', 'Unknown Driver')}\n\n"
-        markdown_content += f"**Category:** {driver.get('category', 'N/A')}\n\n"
-        markdown_content += f"**Version:** {driver.get('version', 'N/A')}\n\n"
-        markdown_content += f"**Release Date:** {driver.get('release_date', 'N/A')}\n\n"
-        markdown_content += f"**Importance:** {driver.get('importance', 'N/A')}\n\n"
-        
-        if 'description' in driver and driver['description']:
-            markdown_content += f"**Description:** {driver.get('description', 'N/A')}\n\n"
-        
-        if 'download_url' in driver and driver['download_url']:
-            markdown_content += f"**Download URL:** [{driver.get('download_url', '#')}]({driver.get('download_url', '#')})\n\n"
-        
-        markdown_content += "---\n\n"
-    
-    # Save Markdown to file
-    md_filename = f"data/markdown/{service_tag}_{timestamp}.md"
-    with open(md_filename, 'w', encoding='utf-8') as f:
-        f.write(markdown_content)
-    
-    log_message(f"Saved results to {json_filename} and {md_filename}")
-    
-    return json_filename, md_filename
+
+# Function to build a JSON or Markdown export of a stored result, once per fetch and format
+@st.cache_data(max_entries=32)
+def load_export(fetch_id, format):
+    from exports import export_json, export_markdown
+    result = result_store().get_result(fetch_id)
+    return export_json(result) if format == "json" else export_markdown(result)
+
+# Function to record how long this run took and show it next to the cold start and recent runs
+def report_run_timing(excluded=0.0):
+    elapsed = time.perf_counter() - RUN_STARTED - excluded
+    timings = run_timings()
+    if timings["cold_start"] is None:
+        timings["cold_start"] = elapsed
+        STAGE_SECONDS.labels("ui_cold_start").observe(elapsed)
+    else:
+        STAGE_SECONDS.labels("ui_rerun").observe(elapsed)
+    timings["recent"].append(elapsed)
+    recent = sorted(timings["recent"])
+    timing_report.caption(f"This run: {elapsed * 1000:.0f} ms | Median of last {len(recent)} runs: "
+                          f"{recent[len(recent) // 2] * 1000:.0f} ms | Cold start: {timings['cold_start'] * 1000:.0f} ms")
 
 # Function to start Ollama chat
-def start_ollama_chat(markdown_file):
+def start_ollama_chat(fetch_id):
+    from ollama_chat import ChatSession
     st.session_state.chat_active = True
-    st.session_state.chat_file = markdown_file
+    st.session_state.chat_fetch_id = fetch_id
+    st.session_state.chat_session = ChatSession(fetch_id, server=ollama_server, model=ollama_model,
+                                                pool=ollama_pool())
     st.session_state.messages = []
 
-# Chat function with Ollama
-def chat_with_ollama(markdown_file, query):
-    try:
-        # Read the markdown file content
-        with open(markdown_file, 'r', encoding='utf-8') as f:
-            context = f.read()
-        
-        # Prepare the prompt for Ollama
-        prompt = f"""
-        Context information:
-        {context}
-        
-        User query:
-        {query}
-        
-        Please answer the user query based on the context information provided.
-        """
-        
-        # Call Ollama API
-        response = requests.post(
-            "http://localhost:11434/api/generate",
-            json={
-                "model": "llama3",
-                "prompt": prompt,
-                "stream": False
-            }
-        )
-        
-        if response.status_code == 200:
-            return response.json().get('response', "No response from Ollama")
-        else:
-            return f"Error: Unable to get response from Ollama. Status code: {response.status_code}"
-    
-    except Exception as e:
-        return f"Error communicating with Ollama: {str(e)}"
-
 # Sidebar for configuration
 st.sidebar.title("Dell Driver Scraper")
 
@@ -490,8 +223,45 @@ with logo_tab2:
 
 # Configuration section
 st.sidebar.subheader("Configuration")
-ollama_server = st.sidebar.text_input("Ollama Server Address", value="http://localhost:11434")
-ollama_model = st.sidebar.selectbox("Ollama Model", ["llama3", "mistral", "gemma", "phi3"])
+ollama_server = st.sidebar.text_input("Ollama Server Address", value=DEFAULT_OLLAMA_SERVERS,
+                                      help="Several servers can be given comma-separated; each chat goes to the least busy one")
+# Models reported by the backends' health checks, or the usual ones until the first check has run
+ollama_models = ollama_pool().models() or ["llama3", "mistral", "gemma", "phi3"]
+ollama_model = st.sidebar.selectbox("Ollama Model", ollama_models,
+                                    index=ollama_models.index("llama3") if "llama3" in ollama_models else 0)
+# Load the selected model on the backends that have it, so the first chat turn doesn't wait for it; this only
+# sends a request once per model and server (a failed warm-up is retried after the health-check interval)
+ollama_pool().warm_up(ollama_model, servers=ollama_server)
+with st.sidebar.expander("Ollama backends"):
+    st.dataframe(ollama_pool().snapshot(), hide_index=True)
+chat_retrieval = st.sidebar.selectbox("Chat context retrieval", ["bm25", "embeddings"],
+                                      help="How drivers relevant to a question are picked (embeddings use Ollama's embeddings API)")
+chat_top_k = st.sidebar.slider("Drivers sent per question", min_value=3, max_value=30, value=8)
+
+# Response cache statistics
+st.sidebar.subheader("Response Cache")
+cache_stats = response_cache().stats()
+st.sidebar.write(f"{cache_stats['entries']} entries ({cache_stats['bytes'] / 1024 / 1024:.1f} MB)")
+st.sidebar.write(f"Hits: {cache_stats['hits']} | Misses: {cache_stats['misses']} | "
+                 f"Revalidated: {cache_stats['revalidations']} | Evicted: {cache_stats['evictions']}")
+if st.sidebar.button("Clear Cache"):
+    response_cache().clear()
+    st.sidebar.success("Response cache cleared")
+# Chat answers are cached per question and driver list; clearing makes the model answer afresh
+if st.sidebar.button("Clear Cached Chat Answers"):
+    result_store().clear_answers()
+    st.sidebar.success("Cached chat answers cleared")
+
+# Driver endpoint health
+st.sidebar.subheader("Driver Endpoints")
+hedge_endpoints = st.sidebar.checkbox("Race the top endpoints (hedged requests)", value=False,
+                                      help="Start the next-best endpoint if the best one is slow to answer")
+with st.sidebar.expander("Endpoint health"):
+    st.dataframe(endpoint_selector().snapshot(), hide_index=True)
+
+# Page timing: filled in at the end of the run (wall time per rerun, excluding streamed chat answers)
+st.sidebar.subheader("Page Timing")
+timing_report = st.sidebar.empty()
 
 # Main content area
 st.title("Dell Driver Scraper")
@@ -504,56 +274,147 @@ service_tag = st.text_input("Enter Dell Service Tag or Product ID (e.g., GPN01Q2
 # Initialize session state variables if they don't exist
 if 'chat_active' not in st.session_state:
     st.session_state.chat_active = False
-if 'chat_file' not in st.session_state:
-    st.session_state.chat_file = None
+if 'chat_fetch_id' not in st.session_state:
+    st.session_state.chat_fetch_id = None
 if 'messages' not in st.session_state:
     st.session_state.messages = []
 
-# Scrape button
+if 'current_job' not in st.session_state:
+    st.session_state.current_job = None
+if 'batch_jobs' not in st.session_state:
+    st.session_state.batch_jobs = {}
+batch_in_progress = False
+
+# Scrape button: queue the lookup in the background so the script run isn't blocked
 if st.button("Retrieve Driver Information"):
     if service_tag:
-        with st.spinner("Retrieving Dell driver information..."):
-            json_file, md_file = get_dell_drivers(service_tag)
-            
-            if json_file and md_file:
-                st.success(f"Successfully retrieved driver information for service tag: {service_tag}")
-                
-                # Display download links
-                col1, col2 = st.columns(2)
-                with col1:
-                    st.markdown(get_download_link(json_file, "Download JSON File"), unsafe_allow_html=True)
-                with col2:
-                    st.markdown(get_download_link(md_file, "Download Markdown File"), unsafe_allow_html=True)
-                
-                # Display JSON preview
-                with st.expander("Preview JSON Data"):
-                    with open(json_file, 'r') as f:
-                        json_data = json.load(f)
-                    st.json(json_data)
-                
-                # Display Markdown preview
-                with st.expander("Preview Markdown"):
-                    with open(md_file, 'r') as f:
-                        md_content = f.read()
-                    st.markdown(md_content)
-                
-                # Option to chat with Ollama about the data
-                st.subheader("Chat with Ollama about this data")
-                if st.button("Start Ollama Chat"):
-                    start_ollama_chat(md_file)
-            else:
-                st.error("Failed to retrieve driver information. Please check the service tag and try again.")
+        st.session_state.current_job = job_queue().submit(service_tag.strip().upper(),
+                                                              hedge=2 if hedge_endpoints else 1)
     else:
         st.warning("Please enter a service tag or product ID.")
 
+# Show progress or results for the current lookup job
+current_job = job_queue().get(st.session_state.current_job) if st.session_state.current_job else None
+job_in_progress = bool(current_job and current_job["status"] in ("queued", "running"))
+if job_in_progress:
+    st.info(f"Retrieving Dell driver information for {current_job['service_tag']} "
+            f"({current_job['status']}, step {current_job['steps']}): {current_job['message']}")
+elif current_job and current_job["status"] == "done":
+    # Result, JSON/Markdown exports and changes from the result store (cached across reruns)
+    result_view = load_result_view(current_job["fetch_id"], current_job["id"])
+    result = result_view["result"]
+    st.success(f"Successfully retrieved driver information for service tag: {result['service_tag']}")
+
+    # Streamlit 1.31's download_button needs its data when the button is drawn (it can't take a
+    # callable), so the exports are only built once asked for, then cached per fetch
+    if st.session_state.get("exports_fetch_id") == result["fetch_id"]:
+        col1, col2 = st.columns(2)
+        with col1:
+            st.download_button("Download JSON File", load_export(result["fetch_id"], "json"),
+                               file_name=result_view["json_name"], mime="application/json")
+        with col2:
+            st.download_button("Download Markdown File", load_export(result["fetch_id"], "md"),
+                               file_name=result_view["md_name"], mime="text/markdown")
+    elif st.button("Prepare JSON and Markdown Downloads"):
+        st.session_state.exports_fetch_id = result["fetch_id"]
+        st.rerun()
+
+    # Display what changed since the previous snapshot for this tag
+    if result_view["changes"] is None:
+        st.caption(f"No changes since the snapshot from {result['timestamp'][:19].replace('T', ' ')}")
+    else:
+        changes = result_view["changes"]
+        if changes:
+            with st.expander(f"Changes since last fetch ({len(changes)})", expanded=True):
+                st.dataframe([
+                    {"Change": change["change"], "Name": change["name"], "Category": change["category"],
+                     "Old Version": change["old_version"], "New Version": change["new_version"],
+                     "New Release Date": change["new_release_date"]}
+                    for change in changes
+                ], hide_index=True)
+
+    # Previews are rendered only while switched on; an expander would render its content on every run
+    if st.toggle("Preview JSON Data"):
+        st.json(result)
+    if st.toggle("Preview Markdown"):
+        st.markdown(load_export(result["fetch_id"], "md"))
+
+    # Option to chat with Ollama about the data
+    st.subheader("Chat with Ollama about this data")
+    if st.button("Start Ollama Chat"):
+        start_ollama_chat(result["fetch_id"])
+elif current_job and current_job["status"] == "failed":
+    st.error(f"Failed to retrieve driver information: {current_job['error']}. "
+             "Please check the service tag and try again.")
+
+# Bulk fleet mode
+with st.expander("Bulk Fleet Mode"):
+    st.write("Upload a CSV or text file with one service tag per line to retrieve drivers for a whole fleet. "
+             "The lookups run on the background job queue, so the page stays usable meanwhile.")
+    fleet_file = st.file_uploader("Service tag list", type=['csv', 'txt'])
+    col1, col2 = st.columns(2)
+    with col1:
+        batch_per_host = st.number_input("Max requests per host", min_value=1, max_value=32, value=4)
+    with col2:
+        batch_rate = st.number_input("Requests per second (whole batch)", min_value=0.1, max_value=50.0, value=2.0)
+
+    if st.button("Run Batch"):
+        from batch import BatchProgress, HostLimiter, RateBudget, read_service_tags
+        fleet_tags = read_service_tags(fleet_file.getvalue()) if fleet_file else []
+        if fleet_tags:
+            # Every job of the batch draws from the same rate budget, retries included
+            limiter = HostLimiter(per_host=int(batch_per_host), budget=RateBudget(rate=float(batch_rate)))
+            st.session_state.batch_jobs = {tag: job_queue().submit(tag, throttle=limiter.throttle)
+                                           for tag in fleet_tags}
+            st.session_state.batch_progress = BatchProgress(len(fleet_tags))
+        else:
+            st.warning("Please upload a file containing at least one service tag.")
+
+    # Progress of the batch's jobs, refreshed by the polling at the end of the script
+    if st.session_state.batch_jobs:
+        from batch import lookup_outcome
+        batch_results = {}
+        for tag, batch_job_id in st.session_state.batch_jobs.items():
+            batch_job = job_queue().get(batch_job_id)
+            if batch_job is None or batch_job["status"] == "failed":
+                batch_results[tag] = f"Error: {batch_job['error'] if batch_job else 'job not found'}"
+            elif batch_job["status"] == "done":
+                batch_results[tag] = lookup_outcome(batch_job["fetch_id"], result_store())
+        batch_progress = st.session_state.batch_progress
+        batch_progress.failed = sum(isinstance(result, str) for result in batch_results.values())
+        batch_progress.completed = len(batch_results) - batch_progress.failed
+        batch_in_progress = batch_progress.done < batch_progress.total
+        if batch_in_progress:
+            st.progress(batch_progress.done / batch_progress.total)
+            st.write(batch_progress.summary())
+        else:
+            failed_tags = {tag: result for tag, result in batch_results.items() if isinstance(result, str)}
+            st.success(f"Batch finished: {batch_progress.completed} of {batch_progress.total} tags retrieved")
+            if failed_tags:
+                st.json(failed_tags)
+
+# Bulk export of stored results, streamed by the REST API rather than built in the app's memory
+with st.expander("Bulk Export"):
+    st.write("Download the latest stored result of many service tags as one file, or a fleet-wide driver "
+             "report built from the stored records. It is built while it downloads, so even large fleets export quickly.")
+    export_format = st.radio("Format", list(BULK_EXPORTS), horizontal=True)
+    export_tags = st.text_input("Service tags (comma-separated, leave empty for all)")
+    export_url = f"{DELL_API_URL}/{BULK_EXPORTS[export_format]}"
+    if export_tags.strip():
+        export_url += "&service_tags=" + ",".join(tag.strip().upper() for tag in export_tags.split(",") if tag.strip())
+    st.link_button("Download Bulk Export", export_url)
+
 # Chat interface
-if st.session_state.chat_active and st.session_state.chat_file:
+streamed_seconds = 0.0
+if st.session_state.chat_active and st.session_state.chat_fetch_id:
     st.subheader("Chat with Ollama about Driver Information")
     
     # Display chat messages
     for message in st.session_state.messages:
         with st.chat_message(message["role"]):
             st.write(message["content"])
+            if message.get("stats"):
+                st.caption(message["stats"])
     
     # User input
     user_input = st.chat_input("Ask a question about the drivers...")
@@ -565,15 +426,40 @@ if st.session_state.chat_active and st.session_state.chat_file:
         with st.chat_message("user"):
             st.write(user_input)
         
-        # Get response from Ollama
-        with st.spinner("Ollama is thinking..."):
-            ollama_response = chat_with_ollama(st.session_state.chat_file, user_input)
-        
-        # Add assistant message to chat history
-        st.session_state.messages.append({"role": "assistant", "content": ollama_response})
-        
-        # Display assistant message
+        # Add the assistant message up front so a stopped answer keeps its partial text
+        from ollama_chat import StreamStats
+        assistant_message = {"role": "assistant", "content": ""}
+        st.session_state.messages.append(assistant_message)
+        stream_stats = StreamStats()
+
+        # Follow-up questions reuse the same Ollama chat session and its cached prompt prefix
+        chat_session = st.session_state.chat_session
+        chat_session.server = ollama_server
+        chat_session.model = ollama_model
+        chat_session.top_k = chat_top_k
+        chat_session.retrieval = chat_retrieval
+
+        def stream_response():
+            tokens = chat_session.stream(user_input, stats=stream_stats)
+            try:
+                for token in tokens:
+                    assistant_message["content"] += token
+                    yield token
+            finally:
+                tokens.close()
+                assistant_message["stats"] = stream_stats.summary()
+
+        # Stream the assistant message as tokens arrive; any interaction (e.g. Stop) cancels it
         with st.chat_message("assistant"):
-            st.write(ollama_response)
+            st.button("Stop generating")
+            stream_started = time.perf_counter()
+            st.write_stream(stream_response())
+            streamed_seconds = time.perf_counter() - stream_started
+            st.caption(assistant_message["stats"])
 
+report_run_timing(excluded=streamed_seconds)
 
+# Poll the background lookup and batch jobs; the rest of the page stays usable meanwhile
+if job_in_progress or batch_in_progress:
+    time.sleep(1)
+    st.rerun()
@@ -0,0 +1,204 @@
+import argparse
+import csv
+import io
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
+from urllib.parse import urlparse
+
+from dell_api import get_dell_drivers
+from metrics import STAGE_SECONDS
+from store import get_store
+
+# Service tags are 7 alphanumeric characters; product IDs can be a little longer
+SERVICE_TAG_PATTERN = re.compile(r"^[A-Za-z0-9]{5,20}$")
+
+
+class RateBudget:
+    """Token bucket shared by every request in a batch."""
+
+    def __init__(self, rate=2.0, burst=4):
+        self.rate = rate
+        self.capacity = max(1, burst)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class HostLimiter:
+    """Caps the number of in-flight requests per host and draws from a shared rate budget."""
+
+    def __init__(self, per_host=4, budget=None):
+        self.per_host = per_host
+        self.budget = budget
+        self.semaphores = {}
+        self.lock = threading.Lock()
+
+    def _semaphore(self, host):
+        with self.lock:
+            if host not in self.semaphores:
+                self.semaphores[host] = threading.BoundedSemaphore(self.per_host)
+            return self.semaphores[host]
+
+    @contextmanager
+    def throttle(self, url, delay=None):
+        # delay is the interactive random sleep; the batch budget replaces it. Retries of
+        # the request (see HttpClient) call the yielded acquire, so they spend tokens too
+        semaphore = self._semaphore(urlparse(url).netloc)
+        started = time.perf_counter()
+        with semaphore:
+            if self.budget:
+                self.budget.acquire()
+            STAGE_SECONDS.labels("throttle_wait").observe(time.perf_counter() - started)
+            yield self.budget.acquire if self.budget else None
+
+
+class BatchProgress:
+    """Running counters for a batch, safe to read from the UI thread."""
+
+    def __init__(self, total):
+        self.total = total
+        self.completed = 0
+        self.failed = 0
+        self.started = time.monotonic()
+
+    @property
+    def done(self):
+        return self.completed + self.failed
+
+    @property
+    def elapsed(self):
+        return time.monotonic() - self.started
+
+    @property
+    def throughput(self):
+        """Tags per minute"""
+        elapsed = self.elapsed
+        return self.done / elapsed * 60 if elapsed > 0 else 0.0
+
+    def summary(self):
+        return (f"{self.done}/{self.total} tags ({self.failed} failed) in {self.elapsed:.1f}s "
+                f"- {self.throughput:.1f} tags/min")
+
+
+# Function to read service tags from an uploaded CSV or plain text file
+def read_service_tags(content):
+    """
+    Accept CSV (a column named service_tag/servicetag/tag, otherwise every cell) or
+    newline/comma separated text. Duplicates and blank entries are dropped.
+    """
+    if isinstance(content, bytes):
+        content = content.decode("utf-8-sig")
+
+    rows = list(csv.reader(io.StringIO(content)))
+    column = None
+    if rows:
+        header = [cell.strip().lower().replace(" ", "_") for cell in rows[0]]
+        for name in ("service_tag", "servicetag", "tag"):
+            if name in header:
+                column = header.index(name)
+                rows = rows[1:]
+                break
+
+    tags = []
+    seen = set()
+    for row in rows:
+        cells = row if column is None else row[column:column + 1]
+        for cell in cells:
+            tag = cell.strip().upper()
+            if tag and SERVICE_TAG_PATTERN.match(tag) and tag not in seen:
+                seen.add(tag)
+                tags.append(tag)
+    return tags
+
+
+# Function to turn a finished lookup into a batch result: its fetch id, or an error string
+# when only a placeholder without drivers was saved (Dell had no driver data for the tag)
+def lookup_outcome(fetch_id, store=None):
+    if (store or get_store()).drivers_found(fetch_id):
+        return fetch_id
+    return f"Error: no drivers found (fetch {fetch_id})"
+
+
+# Function to retrieve drivers for many service tags concurrently
+def run_batch(service_tags, workers=8, per_host=4, rate=2.0, burst=4, on_progress=None, store=None):
+    """
+    Run get_dell_drivers for every tag through a bounded thread pool.
+
+    Outbound requests are limited to per_host in flight per host and to a rate
+    budget of `rate` requests per second across the whole batch. on_progress is
+    called from the calling thread after each tag finishes.
+    Returns a dict of service_tag -> result store fetch id, or an error string
+    for lookups that raised or found no drivers (see lookup_outcome).
+    """
+    if store is None:
+        store = get_store()
+    limiter = HostLimiter(per_host=per_host, budget=RateBudget(rate=rate, burst=burst))
+    progress = BatchProgress(len(service_tags))
+    results = {}
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="dell-batch") as executor:
+        futures = {
+            executor.submit(get_dell_drivers, tag, throttle=limiter.throttle, store=store): tag
+            for tag in service_tags
+        }
+        for future in as_completed(futures):
+            tag = futures[future]
+            try:
+                results[tag] = lookup_outcome(future.result(), store)
+            except Exception as e:
+                results[tag] = f"Error: {str(e)}"
+            if isinstance(results[tag], str):
+                progress.failed += 1
+            else:
+                progress.completed += 1
+            if on_progress:
+                on_progress(tag, progress)
+
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Retrieve Dell driver information for a fleet of service tags.")
+    parser.add_argument("input", help="CSV or text file with one service tag per line")
+    parser.add_argument("--workers", type=int, default=8, help="Concurrent lookups (default: 8)")
+    parser.add_argument("--per-host", type=int, default=4, help="Max in-flight requests per host (default: 4)")
+    parser.add_argument("--rate", type=float, default=2.0, help="Requests per second across the batch (default: 2.0)")
+    parser.add_argument("--burst", type=int, default=4, help="Rate budget burst size (default: 4)")
+    args = parser.parse_args(argv)
+
+    with open(args.input, "rb") as f:
+        service_tags = read_service_tags(f.read())
+
+    if not service_tags:
+        parser.error(f"No service tags found in {args.input}")
+
+    def report(tag, progress):
+        print(f"[{progress.done}/{progress.total}] {tag} - {progress.throughput:.1f} tags/min", flush=True)
+
+    results = run_batch(service_tags, workers=args.workers, per_host=args.per_host,
+                        rate=args.rate, burst=args.burst, on_progress=report)
+
+    failed = [tag for tag, result in results.items() if isinstance(result, str)]
+    print(f"Finished {len(results)} tags, {len(failed)} failed")
+    for tag in failed:
+        print(f"  {tag}: {results[tag]}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
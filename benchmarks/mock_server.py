@@ -0,0 +1,244 @@
+import argparse
+import hashlib
+import json
+import os
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+
+from benchmarks.parsing import synthetic_response
+
+# Driver-list paths the lookup tries (see endpoints.DRIVER_ENDPOINT_TEMPLATES), without the tag
+DRIVER_PATHS = (
+    "/support/driver-api/drivers/driverslist/",
+    "/support/driver-api/en-us/driverslist/",
+    "/support/component-api/drivers/list/",
+    "/support/component-api/en-us/drivers/list/",
+    "/support/home/api/drivers/downloads/",
+    "/support/home/en-us/api/drivers/downloads/",
+)
+# Tag prefixes selecting a special behaviour (see MockDellHandler)
+SPECIAL_PREFIXES = ("F403", "N404", "SLOW", "HUGE", "LIST")
+PRODUCT_PATH = "/support/components/product/api/"
+SUPPORT_PAGE_PATH = "/support/home/en-us/product-support/servicetag/"
+
+
+class MockDellHandler(BaseHTTPRequestHandler):
+    """
+    Stand-in for the Dell support site and an Ollama server. The service tag
+    picks the behaviour: F403* tags get 403 from every driver endpoint (the
+    support page still embeds their drivers), N404* tags are unknown to the
+    driver endpoints (404), SLOW* tags get driver lists
+    after a delay, HUGE* tags get very large lists, LIST* tags get the list
+    format; anything else a normal "Drivers" response. Product and driver
+    responses carry an ETag and are answered with 304 when the client's
+    If-None-Match still matches. Recorded payloads in the fixtures directory
+    ({tag}_product_api.json / {tag}_driver_api.json, as kept in
+    logs/payloads) are replayed instead when present.
+    """
+
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, body, content_type="application/json", chunk_size=65536, delay=0, etag=False):
+        if delay:
+            time.sleep(delay)
+        if etag:
+            etag = f'"{hashlib.sha1(body).hexdigest()[:16]}"'
+            if self.headers.get("If-None-Match") == etag:
+                self.send_response(304)
+                self.send_header("ETag", etag)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        if etag:
+            self.send_header("ETag", etag)
+        self.end_headers()
+        # Written in pieces so clients see the body arrive in chunks
+        for start in range(0, len(body), chunk_size):
+            self.wfile.write(body[start:start + chunk_size])
+
+    def _fixture(self, service_tag, kind):
+        directory = self.server.fixtures
+        if not directory:
+            return None
+        path = os.path.join(directory, f"{service_tag}_{kind}.json")
+        if not os.path.exists(path):
+            return None
+        with open(path, "rb") as f:
+            return f.read()
+
+    def do_GET(self):
+        path = urlparse(self.path).path
+        self.server.count(path)
+        if path.startswith(PRODUCT_PATH):
+            service_tag = path[len(PRODUCT_PATH):].strip("/")
+            body = self._fixture(service_tag, "product_api")
+            if body is None:
+                special = [prefix for prefix in SPECIAL_PREFIXES if service_tag.startswith(prefix)]
+                if special:
+                    # Kept apart from the regular models so their driver lists never become a shared catalog
+                    product_name = f"Benchmark {special[0]}"
+                else:
+                    product_name = f"Latitude {5400 + zlib.crc32(service_tag.encode()) % self.server.models}"
+                body = json.dumps({"productName": product_name, "productLineDescription": "Latitude",
+                                   "systemConfig": "Benchmark"}).encode()
+            return self._send(200, body, delay=self.server.latency, etag=True)
+
+        for driver_path in DRIVER_PATHS:
+            if path.startswith(driver_path):
+                return self._driver_list(path[len(driver_path):].strip("/"))
+
+        if path.startswith(SUPPORT_PAGE_PATH):
+            service_tag = path[len(SUPPORT_PAGE_PATH):].split("/")[0]
+            # Driver list embedded in a script payload ahead of the rest of the page, as the fallback expects
+            body = (f"<html><head><title>Latitude Benchmark - Support for {service_tag}</title></head><body>"
+                    f"<script id=\"initial-state\" type=\"application/json\">{{\"page\": "
+                    f"{self.server.driver_body(self.server.driver_count, 'drivers_object').decode()}}}</script>"
+                    f"{'<div>filler</div>' * 50000}</body></html>").encode()
+            return self._send(200, body, "text/html", delay=self.server.latency)
+
+        if path == "/api/tags":
+            return self._send(200, json.dumps({"models": [{"name": "llama3"}]}).encode())
+        self._send(404, b'{"error": "not found"}')
+
+    def _driver_list(self, service_tag):
+        server = self.server
+        if service_tag.startswith("F403"):
+            return self._send(403, b"<html>Access Denied</html>", "text/html", delay=server.latency)
+        if service_tag.startswith("N404"):
+            return self._send(404, b'{"error": "service tag not found"}', delay=server.latency)
+        body = self._fixture(service_tag, "driver_api")
+        if body is None:
+            count = server.huge_count if service_tag.startswith("HUGE") else server.driver_count
+            format_name = "driver_list" if service_tag.startswith("LIST") else "drivers_object"
+            body = server.driver_body(count, format_name)
+        delay = server.slow_delay if service_tag.startswith("SLOW") else server.latency
+        self._send(200, body, delay=delay, etag=True)
+
+    def do_POST(self):
+        path = urlparse(self.path).path
+        self.server.count(path)
+        length = int(self.headers.get("Content-Length", 0))
+        request = json.loads(self.rfile.read(length) or b"{}")
+        if path == "/api/chat":
+            return self._chat(request)
+        if path == "/api/embeddings":
+            # Deterministic pseudo-embedding so retrieval behaves consistently between runs
+            digest = hashlib.sha256(request.get("prompt", "").encode()).digest()
+            vector = [(byte - 128) / 128 for byte in digest * 2]
+            return self._send(200, json.dumps({"embedding": vector}).encode())
+        if path == "/api/generate":
+            # Model warm-up: a generate request without a prompt only loads the model
+            return self._send(200, json.dumps({"model": request.get("model"), "response": "", "done": True}).encode())
+        self._send(404, b'{"error": "not found"}')
+
+    def _chat(self, request):
+        server = self.server
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        def write(chunk):
+            line = json.dumps(chunk).encode() + b"\n"
+            self.wfile.write(f"{len(line):x}\r\n".encode() + line + b"\r\n")
+            self.wfile.flush()
+
+        with server._lock:
+            server.chats.append(request.get("messages", []))
+        prompt_chars = sum(len(message.get("content", "")) for message in request.get("messages", []))
+        time.sleep(server.first_token_delay)
+        started = time.perf_counter()
+        for index in range(server.chat_tokens):
+            write({"model": request.get("model"), "message": {"role": "assistant", "content": f"token{index} "},
+                   "done": False})
+            time.sleep(server.token_delay)
+        write({"model": request.get("model"), "message": {"role": "assistant", "content": ""}, "done": True,
+               "eval_count": server.chat_tokens, "eval_duration": int((time.perf_counter() - started) * 1e9),
+               "prompt_eval_count": prompt_chars // 4,
+               "prompt_eval_duration": int(server.first_token_delay * 1e9), "load_duration": 0})
+        self.wfile.write(b"0\r\n\r\n")
+
+
+class MockServer(ThreadingHTTPServer):
+    """Threaded mock server; use as a context manager to run it in the background."""
+
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # Clients closing pooled or cancelled connections is expected here
+        pass
+
+    def __init__(self, host="127.0.0.1", port=0, fixtures=None, latency=0.0, slow_delay=1.0, driver_count=150,
+                 huge_count=20000, models=10, chat_tokens=64, token_delay=0.002, first_token_delay=0.05):
+        super().__init__((host, port), MockDellHandler)
+        self.fixtures = fixtures
+        self.latency = latency
+        self.slow_delay = slow_delay
+        self.driver_count = driver_count
+        self.huge_count = huge_count
+        self.models = models
+        self.chat_tokens = chat_tokens
+        self.token_delay = token_delay
+        self.first_token_delay = first_token_delay
+        self.requests = {}
+        # Messages of every /api/chat request, in arrival order
+        self.chats = []
+        self._bodies = {}
+        self._lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def count(self, path):
+        with self._lock:
+            self.requests[path] = self.requests.get(path, 0) + 1
+
+    def driver_body(self, count, format_name):
+        # Synthetic bodies are built once per shape and reused
+        key = (count, format_name)
+        with self._lock:
+            if key not in self._bodies:
+                self._bodies[key] = synthetic_response(count, format_name)
+            return self._bodies[key]
+
+    def __enter__(self):
+        self._thread = threading.Thread(target=self.serve_forever, name="mock-dell", daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.shutdown()
+        self.server_close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Local stand-in for the Dell support site and Ollama.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8099)
+    parser.add_argument("--fixtures", help="Directory of recorded payloads to replay, e.g. logs/payloads")
+    parser.add_argument("--latency", type=float, default=0.0, help="Delay before every Dell response (seconds)")
+    args = parser.parse_args(argv)
+
+    server = MockServer(args.host, args.port, fixtures=args.fixtures, latency=args.latency)
+    print(f"Serving on {server.base_url} (DELL_BASE_URL / OLLAMA_SERVERS)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
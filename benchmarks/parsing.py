@@ -0,0 +1,151 @@
+import argparse
+import json
+import random
+import time
+import tracemalloc
+
+from driver_schemas import JSON_DECODER, DriverStreamParser, loads, parse_drivers
+
+
+# Function to build a synthetic driver response in one of Dell's formats
+def synthetic_response(count, format_name="drivers_object", seed=0):
+    rng = random.Random(seed)
+    categories = ["BIOS", "Chipset", "Network", "Audio", "Video", "Storage", "Firmware"]
+    drivers = []
+    for index in range(count):
+        version = f"{rng.randint(1, 30)}.{rng.randint(0, 99)}.{rng.randint(0, 999)}"
+        date = f"{rng.randint(1, 28):02d} Jan {rng.randint(2018, 2024)}"
+        url = f"https://dl.dell.com/FOLDER{index:08d}/1/Driver_{index}.exe"
+        description = "Driver update fixing issues and improving stability. " * rng.randint(1, 6)
+        if format_name == "drivers_object":
+            drivers.append({"DriverName": f"Driver {index}", "DriverType": rng.choice(categories),
+                            "DriverVersion": version, "ReleaseDate": date, "Importance": "Recommended",
+                            "Description": description, "FileFrmtInfo": {"HttpFileLocation": url, "FileSize": 1024},
+                            "DriverId": f"ID{index}", "Oscode": "W2021", "LUPath": "/a/b/c"})
+        else:
+            drivers.append({"title": f"Driver {index}", "driverType": rng.choice(categories),
+                            "driverVersion": version, "releaseDate": date, "importance": "Recommended",
+                            "description": description, "downloadUrl": url, "driverId": f"ID{index}"})
+    data = {"Drivers": drivers, "TotalCount": count} if format_name == "drivers_object" else drivers
+    return json.dumps(data).encode("utf-8")
+
+
+# The per-driver if/elif parsing this module replaced, kept as the baseline
+def legacy_parse(content):
+    driver_data = json.loads(content)
+    results = []
+    if isinstance(driver_data, dict) and "Drivers" in driver_data:
+        for driver in driver_data["Drivers"]:
+            driver_info = {}
+            if "DriverName" in driver:
+                driver_info["name"] = driver["DriverName"]
+            elif "Name" in driver:
+                driver_info["name"] = driver["Name"]
+            if "DriverType" in driver:
+                driver_info["category"] = driver["DriverType"]
+            elif "Category" in driver:
+                driver_info["category"] = driver["Category"]
+            if "DriverVersion" in driver:
+                driver_info["version"] = driver["DriverVersion"]
+            elif "Version" in driver:
+                driver_info["version"] = driver["Version"]
+            if "ReleaseDate" in driver:
+                driver_info["release_date"] = driver["ReleaseDate"]
+            if "Importance" in driver:
+                driver_info["importance"] = driver["Importance"]
+            if "Description" in driver:
+                driver_info["description"] = driver["Description"]
+            if "FileFrmtInfo" in driver and "HttpFileLocation" in driver["FileFrmtInfo"]:
+                driver_info["download_url"] = driver["FileFrmtInfo"]["HttpFileLocation"]
+            elif "DownloadURL" in driver:
+                driver_info["download_url"] = driver["DownloadURL"]
+            if driver_info and "name" in driver_info:
+                results.append(driver_info)
+    elif isinstance(driver_data, list):
+        for driver in driver_data:
+            driver_info = {}
+            for key_name, target_name in [
+                ("name", "name"), ("title", "name"), ("category", "category"), ("driverType", "category"),
+                ("version", "version"), ("driverVersion", "version"), ("releaseDate", "release_date"),
+                ("importance", "importance"), ("description", "description"), ("downloadUrl", "download_url")
+            ]:
+                if key_name in driver:
+                    driver_info[target_name] = driver[key_name]
+            if driver_info and "name" in driver_info:
+                results.append(driver_info)
+    return results
+
+
+# Function to time a callable, returning the best of several rounds in milliseconds
+def best_of(function, rounds):
+    timings = []
+    for _ in range(rounds):
+        started = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - started)
+    return min(timings) * 1000
+
+
+# Function to parse a body in network-sized chunks, as the streaming lookup path does
+def stream_parse(content, chunk_size=65536):
+    parser = DriverStreamParser()
+    records = []
+    for start in range(0, len(content), chunk_size):
+        records.extend(parser.feed(content[start:start + chunk_size]))
+    records.extend(parser.close())
+    return records
+
+
+# Function to measure memory allocated by a callable: (peak, still held by its result) in MB
+def memory_use(function):
+    tracemalloc.start()
+    try:
+        result = function()
+        current, peak = tracemalloc.get_traced_memory()
+        del result
+        return peak / 1e6, current / 1e6
+    finally:
+        tracemalloc.stop()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Micro-benchmark of driver response parsing.")
+    parser.add_argument("--drivers", type=int, nargs="+", default=[100, 1000, 10000])
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args(argv)
+
+    print(f"JSON decoder: {JSON_DECODER}")
+    print(f"{'format':<16}{'drivers':>9}{'MB':>8}{'legacy ms':>12}{'decode ms':>12}{'compiled ms':>13}{'speedup':>9}")
+    for format_name in ("drivers_object", "driver_list"):
+        for count in args.drivers:
+            content = synthetic_response(count, format_name)
+            decoded = loads(content)
+            # Same output as the code it replaces
+            assert [record.to_dict() for record in parse_drivers(content)[1]] == legacy_parse(content)
+            assert [record.to_dict() for record in stream_parse(content)] == legacy_parse(content)
+
+            legacy = best_of(lambda: legacy_parse(content), args.rounds)
+            decode = best_of(lambda: loads(content), args.rounds)
+            compiled = best_of(lambda: parse_drivers(content), args.rounds)
+            mapping_only = best_of(lambda: parse_drivers(decoded), args.rounds)
+            print(f"{format_name:<16}{count:>9}{len(content) / 1e6:>8.2f}{legacy:>12.2f}{decode:>12.2f}"
+                  f"{compiled:>13.2f}{legacy / compiled:>8.1f}x  (mapping alone {mapping_only:.2f} ms)")
+
+    # Peak memory minus what the parsed drivers themselves occupy: whole-body decoding
+    # grows with the response, streaming only holds the unfinished driver
+    print()
+    print(f"{'format':<16}{'drivers':>9}{'stream ms':>11}{'legacy MB':>11}{'whole MB':>10}{'stream MB':>11}")
+    for format_name in ("drivers_object", "driver_list"):
+        for count in args.drivers:
+            content = synthetic_response(count, format_name)
+            streamed = best_of(lambda: stream_parse(content), args.rounds)
+            overheads = [peak - held for peak, held in (memory_use(lambda: legacy_parse(content)),
+                                                        memory_use(lambda: parse_drivers(content)),
+                                                        memory_use(lambda: stream_parse(content)))]
+            print(f"{format_name:<16}{count:>9}{streamed:>11.2f}{overheads[0]:>11.2f}{overheads[1]:>10.2f}"
+                  f"{overheads[2]:>11.2f}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,228 @@
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+from benchmarks.mock_server import MockServer
+from benchmarks.parsing import best_of, stream_parse, synthetic_response
+
+# Metric name suffixes where a larger value is better; everything else is a cost
+HIGHER_IS_BETTER = ("_per_min", "_per_second")
+
+
+# Throttle without the interactive random delay, so scenarios measure the pipeline itself
+@contextmanager
+def no_delay(url, delay=None):
+    yield
+
+
+# Function to summarize a list of durations in seconds as milliseconds
+def latency_summary(durations):
+    durations = sorted(durations)
+    ms = [duration * 1000 for duration in durations]
+    return {
+        "count": len(ms),
+        "mean_ms": round(statistics.fmean(ms), 3),
+        "p50_ms": round(statistics.median(ms), 3),
+        "p95_ms": round(ms[min(len(ms) - 1, int(len(ms) * 0.95))], 3),
+        "max_ms": round(ms[-1], 3),
+    }
+
+
+# Function to run lookups one after another and time each
+def time_lookups(get_dell_drivers, service_tags, **kwargs):
+    durations = []
+    fetch_ids = []
+    for service_tag in service_tags:
+        started = time.perf_counter()
+        fetch_ids.append(get_dell_drivers(service_tag, throttle=no_delay, **kwargs))
+        durations.append(time.perf_counter() - started)
+    return durations, fetch_ids
+
+
+def run_scenarios(server, args):
+    # Imported only now: these modules read DELL_BASE_URL and the data paths at import time
+    from batch import run_batch
+    from dell_api import get_dell_drivers
+    from driver_schemas import JSON_DECODER, parse_drivers
+    from endpoints import EndpointSelector
+    from ollama_chat import ChatSession, StreamStats
+
+    scenarios = {}
+    lookups = args.lookups
+
+    def requests_made():
+        return sum(count for path, count in server.requests.items() if path.startswith("/support"))
+
+    before = requests_made()
+    durations, fetch_ids = time_lookups(get_dell_drivers, [f"BENCH{index:04d}" for index in range(lookups)],
+                                        cache=False, catalog_ttl=0)
+    scenarios["single_lookup"] = dict(latency_summary(durations),
+                                      dell_requests_per_lookup=(requests_made() - before) / lookups)
+
+    durations, _ = time_lookups(get_dell_drivers, [f"BENCH{index:04d}" for index in range(lookups)], catalog_ttl=0)
+    durations, _ = time_lookups(get_dell_drivers, [f"BENCH{index:04d}" for index in range(lookups)], catalog_ttl=0)
+    scenarios["cached_lookup"] = latency_summary(durations)
+
+    # Own selector, so the 403s don't put the shared one's endpoints into backoff for later scenarios
+    durations, _ = time_lookups(get_dell_drivers, [f"F403{index:04d}" for index in range(lookups)],
+                                cache=False, catalog_ttl=0, selector=EndpointSelector(path=None))
+    scenarios["forbidden_lookup"] = latency_summary(durations)
+
+    durations, _ = time_lookups(get_dell_drivers, [f"SLOW{index:04d}" for index in range(max(1, lookups // 4))],
+                                cache=False, catalog_ttl=0)
+    scenarios["slow_lookup"] = latency_summary(durations)
+
+    durations, _ = time_lookups(get_dell_drivers, [f"HUGE{index:04d}" for index in range(max(1, lookups // 4))],
+                                cache=False, catalog_ttl=0)
+    scenarios["huge_lookup"] = dict(latency_summary(durations), drivers=server.huge_count)
+
+    # Batch with an effectively unlimited rate budget; tags share server.models product models
+    service_tags = [f"FLEET{index:05d}" for index in range(args.batch_tags)]
+    before = requests_made()
+    started = time.perf_counter()
+    results = run_batch(service_tags, workers=args.workers, per_host=args.workers, rate=10000, burst=10000)
+    elapsed = time.perf_counter() - started
+    scenarios["batch"] = {
+        "tags": len(service_tags),
+        "workers": args.workers,
+        "failed": sum(isinstance(result, str) for result in results.values()),
+        "elapsed_ms": round(elapsed * 1000, 3),
+        "tags_per_min": round(len(service_tags) / elapsed * 60, 1),
+        "dell_requests": requests_made() - before,
+    }
+
+    for format_name in ("drivers_object", "driver_list"):
+        for count in args.parse_sizes:
+            content = synthetic_response(count, format_name)
+            scenarios[f"parse_{format_name}_{count}"] = {
+                "bytes": len(content),
+                "whole_ms": round(best_of(lambda: parse_drivers(content), args.rounds), 3),
+                "stream_ms": round(best_of(lambda: stream_parse(content), args.rounds), 3),
+            }
+
+    first_token = []
+    round_trip = []
+    tokens_per_second = []
+    for _ in range(args.chats):
+        # Summary answers and the answer cache would skip Ollama; they are measured separately below
+        session = ChatSession(fetch_ids[0], server=server.base_url, direct_answers=False, answer_cache=False)
+        for question in ("Which BIOS version is available?", "Any network drivers?", "What changed recently?"):
+            stats = StreamStats()
+            reply = "".join(session.stream(question, stats=stats))
+            if reply.startswith("Error"):
+                raise RuntimeError(reply)
+            first_token.append(stats.time_to_first_token)
+            round_trip.append(stats.finished_at - stats.started)
+            tokens_per_second.append(stats.tokens_per_second or 0)
+    scenarios["chat_round_trip"] = dict(latency_summary(round_trip),
+                                        first_token_p50_ms=round(statistics.median(first_token) * 1000, 3),
+                                        tokens_per_second=round(statistics.fmean(tokens_per_second), 1))
+
+    # Questions answered from the driver summary, and a repeated opening question served from the answer cache
+    durations = []
+    chats_before = server.requests.get("/api/chat", 0)
+    for _ in range(args.chats):
+        for question in ("What's the latest BIOS?", "Which updates are urgent?", "List network drivers",
+                         "Why would the network driver need an update?"):
+            started = time.perf_counter()
+            "".join(ChatSession(fetch_ids[1], server=server.base_url).stream(question))
+            durations.append(time.perf_counter() - started)
+    scenarios["chat_instant_answer"] = dict(latency_summary(durations),
+                                            ollama_requests=server.requests.get("/api/chat", 0) - chats_before)
+    return scenarios, JSON_DECODER
+
+
+# Function to describe the code and machine a run was made on
+def environment_info(json_decoder):
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))).stdout.strip()
+    except OSError:
+        commit = None
+    return {
+        "commit": commit or None,
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "json_decoder": json_decoder,
+    }
+
+
+# Function to list metrics that got worse than baseline by more than threshold (a fraction)
+def compare(baseline, current, threshold):
+    regressions = []
+    for name, metrics in current["scenarios"].items():
+        previous = baseline.get("scenarios", {}).get(name, {})
+        for metric, value in metrics.items():
+            old = previous.get(metric)
+            if not isinstance(value, (int, float)) or not isinstance(old, (int, float)) or not old:
+                continue
+            if not (metric.endswith("_ms") or metric.endswith(HIGHER_IS_BETTER)):
+                continue
+            change = (value - old) / old
+            worse = -change if metric.endswith(HIGHER_IS_BETTER) else change
+            if worse > threshold:
+                regressions.append((name, metric, old, value, change))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Offline benchmark suite against a local Dell/Ollama stand-in.")
+    parser.add_argument("--output", default="bench_results.json", help="Where to write the JSON results")
+    parser.add_argument("--compare", help="Previous results file to check for regressions")
+    parser.add_argument("--threshold", type=float, default=0.2, help="Allowed slowdown before reporting (0.2 = 20%%)")
+    parser.add_argument("--fixtures", help="Recorded payloads to replay, e.g. logs/payloads")
+    parser.add_argument("--latency", type=float, default=0.0, help="Simulated Dell response latency (seconds)")
+    parser.add_argument("--lookups", type=int, default=20)
+    parser.add_argument("--batch-tags", type=int, default=200)
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--chats", type=int, default=3)
+    parser.add_argument("--parse-sizes", type=int, nargs="+", default=[1000, 10000])
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory(prefix="dell-bench-") as workdir, \
+            MockServer(fixtures=args.fixtures, latency=args.latency, slow_delay=0.5) as server:
+        # Everything the lookup writes goes to a scratch directory; nothing leaves the machine
+        os.environ.update({
+            "DELL_BASE_URL": server.base_url,
+            "OLLAMA_SERVERS": server.base_url,
+            "DELL_RESULTS_PATH": os.path.join(workdir, "results.db"),
+            "DELL_CACHE_PATH": os.path.join(workdir, "cache.db"),
+            "DELL_ENDPOINT_STATS_PATH": os.path.join(workdir, "endpoint_stats.json"),
+            "DELL_LOG_DIR": os.path.join(workdir, "logs"),
+            "DELL_DUMP_SAMPLE_RATE": "0",
+            "HTTP_HTTP2": "0",
+        })
+        scenarios, json_decoder = run_scenarios(server, args)
+
+    results = {"environment": environment_info(json_decoder), "scenarios": scenarios}
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+
+    for name, metrics in scenarios.items():
+        print(f"{name:<32}" + "  ".join(f"{metric}={value}" for metric, value in metrics.items()))
+    print(f"Results written to {args.output}")
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare(baseline, results, args.threshold)
+        for name, metric, old, new, change in regressions:
+            print(f"REGRESSION {name}.{metric}: {old} -> {new} ({change:+.0%})")
+        if regressions:
+            return 1
+        print(f"No regressions beyond {args.threshold:.0%} against {args.compare}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,211 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from metrics import CACHE_EVENTS
+
+# Default time-to-live in seconds for each kind of cached response
+DEFAULT_TTLS = {
+    "product": int(os.environ.get("DELL_CACHE_TTL_PRODUCT", 7 * 24 * 3600)),
+    "drivers": int(os.environ.get("DELL_CACHE_TTL_DRIVERS", 6 * 3600)),
+}
+
+
+class CachedResponse:
+    """Minimal stand-in for a requests.Response served from the cache."""
+
+    def __init__(self, url, content, etag=None, last_modified=None, fetched_at=None, fresh=True, size=None):
+        self.url = url
+        self.status_code = 200
+        # None when the body was left in the cache (see ResponseCache.iter_body)
+        self.content = content
+        self.size = len(content) if size is None else size
+        self.etag = etag
+        self.last_modified = last_modified
+        self.fetched_at = fetched_at
+        self.fresh = fresh
+        self.from_cache = True
+
+    @property
+    def text(self):
+        return self.content.decode("utf-8", errors="replace")
+
+    def json(self):
+        return json.loads(self.content)
+
+
+class ResponseCache:
+    """
+    SQLite-backed cache for Dell API responses keyed by URL (which embeds the
+    service tag and endpoint). Entries expire after a per-kind TTL, can be
+    revalidated with ETag/Last-Modified, and the least recently used entries
+    are evicted once the cache grows past max_bytes.
+    """
+
+    def __init__(self, path="data/cache.db", max_bytes=256 * 1024 * 1024, ttls=None):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self.max_bytes = max_bytes
+        self.ttls = dict(DEFAULT_TTLS, **(ttls or {}))
+        self.hits = 0
+        self.misses = 0
+        self.revalidations = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                url TEXT PRIMARY KEY,
+                service_tag TEXT NOT NULL,
+                kind TEXT NOT NULL,
+                body BLOB NOT NULL,
+                etag TEXT,
+                last_modified TEXT,
+                fetched_at REAL NOT NULL,
+                accessed_at REAL NOT NULL,
+                size INTEGER NOT NULL
+            )
+        """)
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_responses_accessed ON responses (accessed_at)")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_responses_tag ON responses (service_tag)")
+        self.conn.commit()
+
+    def get(self, url, kind, with_body=True):
+        """
+        Return a CachedResponse (fresh or stale) or None, counting hits and
+        misses. With with_body=False the body stays in the database, to be
+        read in chunks with iter_body().
+        """
+        now = time.time()
+        with self.lock:
+            row = self.conn.execute(
+                f"SELECT {'body' if with_body else 'NULL'}, etag, last_modified, fetched_at, size "
+                f"FROM responses WHERE url = ?", (url,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                CACHE_EVENTS.labels("miss").inc()
+                return None
+            body, etag, last_modified, fetched_at, size = row
+            fresh = now - fetched_at < self.ttls.get(kind, 0)
+            if fresh:
+                self.hits += 1
+                CACHE_EVENTS.labels("hit").inc()
+                self.conn.execute("UPDATE responses SET accessed_at = ? WHERE url = ?", (now, url))
+                self.conn.commit()
+            else:
+                self.misses += 1
+                CACHE_EVENTS.labels("miss").inc()
+        return CachedResponse(url, body, etag, last_modified, fetched_at, fresh, size)
+
+    def iter_body(self, url, chunk_size=65536):
+        """Yield a cached body in chunks, so a large entry is never loaded whole."""
+        with self.lock:
+            row = self.conn.execute("SELECT rowid FROM responses WHERE url = ?", (url,)).fetchone()
+            if row is None:
+                return
+            blob = self.conn.blobopen("responses", "body", row[0], readonly=True)
+        try:
+            while True:
+                with self.lock:
+                    chunk = blob.read(chunk_size)
+                if not chunk:
+                    break
+                yield chunk
+        finally:
+            with self.lock:
+                blob.close()
+
+    def is_fresh(self, url, kind):
+        """Check freshness without touching the counters."""
+        with self.lock:
+            row = self.conn.execute("SELECT fetched_at FROM responses WHERE url = ?", (url,)).fetchone()
+        return row is not None and time.time() - row[0] < self.ttls.get(kind, 0)
+
+    def put(self, url, service_tag, kind, body, etag=None, last_modified=None):
+        now = time.time()
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO responses "
+                "(url, service_tag, kind, body, etag, last_modified, fetched_at, accessed_at, size) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (url, service_tag, kind, body, etag, last_modified, now, now, len(body))
+            )
+            self._evict()
+            self.conn.commit()
+
+    def put_file(self, url, service_tag, kind, path, etag=None, last_modified=None, chunk_size=65536):
+        """Like put(), but the body is copied from a file in chunks instead of being held in memory."""
+        size = os.path.getsize(path)
+        now = time.time()
+        with self.lock, open(path, "rb") as f:
+            cursor = self.conn.execute(
+                "INSERT OR REPLACE INTO responses "
+                "(url, service_tag, kind, body, etag, last_modified, fetched_at, accessed_at, size) "
+                "VALUES (?, ?, ?, zeroblob(?), ?, ?, ?, ?, ?)",
+                (url, service_tag, kind, size, etag, last_modified, now, now, size)
+            )
+            with self.conn.blobopen("responses", "body", cursor.lastrowid) as blob:
+                for chunk in iter(lambda: f.read(chunk_size), b""):
+                    blob.write(chunk)
+            self._evict()
+            self.conn.commit()
+
+    def revalidated(self, url):
+        """Mark a stale entry fresh again after the server answered 304 Not Modified."""
+        now = time.time()
+        with self.lock:
+            self.revalidations += 1
+            CACHE_EVENTS.labels("revalidation").inc()
+            self.conn.execute("UPDATE responses SET fetched_at = ?, accessed_at = ? WHERE url = ?", (now, now, url))
+            self.conn.commit()
+
+    def _evict(self):
+        total = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for url, size in self.conn.execute("SELECT url, size FROM responses ORDER BY accessed_at").fetchall():
+            self.conn.execute("DELETE FROM responses WHERE url = ?", (url,))
+            self.evictions += 1
+            CACHE_EVENTS.labels("eviction").inc()
+            total -= size
+            if total <= self.max_bytes:
+                break
+
+    def clear(self):
+        with self.lock:
+            self.conn.execute("DELETE FROM responses")
+            self.conn.commit()
+
+    def stats(self):
+        with self.lock:
+            entries, size = self.conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "revalidations": self.revalidations,
+            "evictions": self.evictions,
+            "entries": entries,
+            "bytes": size,
+        }
+
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+# Function to get the process-wide response cache
+def get_cache():
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = ResponseCache(
+                path=os.environ.get("DELL_CACHE_PATH", "data/cache.db"),
+                max_bytes=int(os.environ.get("DELL_CACHE_MAX_MB", 256)) * 1024 * 1024,
+            )
+        return _default_cache
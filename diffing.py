@@ -0,0 +1,47 @@
+import hashlib
+import json
+
+
+# Function to hash the parts of a driver record that identify a release
+def driver_hash(driver):
+    content = "\x1f".join(str(driver.get(key) or "") for key in ("name", "version", "release_date"))
+    return hashlib.sha1(content.encode("utf-8")).hexdigest()
+
+
+# Function to hash a whole snapshot (product info plus every driver) for a quick unchanged check
+def snapshot_hash(product_info, drivers):
+    digest = hashlib.sha1(json.dumps(product_info, sort_keys=True, default=str).encode("utf-8"))
+    for driver in drivers:
+        digest.update(json.dumps(driver, sort_keys=True, default=str).encode("utf-8"))
+    return digest.hexdigest()
+
+
+# Function to compare two driver lists
+def diff_drivers(previous, current):
+    """
+    Compare driver lists by content hash. Drivers are matched by name and
+    category; a matched driver whose hash differs is reported as updated.
+    Returns {"added": [...], "updated": [(old, new), ...], "removed": [...]}.
+    """
+    previous_hashes = {driver_hash(driver) for driver in previous}
+    current_hashes = {driver_hash(driver) for driver in current}
+
+    # Only drivers whose hash isn't on the other side can have changed
+    old_by_key = {}
+    for driver in previous:
+        if driver_hash(driver) not in current_hashes:
+            old_by_key.setdefault((driver.get("name"), driver.get("category")), []).append(driver)
+
+    added = []
+    updated = []
+    for driver in current:
+        if driver_hash(driver) in previous_hashes:
+            continue
+        candidates = old_by_key.get((driver.get("name"), driver.get("category")))
+        if candidates:
+            updated.append((candidates.pop(0), driver))
+        else:
+            added.append(driver)
+
+    removed = [driver for candidates in old_by_key.values() for driver in candidates]
+    return {"added": added, "updated": updated, "removed": removed}
@@ -0,0 +1,423 @@
+import codecs
+import html
+import json
+import re
+
+from store import DRIVER_COLUMNS
+
+# Fastest available JSON decoder; both accept bytes as well as str
+try:
+    import orjson
+    JSON_DECODER = "orjson"
+    _decode = orjson.loads
+except ImportError:
+    try:
+        import msgspec
+        JSON_DECODER = "msgspec"
+        _decode = msgspec.json.Decoder().decode
+    except ImportError:
+        JSON_DECODER = "json"
+        _decode = json.loads
+
+# Field mappings for each driver response format Dell has been seen to return.
+# Each output field lists its source keys in priority order; a tuple is a path
+# into nested objects. The first key present in the raw driver wins.
+DRIVER_SCHEMAS = {
+    # {"Drivers": [{"DriverName": ..., "DriverType": ..., "FileFrmtInfo": {"HttpFileLocation": ...}}]}
+    "drivers_object": {
+        "name": ["DriverName", "Name"],
+        "category": ["DriverType", "Category"],
+        "version": ["DriverVersion", "Version"],
+        "release_date": ["ReleaseDate"],
+        "importance": ["Importance"],
+        "description": ["Description"],
+        "download_url": [("FileFrmtInfo", "HttpFileLocation"), "DownloadURL"],
+    },
+    # [{"title": ..., "driverType": ..., "downloadUrl": ...}]
+    "driver_list": {
+        "name": ["title", "name"],
+        "category": ["driverType", "category"],
+        "version": ["driverVersion", "version"],
+        "release_date": ["releaseDate"],
+        "importance": ["importance"],
+        "description": ["description"],
+        "download_url": ["downloadUrl"],
+    },
+}
+
+
+class DriverRecord:
+    """Compact driver record; fields are None when the response didn't include them."""
+
+    __slots__ = tuple(DRIVER_COLUMNS)
+
+    def __init__(self, name, category=None, version=None, release_date=None, importance=None,
+                 description=None, download_url=None):
+        self.name = name
+        self.category = category
+        self.version = version
+        self.release_date = release_date
+        self.importance = importance
+        self.description = description
+        self.download_url = download_url
+
+    def to_dict(self):
+        return {key: getattr(self, key) for key in DRIVER_COLUMNS if getattr(self, key) is not None}
+
+    def __repr__(self):
+        return f"DriverRecord({self.name!r}, version={self.version!r})"
+
+
+# Function to generate the lookup code for one output field
+def _field_source(field, sources):
+    lines = []
+    for index, source in enumerate(sources):
+        keyword = "if" if index == 0 else "elif"
+        if isinstance(source, tuple):
+            # Nested path: every level must be an object containing the next key
+            conditions = []
+            expression = "raw"
+            for key in source:
+                conditions.append(f"isinstance({expression}, dict) and {key!r} in {expression}")
+                expression = f"{expression}[{key!r}]"
+            lines.append(f"    {keyword} {' and '.join(conditions)}:")
+            lines.append(f"        {field} = {expression}")
+        else:
+            lines.append(f"    {keyword} {source!r} in raw:")
+            lines.append(f"        {field} = raw[{source!r}]")
+    lines.append("    else:")
+    lines.append(f"        {field} = None")
+    return lines
+
+
+# Function to compile a schema into an extractor: raw driver dict -> DriverRecord or None
+def compile_schema(schema, name="extract"):
+    """
+    Generate straight-line Python for the schema once, so parsing a driver is
+    a handful of dict lookups instead of walking the schema for every driver.
+    Drivers without a name are skipped (None is returned).
+    """
+    lines = [f"def {name}(raw):", "    if not isinstance(raw, dict):", "        return None"]
+    for field in DRIVER_COLUMNS:
+        lines.extend(_field_source(field, schema.get(field, [])))
+    lines.append("    if name is None:")
+    lines.append("        return None")
+    lines.append(f"    return DriverRecord({', '.join(DRIVER_COLUMNS)})")
+    namespace = {"DriverRecord": DriverRecord}
+    exec("\n".join(lines), namespace)
+    return namespace[name]
+
+
+EXTRACTORS = {format_name: compile_schema(schema, f"extract_{format_name}")
+              for format_name, schema in DRIVER_SCHEMAS.items()}
+
+
+# Function to map a driver embedded in a page, whichever response format its keys follow
+def extract_embedded(raw):
+    return EXTRACTORS["drivers_object"](raw) or EXTRACTORS["driver_list"](raw)
+
+
+# Function to decode a JSON response body with the fastest available decoder
+def loads(content):
+    return _decode(content)
+
+
+# Function to detect which driver response format a decoded body is in
+def detect_format(data):
+    """Returns (format name, list of raw drivers), or (None, None) for unknown shapes."""
+    if isinstance(data, dict) and isinstance(data.get("Drivers"), list):
+        return "drivers_object", data["Drivers"]
+    if isinstance(data, list):
+        return "driver_list", data
+    return None, None
+
+
+# Function to parse a driver API response into DriverRecords
+def parse_drivers(data):
+    """
+    data is a decoded response or the raw body (bytes/str), which is decoded
+    with orjson/msgspec when installed. Returns (format name, records); the
+    format is None when the response isn't a known driver format.
+    """
+    if isinstance(data, (bytes, bytearray, memoryview, str)):
+        data = loads(data)
+    format_name, raw_drivers = detect_format(data)
+    if format_name is None:
+        return None, []
+    extract = EXTRACTORS[format_name]
+    records = []
+    for raw in raw_drivers:
+        record = extract(raw)
+        if record is not None:
+            records.append(record)
+    return format_name, records
+
+
+_WHITESPACE = re.compile(r"[ \t\n\r]*")
+# Decode errors this close to the end of the buffer may just be a value cut off by the chunk boundary
+_INCOMPLETE_TAIL = 16
+
+
+class DriverStreamParser:
+    """
+    Incremental parser for driver responses arriving in chunks. Only the
+    driver array is walked element by element: each driver is decoded and
+    mapped as soon as its closing brace arrives, and consumed text is dropped,
+    so memory stays bounded by the largest single driver rather than the
+    whole response. Other top-level values are decoded and discarded.
+
+        parser = DriverStreamParser()
+        for chunk in chunks:
+            records.extend(parser.feed(chunk))
+        parser.close()
+    """
+
+    def __init__(self, array_extract=None):
+        self.format_name = None
+        self.bytes_received = 0
+        # Text after the end of the driver list (see SupportPageParser)
+        self.remainder = ""
+        self._array_extract = array_extract
+        self._text_decoder = codecs.getincrementaldecoder("utf-8")()
+        self._json = json.JSONDecoder()
+        self._buffer = ""
+        self._state = "start"
+        self._key = None
+        self._extract = None
+        self._closing = False
+
+    def feed(self, chunk):
+        """Add the next chunk of the body; returns the DriverRecords completed by it."""
+        self.bytes_received += len(chunk)
+        self._buffer += self._text_decoder.decode(chunk)
+        return self._parse()
+
+    def feed_text(self, text):
+        """Like feed(), for text that has already been decoded."""
+        self.bytes_received += len(text)
+        self._buffer += text
+        return self._parse()
+
+    @property
+    def finished(self):
+        return self._state in ("done", "unknown")
+
+    @property
+    def unparsed(self):
+        """Text received but not consumed yet."""
+        return self._buffer
+
+    def close(self):
+        """Finish parsing; raises ValueError if the body ended before the driver list did."""
+        self._buffer += self._text_decoder.decode(b"", final=True)
+        self._closing = True
+        records = self._parse()
+        if self._state not in ("done", "unknown"):
+            raise ValueError(f"Driver response ended early ({self.bytes_received} bytes)")
+        return records
+
+    def _value(self, position):
+        # Decode one complete JSON value, or return None if more input is needed
+        try:
+            value, end = self._json.raw_decode(self._buffer, position)
+        except json.JSONDecodeError as e:
+            # Truncated input fails at (or just before) the end of the buffer, or inside an unfinished
+            # string; an error further back can't be fixed by more input
+            incomplete = e.msg.startswith("Unterminated string") or len(self._buffer) - e.pos < _INCOMPLETE_TAIL
+            if self._closing or not incomplete:
+                raise ValueError(f"Invalid JSON in driver response at byte {self.bytes_received}")
+            return None
+        if not self._closing and not isinstance(value, (dict, list, str)):
+            # A number or literal running to the end of the buffer may continue in the next chunk;
+            # so may a number the chunk cut after "1." or "1e" (decoded as 1 with the rest left over)
+            if end >= len(self._buffer) - 1 or (isinstance(value, (int, float)) and self._buffer[end] in ".eE+-"):
+                return None
+        return value, end
+
+    def _parse(self):
+        records = []
+        position = 0
+        buffer = self._buffer
+        while self._state not in ("done", "unknown"):
+            position = _WHITESPACE.match(buffer, position).end()
+            if position == len(buffer):
+                break
+            char = buffer[position]
+            state = self._state
+
+            if state == "start":
+                if char == "[":
+                    self.format_name = "driver_list"
+                    self._extract = self._array_extract or EXTRACTORS["driver_list"]
+                    self._state = "array_first"
+                elif char == "{":
+                    self._state = "object_first"
+                else:
+                    self._state = "unknown"
+                    break
+                position += 1
+            elif state in ("object_first", "object_key"):
+                if char == "}" and state == "object_first":
+                    self._state = "done"
+                    position += 1
+                    continue
+                decoded = self._value(position)
+                if decoded is None:
+                    break
+                self._key, position = decoded
+                self._state = "object_colon"
+            elif state == "object_colon":
+                if char != ":":
+                    raise ValueError(f"Invalid JSON in driver response at byte {self.bytes_received}")
+                self._state = "object_value"
+                position += 1
+            elif state == "object_value":
+                if self._key == "Drivers" and char == "[":
+                    self.format_name = "drivers_object"
+                    self._extract = EXTRACTORS["drivers_object"]
+                    self._state = "array_first"
+                    position += 1
+                    continue
+                decoded = self._value(position)
+                if decoded is None:
+                    break
+                position = decoded[1]
+                self._state = "object_comma"
+            elif state == "object_comma":
+                if char == ",":
+                    self._state = "object_key"
+                elif char == "}":
+                    self._state = "done"
+                else:
+                    raise ValueError(f"Invalid JSON in driver response at byte {self.bytes_received}")
+                position += 1
+            elif state in ("array_first", "array_item"):
+                if char == "]" and state == "array_first":
+                    self._state = "object_comma" if self.format_name == "drivers_object" else "done"
+                    position += 1
+                    continue
+                decoded = self._value(position)
+                if decoded is None:
+                    break
+                raw, position = decoded
+                record = self._extract(raw)
+                if record is not None:
+                    records.append(record)
+                self._state = "array_comma"
+            elif state == "array_comma":
+                if char == ",":
+                    self._state = "array_item"
+                elif char == "]":
+                    self._state = "object_comma" if self.format_name == "drivers_object" else "done"
+                else:
+                    raise ValueError(f"Invalid JSON in driver response at byte {self.bytes_received}")
+                position += 1
+
+        # Drop everything already consumed so the buffer only holds the unfinished value
+        if self.finished:
+            self.remainder = buffer[position:]
+            self._buffer = ""
+        else:
+            self._buffer = buffer[position:]
+        return records
+
+
+_TITLE = re.compile(r"<title[^>]*>(.*?)</title>", re.IGNORECASE | re.DOTALL)
+# Driver arrays embedded in the page's script payloads (JSON state blobs, inline data)
+_EMBEDDED_DRIVERS = re.compile(r'"(?:Drivers|drivers|DriverList|driverList)"\s*:\s*\[')
+# Text kept between chunks so a title or marker split across chunk boundaries is still found
+_SCAN_OVERLAP = 256
+# Longest <title> element, and the most text one embedded array element may buffer
+_MAX_TITLE = 4096
+_MAX_ARRAY_BUFFER = 1024 * 1024
+
+
+class SupportPageParser:
+    """
+    Incremental extractor for the HTML support page used when every driver
+    API failed. The page is scanned chunk by chunk for the <title> (product
+    name) and for driver arrays embedded in script payloads; each array is
+    walked with a DriverStreamParser, so drivers come out as the same
+    DriverRecords the API path produces. feed() returns True once the title
+    and a non-empty driver array have been found, so the caller can stop
+    downloading; nothing but a small overlap and the array in progress is
+    held in memory. A marker followed by something that isn't a JSON array
+    (or an element past _MAX_ARRAY_BUFFER) is skipped and scanning resumes
+    after it.
+    """
+
+    def __init__(self):
+        self.title = None
+        self.records = []
+        self.bytes_received = 0
+        self._text_decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        self._pending = ""
+        self._title_pending = ""
+        self._array = None
+        self._found_drivers = False
+
+    @property
+    def done(self):
+        return self.title is not None and self._found_drivers and self._array is None
+
+    def feed(self, chunk):
+        """Add the next chunk of the page; returns True when the rest isn't needed."""
+        self.bytes_received += len(chunk)
+        self._scan(self._text_decoder.decode(chunk))
+        return self.done
+
+    def close(self):
+        """Finish scanning; a driver array cut off by the end of the page keeps the drivers read so far."""
+        self._scan(self._text_decoder.decode(b"", final=True))
+        self._array = None
+        return self.records
+
+    def _scan_title(self, text):
+        # Runs on every chunk, including those inside a driver array
+        text = self._title_pending + text
+        match = _TITLE.search(text)
+        if match:
+            self.title = html.unescape(match.group(1)).strip()
+            self._title_pending = ""
+            return
+        keep_from = max(len(text) - _SCAN_OVERLAP, 0)
+        # Keep an opening tag whose closing tag hasn't arrived yet
+        opening = text.lower().rfind("<title")
+        if opening >= 0 and len(text) - opening <= _MAX_TITLE:
+            keep_from = min(keep_from, opening)
+        self._title_pending = text[keep_from:]
+
+    def _scan(self, text):
+        if self.title is None:
+            self._scan_title(text)
+        while text and not self.done:
+            if self._array is not None:
+                try:
+                    records = self._array.feed_text(text)
+                except ValueError:
+                    # Not JSON after all (e.g. a JavaScript object literal); look for the next marker after it
+                    text = self._array.unparsed
+                    self._array = None
+                    continue
+                self.records.extend(records)
+                self._found_drivers = self._found_drivers or bool(records)
+                if self._array.finished:
+                    text = self._array.remainder
+                    self._array = None
+                    continue
+                if len(self._array.unparsed) > _MAX_ARRAY_BUFFER:
+                    # One "driver" this large is something else; stop buffering it
+                    text = self._array.unparsed
+                    self._array = None
+                    continue
+                return
+
+            text = self._pending + text
+            self._pending = ""
+            match = None if self._found_drivers else _EMBEDDED_DRIVERS.search(text)
+            if match:
+                self._array = DriverStreamParser(array_extract=extract_embedded)
+                text = text[match.end() - 1:]
+                continue
+            self._pending = text[-_SCAN_OVERLAP:]
+            return
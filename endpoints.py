@@ -0,0 +1,218 @@
+import json
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+# Dell's site; the benchmark suite points this at a local stand-in server
+DELL_BASE_URL = os.environ.get("DELL_BASE_URL", "https://www.dell.com").rstrip("/")
+
+# Dell has several driver-list APIs; which one answers varies over time
+DRIVER_ENDPOINT_TEMPLATES = [
+    "https://www.dell.com/support/driver-api/drivers/driverslist/{service_tag}",
+    "https://www.dell.com/support/driver-api/en-us/driverslist/{service_tag}",
+    "https://www.dell.com/support/component-api/drivers/list/{service_tag}",
+    "https://www.dell.com/support/component-api/en-us/drivers/list/{service_tag}",
+    "https://www.dell.com/support/home/api/drivers/downloads/{service_tag}",
+    "https://www.dell.com/support/home/en-us/api/drivers/downloads/{service_tag}",
+]
+
+
+# Status codes below 500 that mean the endpoint is blocking or throttling us; other 4xx
+# answers (e.g. 404 for an unknown service tag) are about the tag, not the endpoint
+ENDPOINT_FAILURE_STATUSES = {403, 429}
+
+
+# Function to decide whether an unsuccessful attempt counts against the endpoint
+def is_endpoint_failure(status):
+    """status is None for transport errors (timeouts, refused connections, unreadable bodies)."""
+    return status is None or status >= 500 or status in ENDPOINT_FAILURE_STATUSES
+
+
+# Function to point a www.dell.com URL at DELL_BASE_URL
+def dell_url(url):
+    if url.startswith("https://www.dell.com"):
+        return DELL_BASE_URL + url[len("https://www.dell.com"):]
+    return url
+
+
+# Function to build the request URL of an endpoint template for a service tag
+def endpoint_url(template, service_tag):
+    return dell_url(template.format(service_tag=service_tag))
+
+
+class EndpointSelector:
+    """
+    Learns which driver endpoints work. Tracks success rate and latency per URL
+    template, puts the last known-good endpoint first and opens a circuit breaker
+    with exponential backoff on endpoints that keep failing. Only transport
+    errors, 5xx and 403/429 count as failures (see is_endpoint_failure), so an
+    unknown service tag can't put a shared endpoint into backoff. State is
+    persisted to a JSON file so it survives restarts.
+    """
+
+    def __init__(self, templates=None, path="data/endpoint_stats.json",
+                 base_backoff=60, max_backoff=6 * 3600):
+        self.templates = list(templates or DRIVER_ENDPOINT_TEMPLATES)
+        self.path = path
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.lock = threading.Lock()
+        self.last_good = None
+        self.stats = {}
+        self._load()
+
+    def _load(self):
+        if self.path and os.path.exists(self.path):
+            try:
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    state = json.load(f)
+                self.last_good = state.get("last_good")
+                self.stats = state.get("endpoints", {})
+            except (OSError, ValueError):
+                self.stats = {}
+
+    def _save(self):
+        if not self.path:
+            return
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # The app, API and job processes share the file; each writes its own temporary file
+        with tempfile.NamedTemporaryFile('w', encoding='utf-8', dir=directory or ".",
+                                         prefix=f"{os.path.basename(self.path)}.", suffix=".tmp",
+                                         delete=False) as f:
+            json.dump({"last_good": self.last_good, "endpoints": self.stats}, f, indent=4)
+        os.replace(f.name, self.path)
+
+    def _entry(self, template):
+        return self.stats.setdefault(template, {
+            "successes": 0,
+            "failures": 0,
+            "consecutive_failures": 0,
+            "latency": None,
+            "last_status": None,
+            "open_until": 0,
+        })
+
+    def success_rate(self, template):
+        entry = self.stats.get(template, {})
+        successes = entry.get("successes", 0)
+        failures = entry.get("failures", 0)
+        # Smoothed so untried endpoints start at 0.5
+        return (successes + 1) / (successes + failures + 2)
+
+    def ranked(self):
+        """Templates to try, best first. Endpoints in backoff are skipped unless all are."""
+        now = time.time()
+        with self.lock:
+            available = [t for t in self.templates if self.stats.get(t, {}).get("open_until", 0) <= now]
+            if not available:
+                # Everything is in backoff: probe the one whose backoff ends soonest
+                return [min(self.templates, key=lambda t: self.stats[t]["open_until"])]
+
+            def sort_key(template):
+                latency = self.stats.get(template, {}).get("latency")
+                return (template != self.last_good,
+                        -self.success_rate(template),
+                        latency if latency is not None else float("inf"))
+
+            return sorted(available, key=sort_key)
+
+    def expected_latency(self, template, default=2.0):
+        with self.lock:
+            latency = self.stats.get(template, {}).get("latency")
+        return latency if latency is not None else default
+
+    def record(self, template, ok, latency=None, status=None):
+        with self.lock:
+            entry = self._entry(template)
+            entry["last_status"] = status
+            if latency is not None:
+                # Exponentially weighted moving average
+                entry["latency"] = latency if entry["latency"] is None else 0.7 * entry["latency"] + 0.3 * latency
+            if ok:
+                entry["successes"] += 1
+                entry["consecutive_failures"] = 0
+                entry["open_until"] = 0
+                self.last_good = template
+            elif is_endpoint_failure(status):
+                entry["failures"] += 1
+                entry["consecutive_failures"] += 1
+                backoff = min(self.max_backoff, self.base_backoff * 2 ** (entry["consecutive_failures"] - 1))
+                entry["open_until"] = time.time() + backoff
+                if self.last_good == template:
+                    self.last_good = None
+            self._save()
+
+    def snapshot(self):
+        """Per-endpoint stats for display"""
+        now = time.time()
+        with self.lock:
+            rows = []
+            for template in self.templates:
+                entry = self.stats.get(template, {})
+                rows.append({
+                    "endpoint": template,
+                    "last_good": template == self.last_good,
+                    "successes": entry.get("successes", 0),
+                    "failures": entry.get("failures", 0),
+                    "latency_s": round(entry["latency"], 3) if entry.get("latency") is not None else None,
+                    "last_status": entry.get("last_status"),
+                    "backoff_s": max(0, round(entry.get("open_until", 0) - now)),
+                })
+            return rows
+
+
+# Function to yield driver endpoint responses in ranked order, optionally hedged
+def iter_endpoint_responses(templates, service_tag, fetch, hedge=1, hedge_delay=2.0):
+    """
+    Yield (template, url, response, error, latency) for each endpoint attempt.
+
+    With hedge > 1 the first `hedge` candidates are raced: the next candidate
+    is started whenever the previous one hasn't answered within hedge_delay
+    seconds, and results are yielded in completion order. Callers stop
+    iterating as soon as they get a usable response.
+    """
+    def timed_fetch(template):
+        url = endpoint_url(template, service_tag)
+        started = time.monotonic()
+        try:
+            return template, url, fetch(url), None, time.monotonic() - started
+        except Exception as e:
+            return template, url, None, e, time.monotonic() - started
+
+    raced = templates[:hedge] if hedge > 1 else []
+    if raced:
+        executor = ThreadPoolExecutor(max_workers=len(raced), thread_name_prefix="dell-hedge")
+        try:
+            pending = set()
+            queue = list(raced)
+            while queue or pending:
+                if queue:
+                    pending.add(executor.submit(timed_fetch, queue.pop(0)))
+                done, pending = wait(pending, timeout=hedge_delay if queue else None,
+                                     return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    for template in templates[len(raced):]:
+        yield timed_fetch(template)
+
+
+_default_selector = None
+_default_selector_lock = threading.Lock()
+
+
+# Function to get the process-wide endpoint selector
+def get_endpoint_selector():
+    global _default_selector
+    with _default_selector_lock:
+        if _default_selector is None:
+            _default_selector = EndpointSelector(
+                path=os.environ.get("DELL_ENDPOINT_STATS_PATH", "data/endpoint_stats.json")
+            )
+        return _default_selector
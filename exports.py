@@ -0,0 +1,85 @@
+import io
+import json
+import zipfile
+from datetime import datetime
+
+from metrics import timed
+from reports import render_result
+
+
+# Function to pick the exported fields of a stored result
+def export_record(result):
+    return {
+        "service_tag": result["service_tag"],
+        "product_info": result["product_info"],
+        "timestamp": result["timestamp"],
+        "drivers": result["drivers"]
+    }
+
+
+# Function to export a stored result as JSON
+@timed("export_json")
+def export_json(result):
+    return json.dumps(export_record(result), indent=4)
+
+
+# Function to export a stored result as Markdown (rendered from templates/result.md.j2, cached by content)
+@timed("export_markdown")
+def export_markdown(result):
+    return render_result(result, "md")
+
+
+# Function to build the download file name for an export
+def export_file_name(result, extension):
+    timestamp = datetime.fromisoformat(result["timestamp"]).strftime("%Y%m%d_%H%M%S")
+    return f"{result['service_tag']}_{timestamp}.{extension}"
+
+
+# Function to build the download file name for a bulk export of many results
+def bulk_export_name(extension):
+    return f"dell_drivers_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{extension}"
+
+
+# Function to stream results as NDJSON, one result per line
+def iter_ndjson(results):
+    """results is any iterable (e.g. ResultStore.iter_latest()); only one result is held at a time."""
+    for result in results:
+        yield (json.dumps(export_record(result)) + "\n").encode("utf-8")
+
+
+class _ZipSink(io.RawIOBase):
+    """Unseekable write target for ZipFile; the bytes written so far are handed out with take()."""
+
+    def __init__(self):
+        super().__init__()
+        self.chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def take(self):
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
+
+# Function to stream results as a zip with a JSON and a Markdown file per result
+def iter_zip(results, extensions=("json", "md")):
+    """
+    The archive is written to an unseekable sink, so zipfile emits each entry
+    (with a trailing data descriptor) as soon as it is added and the bytes can
+    be yielded right away; only the current result's exports are in memory.
+    """
+    sink = _ZipSink()
+    with zipfile.ZipFile(sink, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        for result in results:
+            for extension in extensions:
+                content = export_json(result) if extension == "json" else export_markdown(result)
+                archive.writestr(export_file_name(result, extension), content)
+                yield sink.take()
+    # Central directory, written when the archive is closed
+    yield sink.take()
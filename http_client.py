@@ -0,0 +1,220 @@
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+from metrics import HTTP_RETRIES
+
+# Status codes worth retrying: rate limiting and transient server errors
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+# Methods safe to send twice; anything else (POST, PATCH) is only retried when it never reached the server
+IDEMPOTENT_METHODS = {"GET", "HEAD", "OPTIONS", "PUT", "DELETE", "TRACE"}
+
+
+# Function to parse a Retry-After header (seconds or HTTP date) into a delay
+def parse_retry_after(value):
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+
+
+class HttpClient:
+    """
+    Process-wide HTTP client with keep-alive connection pooling and retries.
+
+    Uses httpx with HTTP/2 when httpx and h2 are installed (and http2 isn't
+    disabled), otherwise a requests.Session with a pooled HTTPAdapter.
+    Idempotent requests answered with 429/5xx or failing in transport are
+    retried with jittered exponential backoff, honouring Retry-After when the
+    server sends it; other methods (POST) are only retried when they couldn't
+    connect, as the server may already have acted on them.
+    before_retry, if given to request() or stream(), is called before every
+    retry, e.g. to draw a token from a batch's rate budget.
+    """
+
+    def __init__(self, pool_connections=10, pool_maxsize=20, max_retries=3,
+                 backoff=0.5, max_backoff=30.0, http2=None, timeout=30):
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.timeout = timeout
+        self.retries = 0
+        self.lock = threading.Lock()
+        self.http2 = False
+
+        if http2 is not False:
+            try:
+                import h2  # noqa: F401
+                import httpx
+                self.transport_errors = (httpx.TransportError,)
+                self.connect_errors = (httpx.ConnectError, httpx.ConnectTimeout)
+                self.session = httpx.Client(
+                    http2=True,
+                    limits=httpx.Limits(max_connections=pool_connections * pool_maxsize,
+                                        max_keepalive_connections=pool_maxsize),
+                    follow_redirects=True,
+                )
+                self.http2 = True
+            except ImportError:
+                if http2:
+                    raise
+
+        if not self.http2:
+            import requests
+            from requests.adapters import HTTPAdapter
+            self.transport_errors = (requests.ConnectionError, requests.Timeout)
+            self.connect_errors = (requests.exceptions.ConnectTimeout,)
+            self.session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize)
+            self.session.mount("https://", adapter)
+            self.session.mount("http://", adapter)
+
+    @property
+    def cookies(self):
+        return self.session.cookies
+
+    def _retry_delay(self, attempt, response=None):
+        if response is not None:
+            retry_after = parse_retry_after(response.headers.get("Retry-After"))
+            if retry_after is not None:
+                return min(retry_after, self.max_backoff)
+        # Full jitter: anywhere between 0 and the exponential ceiling
+        return random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+
+    def _retryable_error(self, method, exc):
+        if method.upper() in IDEMPOTENT_METHODS:
+            return isinstance(exc, self.transport_errors)
+        if isinstance(exc, self.connect_errors):
+            return True
+        # requests reports a refused connection and a dropped one alike as ConnectionError;
+        # only the former (urllib3's NewConnectionError) is known not to have sent anything
+        if not self.http2 and isinstance(exc, self.transport_errors) and exc.args:
+            from urllib3.exceptions import NewConnectionError
+            return isinstance(getattr(exc.args[0], "reason", None), NewConnectionError)
+        return False
+
+    def _retryable_status(self, method, response):
+        return response.status_code in RETRY_STATUSES and method.upper() in IDEMPOTENT_METHODS
+
+    def _count_retry(self):
+        HTTP_RETRIES.inc()
+        with self.lock:
+            self.retries += 1
+
+    def request(self, method, url, before_retry=None, **kwargs):
+        kwargs.setdefault("timeout", self.timeout)
+        attempt = 0
+        while True:
+            try:
+                response = self.session.request(method, url, **kwargs)
+            except Exception as exc:
+                if attempt >= self.max_retries or not self._retryable_error(method, exc):
+                    raise
+                delay = self._retry_delay(attempt)
+            else:
+                if not self._retryable_status(method, response) or attempt >= self.max_retries:
+                    return response
+                delay = self._retry_delay(attempt, response)
+                response.close()
+            self._count_retry()
+            time.sleep(delay)
+            if before_retry:
+                before_retry()
+            attempt += 1
+
+    def get(self, url, **kwargs):
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request("POST", url, **kwargs)
+
+    @contextmanager
+    def stream(self, method, url, before_retry=None, **kwargs):
+        """
+        Open a streaming response. Only establishing the response is retried,
+        under the same rules as request(); the body is read incrementally by the caller with iter_lines()/iter_bytes().
+        """
+        kwargs.setdefault("timeout", self.timeout)
+        attempt = 0
+        while True:
+            try:
+                if self.http2:
+                    context = self.session.stream(method, url, **kwargs)
+                    response = context.__enter__()
+                else:
+                    context = None
+                    response = self.session.request(method, url, stream=True, **kwargs)
+            except Exception as exc:
+                if attempt >= self.max_retries or not self._retryable_error(method, exc):
+                    raise
+                self._count_retry()
+                time.sleep(self._retry_delay(attempt))
+                if before_retry:
+                    before_retry()
+                attempt += 1
+                continue
+            if self._retryable_status(method, response) and attempt < self.max_retries:
+                delay = self._retry_delay(attempt, response)
+                self._close(response, context)
+                self._count_retry()
+                time.sleep(delay)
+                if before_retry:
+                    before_retry()
+                attempt += 1
+                continue
+            try:
+                yield response
+            finally:
+                self._close(response, context)
+            return
+
+    @staticmethod
+    def _close(response, context):
+        if context is not None:
+            context.__exit__(None, None, None)
+        else:
+            response.close()
+
+    def close(self):
+        self.session.close()
+
+
+# Function to read a streamed response body in chunks, with either backend
+def iter_body(response, chunk_size=65536):
+    if hasattr(response, "iter_bytes"):
+        return response.iter_bytes(chunk_size)
+    return response.iter_content(chunk_size)
+
+
+_default_client = None
+_default_client_lock = threading.Lock()
+
+
+# Function to get the shared HTTP client used by the Dell and Ollama paths
+def get_http_client():
+    global _default_client
+    with _default_client_lock:
+        if _default_client is None:
+            http2 = os.environ.get("HTTP_HTTP2", "auto").lower()
+            _default_client = HttpClient(
+                pool_connections=int(os.environ.get("HTTP_POOL_CONNECTIONS", 10)),
+                pool_maxsize=int(os.environ.get("HTTP_POOL_MAXSIZE", 20)),
+                max_retries=int(os.environ.get("HTTP_MAX_RETRIES", 3)),
+                backoff=float(os.environ.get("HTTP_BACKOFF", 0.5)),
+                max_backoff=float(os.environ.get("HTTP_MAX_BACKOFF", 30)),
+                http2=None if http2 == "auto" else http2 in ("1", "true", "yes"),
+            )
+        return _default_client
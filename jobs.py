@@ -0,0 +1,222 @@
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from dell_api import get_dell_drivers
+from logging_setup import lookup_context
+
+ACTIVE_STATUSES = ("queued", "running")
+# Inserts tried by submit() while other processes keep queueing (and finishing) the same tag
+SUBMIT_ATTEMPTS = 5
+
+
+class JobQueue:
+    """
+    Background worker pool for driver lookups with a persistent SQLite job
+    table. Submitting returns a job id immediately; callers poll get() for
+    progress. Lookups for a tag that is already queued or running share the
+    existing job instead of starting another Dell fetch (single-flight).
+
+    Every process sharing the table heartbeats the jobs it owns every
+    heartbeat_interval seconds. A queued or running job whose heartbeat is
+    older than stale_after seconds belongs to a process that died (e.g. a
+    crashed container); any live process takes it over and runs it again,
+    so it never blocks later lookups of its tag.
+
+    A job can be given a throttle for its requests (see get_dell_drivers),
+    e.g. a batch's shared rate budget. It is kept in memory only, so a job
+    taken over by another process runs with the default throttle.
+    """
+
+    def __init__(self, path="data/jobs.db", workers=4, heartbeat_interval=10, stale_after=60, report_interval=0.5):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.lock = threading.Lock()
+        self.heartbeat_interval = heartbeat_interval
+        self.stale_after = stale_after
+        self.report_interval = report_interval
+        # Identifies this process's jobs in a table shared with other processes
+        self.owner = uuid.uuid4().hex
+        # job id -> throttle passed to submit(), until the job starts
+        self.throttles = {}
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                service_tag TEXT NOT NULL,
+                status TEXT NOT NULL,
+                hedge INTEGER NOT NULL DEFAULT 1,
+                message TEXT,
+                steps INTEGER NOT NULL DEFAULT 0,
+                fetch_id INTEGER,
+                error TEXT,
+                owner TEXT,
+                heartbeat_at REAL,
+                created_at REAL NOT NULL,
+                started_at REAL,
+                finished_at REAL,
+                updated_at REAL NOT NULL
+            )
+        """)
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_tag_status ON jobs (service_tag, status)")
+        # At most one in-flight job per tag, even with several processes sharing the table
+        self.conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_jobs_in_flight ON jobs (service_tag) "
+                          "WHERE status IN ('queued', 'running')")
+        self.conn.commit()
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="dell-job")
+        self.recover()
+        threading.Thread(target=self._heartbeat_loop, name="dell-job-heartbeat", daemon=True).start()
+
+    def _stale(self, job, now=None):
+        heartbeat = job["heartbeat_at"] or job["updated_at"]
+        return job["status"] in ACTIVE_STATUSES and heartbeat < (now or time.time()) - self.stale_after
+
+    def _take_over(self, job_id, now):
+        # Atomic across processes: only the process whose update still sees the stale heartbeat runs it
+        with self.lock:
+            cursor = self.conn.execute(
+                "UPDATE jobs SET status = 'queued', owner = ?, heartbeat_at = ?, updated_at = ?, "
+                "message = 'Restarted after its worker stopped' "
+                "WHERE id = ? AND status IN (?, ?) AND COALESCE(heartbeat_at, updated_at) < ?",
+                (self.owner, now, now, job_id) + ACTIVE_STATUSES + (now - self.stale_after,)
+            )
+            self.conn.commit()
+        if cursor.rowcount:
+            self.executor.submit(self._run, job_id)
+        return bool(cursor.rowcount)
+
+    def recover(self):
+        """Run the jobs again that were left queued or running by a process that stopped heartbeating."""
+        now = time.time()
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT id FROM jobs WHERE status IN (?, ?) AND COALESCE(heartbeat_at, updated_at) < ?",
+                ACTIVE_STATUSES + (now - self.stale_after,)
+            ).fetchall()
+        return [row["id"] for row in rows if self._take_over(row["id"], now)]
+
+    def _heartbeat_loop(self):
+        while True:
+            time.sleep(self.heartbeat_interval)
+            try:
+                with self.lock:
+                    self.conn.execute("UPDATE jobs SET heartbeat_at = ? WHERE owner = ? AND status IN (?, ?)",
+                                      (time.time(), self.owner) + ACTIVE_STATUSES)
+                    self.conn.commit()
+                self.recover()
+            except sqlite3.Error:
+                # A locked database is retried on the next beat
+                continue
+
+    def submit(self, service_tag, hedge=1, throttle=None):
+        """Queue a lookup and return its job id, reusing an in-flight job for the same tag."""
+        now = time.time()
+        with self.lock:
+            for attempt in range(SUBMIT_ATTEMPTS):
+                row = self.conn.execute(
+                    "SELECT id, status, heartbeat_at, updated_at FROM jobs WHERE service_tag = ? AND status IN (?, ?) "
+                    "ORDER BY created_at LIMIT 1", (service_tag,) + ACTIVE_STATUSES
+                ).fetchone()
+                if row is not None:
+                    break
+                job_id = uuid.uuid4().hex
+                try:
+                    self.conn.execute(
+                        "INSERT INTO jobs (id, service_tag, status, hedge, message, owner, heartbeat_at, created_at, "
+                        "updated_at) VALUES (?, ?, 'queued', ?, 'Waiting for a worker', ?, ?, ?, ?)",
+                        (job_id, service_tag, hedge, self.owner, now, now, now)
+                    )
+                    self.conn.commit()
+                    break
+                except sqlite3.IntegrityError:
+                    # Another process queued the same tag in the meantime: share its job, or queue
+                    # again if it already finished before it could be read
+                    self.conn.rollback()
+                    if attempt == SUBMIT_ATTEMPTS - 1:
+                        raise
+        if row is not None:
+            # The in-flight job may belong to a process that died; if so it is run here
+            if self._stale(row, now):
+                self._take_over(row["id"], now)
+            return row["id"]
+        if throttle is not None:
+            self.throttles[job_id] = throttle
+        self.executor.submit(self._run, job_id)
+        return job_id
+
+    def _update(self, job_id, **fields):
+        fields["updated_at"] = time.time()
+        assignments = ", ".join(f"{name} = ?" for name in fields)
+        with self.lock:
+            self.conn.execute(f"UPDATE jobs SET {assignments} WHERE id = ?", list(fields.values()) + [job_id])
+            self.conn.commit()
+
+    def _run(self, job_id):
+        job = self.get(job_id)
+        throttle = self.throttles.pop(job_id, None)
+        if job is None or job["status"] not in ACTIVE_STATUSES:
+            return
+        self._update(job_id, status="running", started_at=time.time(), message="Starting lookup")
+        steps = 0
+
+        last_report = 0.0
+
+        def report(message):
+            # Progress is coalesced to a few writes per second; the full log is in the process's logs/*.jsonl
+            nonlocal steps, last_report
+            steps += 1
+            if time.monotonic() - last_report >= self.report_interval:
+                last_report = time.monotonic()
+                self._update(job_id, message=message, steps=steps)
+
+        try:
+            with lookup_context(job["service_tag"], lookup_id=job_id):
+                fetch_id = get_dell_drivers(job["service_tag"], log_callback=report, hedge=job["hedge"],
+                                            throttle=throttle)
+            self._update(job_id, status="done", fetch_id=fetch_id,
+                         finished_at=time.time(), message="Finished")
+        except Exception as e:
+            self._update(job_id, status="failed", error=str(e), finished_at=time.time(), message="Failed")
+
+    def get(self, job_id):
+        with self.lock:
+            row = self.conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return dict(row) if row is not None else None
+
+    def recent(self, limit=20):
+        with self.lock:
+            rows = self.conn.execute("SELECT * FROM jobs ORDER BY created_at DESC LIMIT ?", (limit,)).fetchall()
+        return [dict(row) for row in rows]
+
+    def wait(self, job_id, timeout=None, interval=0.5):
+        """Block until the job finishes (or timeout) and return it."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            job = self.get(job_id)
+            if job is None or job["status"] not in ACTIVE_STATUSES:
+                return job
+            if deadline is not None and time.monotonic() >= deadline:
+                return job
+            time.sleep(interval)
+
+
+_default_queue = None
+_default_queue_lock = threading.Lock()
+
+
+# Function to get the process-wide job queue
+def get_job_queue():
+    global _default_queue
+    with _default_queue_lock:
+        if _default_queue is None:
+            _default_queue = JobQueue(
+                path=os.environ.get("DELL_JOBS_PATH", "data/jobs.db"),
+                workers=int(os.environ.get("DELL_JOB_WORKERS", 4)),
+            )
+        return _default_queue
@@ -0,0 +1,242 @@
+import atexit
+import contextvars
+import functools
+import gzip
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import shutil
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime
+
+LOG_DIR = os.environ.get("DELL_LOG_DIR", "logs")
+PAYLOAD_DIR = os.path.join(LOG_DIR, "payloads")
+
+# Correlation fields of the lookup running in the current thread/context
+_lookup_context = contextvars.ContextVar("lookup_context", default={})
+
+
+class LookupContextFilter(logging.Filter):
+    """Stamps every record with the lookup id and service tag of the current lookup."""
+
+    def filter(self, record):
+        for key, value in _lookup_context.get().items():
+            if not hasattr(record, key):
+                setattr(record, key, value)
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line, including correlation fields and any extra= values."""
+
+    STANDARD_ATTRIBUTES = set(vars(logging.makeLogRecord({}))) | {"message", "asctime"}
+
+    def format(self, record):
+        entry = {
+            "ts": datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in self.STANDARD_ATTRIBUTES and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that never blocks the caller: records are dropped (and counted) when the queue is full."""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+# Functions used as namer/rotator so rotated log files are gzip-compressed
+def _gzip_namer(name):
+    return name + ".gz"
+
+
+def _gzip_rotator(source, destination):
+    with open(source, "rb") as f_in, gzip.open(destination, "wb") as f_out:
+        shutil.copyfileobj(f_in, f_out)
+    os.remove(source)
+
+
+# Function to create the rotating file handler the queue listener writes to
+def _file_handler(path):
+    when = os.environ.get("DELL_LOG_ROTATE_WHEN")
+    backups = int(os.environ.get("DELL_LOG_BACKUPS", 10))
+    if when:
+        # Time-based, e.g. "midnight" or "H"
+        handler = logging.handlers.TimedRotatingFileHandler(path, when=when, backupCount=backups,
+                                                            encoding="utf-8", delay=True)
+    else:
+        max_bytes = int(float(os.environ.get("DELL_LOG_MAX_MB", 10)) * 1024 * 1024)
+        handler = logging.handlers.RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backups,
+                                                       encoding="utf-8", delay=True)
+    handler.namer = _gzip_namer
+    handler.rotator = _gzip_rotator
+    handler.setFormatter(JsonFormatter())
+    return handler
+
+
+_listener = None
+_listener_lock = threading.Lock()
+
+
+# Function to set up the application's logging pipeline once per process
+def setup_logging(level=None, name=None):
+    """
+    Loggers under "dell" hand records to a bounded in-memory queue; a
+    background listener thread writes them as JSON lines to
+    logs/<name>.jsonl, rotated by size (DELL_LOG_MAX_MB) or time
+    (DELL_LOG_ROTATE_WHEN) and gzip-compressed. Callers never wait for disk.
+
+    Each process needs a file of its own, since a rotating handler can't
+    share one with another process: the app and the API pass their service
+    name, DELL_LOG_NAME overrides it (e.g. for a second API container) and
+    anything else logs to dell_api.jsonl.
+    """
+    global _listener
+    with _listener_lock:
+        if _listener is not None:
+            return _listener
+        os.makedirs(LOG_DIR, exist_ok=True)
+        log_queue = queue.Queue(maxsize=int(os.environ.get("DELL_LOG_QUEUE_SIZE", 10000)))
+        queue_handler = DroppingQueueHandler(log_queue)
+        queue_handler.addFilter(LookupContextFilter())
+
+        logger = logging.getLogger("dell")
+        logger.setLevel(level or os.environ.get("DELL_LOG_LEVEL", "INFO"))
+        logger.addHandler(queue_handler)
+        logger.propagate = False
+
+        log_name = os.environ.get("DELL_LOG_NAME") or name or "dell_api"
+        _listener = logging.handlers.QueueListener(log_queue, _file_handler(os.path.join(LOG_DIR, f"{log_name}.jsonl")),
+                                                   respect_handler_level=True)
+        _listener.start()
+        atexit.register(_listener.stop)
+        return _listener
+
+
+@contextmanager
+def lookup_context(service_tag, lookup_id=None):
+    """
+    Tag every log record emitted inside the block with a per-lookup correlation
+    id. A nested block for the same tag keeps the outer id, so a job id set by
+    the job queue follows the lookup it runs.
+    """
+    current = _lookup_context.get()
+    if lookup_id is None and current.get("service_tag") == service_tag:
+        lookup_id = current.get("lookup_id")
+    lookup_id = lookup_id or uuid.uuid4().hex[:12]
+    token = _lookup_context.set({"lookup_id": lookup_id, "service_tag": service_tag})
+    try:
+        yield lookup_id
+    finally:
+        _lookup_context.reset(token)
+
+
+# Decorator running a function taking a service tag first inside a lookup context
+def correlated(function):
+    @functools.wraps(function)
+    def wrapper(service_tag, *args, **kwargs):
+        with lookup_context(service_tag):
+            return function(service_tag, *args, **kwargs)
+    return wrapper
+
+
+class PayloadDumps:
+    """
+    Retention policy for the raw Dell payloads kept for debugging. Only a
+    sample of lookups keep their payloads (always all of them for failures);
+    files are overwritten per tag and kind, and the oldest are pruned once
+    the directory exceeds max_files or max_bytes.
+    """
+
+    def __init__(self, directory=PAYLOAD_DIR, sample_rate=0.1, max_files=500, max_bytes=200 * 1024 * 1024,
+                 prune_every=25):
+        self.directory = directory
+        self.sample_rate = sample_rate
+        self.max_files = max_files
+        self.max_bytes = max_bytes
+        self.prune_every = prune_every
+        self.lock = threading.Lock()
+        self.written = 0
+
+    def sampled(self):
+        """Decide once per lookup whether its successful payloads are kept."""
+        return random.random() < self.sample_rate
+
+    def path(self, service_tag, kind, extension="json"):
+        os.makedirs(self.directory, exist_ok=True)
+        return os.path.join(self.directory, f"{service_tag}_{kind}.{extension}")
+
+    def write(self, service_tag, kind, content, extension="json"):
+        path = self.path(service_tag, kind, extension)
+        with open(path, "wb") as f:
+            f.write(content if isinstance(content, bytes) else content.encode("utf-8"))
+        self.kept()
+        return path
+
+    def kept(self):
+        # Prune every few writes rather than on each one to keep directory scans rare
+        with self.lock:
+            self.written += 1
+            if self.written % self.prune_every:
+                return
+        self.prune()
+
+    def prune(self):
+        try:
+            entries = [entry for entry in os.scandir(self.directory) if entry.is_file()]
+        except FileNotFoundError:
+            return 0
+        entries.sort(key=lambda entry: entry.stat().st_mtime, reverse=True)
+        total = 0
+        removed = 0
+        for index, entry in enumerate(entries):
+            total += entry.stat().st_size
+            # In-progress part files younger than a minute belong to running lookups
+            if entry.name.endswith(".part") and time.time() - entry.stat().st_mtime < 60:
+                continue
+            if index >= self.max_files or total > self.max_bytes:
+                try:
+                    os.remove(entry.path)
+                    removed += 1
+                except OSError:
+                    pass
+        return removed
+
+
+_default_dumps = None
+_default_dumps_lock = threading.Lock()
+
+
+# Function to get the process-wide payload dump policy
+def get_payload_dumps():
+    global _default_dumps
+    with _default_dumps_lock:
+        if _default_dumps is None:
+            _default_dumps = PayloadDumps(
+                sample_rate=float(os.environ.get("DELL_DUMP_SAMPLE_RATE", 0.1)),
+                max_files=int(os.environ.get("DELL_DUMP_MAX_FILES", 500)),
+                max_bytes=int(os.environ.get("DELL_DUMP_MAX_MB", 200)) * 1024 * 1024,
+            )
+            _default_dumps.prune()
+        return _default_dumps
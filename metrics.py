@@ -0,0 +1,105 @@
+import functools
+import os
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Gauge, Histogram, generate_latest, start_http_server
+
+# OpenTelemetry is optional; spans are only created when the API package is installed
+try:
+    from opentelemetry import trace
+    _tracer = trace.get_tracer("dell-driver-scraper")
+except ImportError:
+    _tracer = None
+
+# Buckets spanning cache hits (milliseconds) to slow, throttled Dell calls (a minute)
+SECONDS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2, 3, 5, 8, 13, 20, 30, 60)
+
+LOOKUP_SECONDS = Histogram("dell_lookup_duration_seconds", "Duration of a full driver lookup",
+                           ["outcome"], buckets=SECONDS_BUCKETS)
+LOOKUPS_IN_FLIGHT = Gauge("dell_lookups_in_flight", "Driver lookups currently running")
+STAGE_SECONDS = Histogram("dell_stage_duration_seconds", "Duration of one stage of a lookup or chat",
+                          ["stage"], buckets=SECONDS_BUCKETS)
+ENDPOINT_SECONDS = Histogram("dell_endpoint_duration_seconds", "Duration of one driver endpoint attempt",
+                             ["endpoint", "outcome"], buckets=SECONDS_BUCKETS)
+HTTP_RESPONSES = Counter("dell_http_responses_total", "Responses from Dell by request kind and status code",
+                         ["kind", "status"])
+HTTP_RETRIES = Counter("http_retries_total", "Requests retried after 429/5xx or a connection error")
+CACHE_EVENTS = Counter("dell_cache_events_total", "Response cache hits, misses, revalidations and evictions",
+                       ["event"])
+CATALOG_EVENTS = Counter("dell_catalog_events_total", "Driver lists served from or missing in product catalogs",
+                         ["event"])
+OLLAMA_FIRST_TOKEN_SECONDS = Histogram("ollama_time_to_first_token_seconds", "Time until Ollama's first token",
+                                       buckets=SECONDS_BUCKETS)
+OLLAMA_TOKENS = Counter("ollama_generated_tokens_total", "Tokens generated by Ollama")
+CHAT_ANSWERS = Counter("chat_answers_total", "Chat answers by source (summary, cache or ollama)", ["source"])
+OLLAMA_OUTSTANDING = Gauge("ollama_outstanding_requests", "Requests in flight per Ollama backend", ["backend"])
+OLLAMA_REQUEST_SECONDS = Histogram("ollama_request_duration_seconds",
+                                   "Duration of chat, warm-up and health-check requests per Ollama backend",
+                                   ["backend", "outcome"], buckets=SECONDS_BUCKETS)
+OLLAMA_BACKEND_UP = Gauge("ollama_backend_up", "1 if the Ollama backend's last request or health check succeeded",
+                          ["backend"])
+
+
+# Function to turn an endpoint template into a short, bounded metric label
+def endpoint_label(template):
+    return template.split("?")[0].replace("https://www.dell.com", "").replace("/{service_tag}", "")
+
+
+# Function to start an OpenTelemetry span when tracing is available
+def span(name, **attributes):
+    if _tracer is None:
+        return nullcontext()
+    return _tracer.start_as_current_span(name, attributes=attributes)
+
+
+@contextmanager
+def timed(stage, **attributes):
+    """Observe the block's duration as one stage, inside a span of the same name."""
+    started = time.perf_counter()
+    with span(stage, **attributes):
+        try:
+            yield
+        finally:
+            STAGE_SECONDS.labels(stage).observe(time.perf_counter() - started)
+
+
+# Decorator for lookup functions taking a service tag first: in-flight gauge, duration and span
+def instrumented_lookup(function):
+    @functools.wraps(function)
+    def wrapper(service_tag, *args, **kwargs):
+        started = time.perf_counter()
+        outcome = "error"
+        LOOKUPS_IN_FLIGHT.inc()
+        try:
+            with span("get_dell_drivers", service_tag=service_tag):
+                result = function(service_tag, *args, **kwargs)
+            outcome = "ok"
+            return result
+        finally:
+            LOOKUPS_IN_FLIGHT.dec()
+            LOOKUP_SECONDS.labels(outcome).observe(time.perf_counter() - started)
+    return wrapper
+
+
+# Function to render the metrics in the Prometheus text format: (body, content type)
+def render_metrics():
+    return generate_latest(), CONTENT_TYPE_LATEST
+
+
+_server_started = False
+_server_lock = threading.Lock()
+
+
+# Function to serve /metrics from a process without the REST API (the Streamlit app)
+def start_metrics_server(port=None):
+    global _server_started
+    port = port or os.environ.get("DELL_METRICS_PORT")
+    if not port:
+        return False
+    with _server_lock:
+        if not _server_started:
+            start_http_server(int(port))
+            _server_started = True
+    return True
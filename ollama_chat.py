@@ -0,0 +1,296 @@
+import json
+import logging
+import os
+import sqlite3
+import time
+
+from http_client import get_http_client
+from metrics import CHAT_ANSWERS, OLLAMA_FIRST_TOKEN_SECONDS, OLLAMA_TOKENS, STAGE_SECONDS, span
+from ollama_pool import DEFAULT_KEEP_ALIVE, get_ollama_pool
+from retrieval import build_driver_context, build_product_context
+from store import get_store
+from summaries import answer_question, get_summary, normalize_question, summary_context
+
+DEFAULT_OLLAMA_MODEL = os.environ.get("OLLAMA_MODEL", "llama3")
+
+logger = logging.getLogger("dell.ollama_chat")
+
+
+class OllamaError(Exception):
+    """A failed chat request; retryable when nothing had been streamed yet, so another backend can take over."""
+
+    def __init__(self, message, retryable=True):
+        super().__init__(message)
+        self.retryable = retryable
+
+
+class StreamStats:
+    """Timing for one streamed Ollama completion."""
+
+    def __init__(self):
+        self.started = time.monotonic()
+        self.first_token_at = None
+        self.finished_at = None
+        self.tokens = 0
+        self.eval_count = None
+        self.eval_duration = None
+        self.prompt_eval_count = None
+        self.prompt_eval_duration = None
+        self.load_duration = None
+        self.cancelled = False
+        # Ollama backend that produced the answer
+        self.server = None
+        # Where the answer came from: "ollama", "summary" (answered directly) or "cache"
+        self.source = "ollama"
+
+    @property
+    def time_to_first_token(self):
+        if self.first_token_at is None:
+            return None
+        return self.first_token_at - self.started
+
+    @property
+    def tokens_per_second(self):
+        # Prefer Ollama's own generation counters, sent with the final chunk
+        if self.eval_count and self.eval_duration:
+            return self.eval_count / (self.eval_duration / 1e9)
+        if self.first_token_at is None or self.tokens < 2:
+            return None
+        elapsed = (self.finished_at or time.monotonic()) - self.first_token_at
+        return (self.tokens - 1) / elapsed if elapsed > 0 else None
+
+    def record_final_chunk(self, chunk):
+        self.eval_count = chunk.get("eval_count")
+        self.eval_duration = chunk.get("eval_duration")
+        self.prompt_eval_count = chunk.get("prompt_eval_count")
+        self.prompt_eval_duration = chunk.get("prompt_eval_duration")
+        self.load_duration = chunk.get("load_duration")
+
+    def summary(self):
+        parts = []
+        if self.source == "summary":
+            parts.append("answered from the driver summary")
+        elif self.source == "cache":
+            parts.append("cached answer")
+        if self.time_to_first_token is not None:
+            parts.append(f"first token {self.time_to_first_token:.2f}s")
+        if self.prompt_eval_count is not None:
+            # Only tokens not already in Ollama's KV cache are evaluated, so this shrinks on follow-ups
+            prompt_seconds = (self.prompt_eval_duration or 0) / 1e9
+            parts.append(f"prompt eval {self.prompt_eval_count} tokens in {prompt_seconds:.2f}s")
+        if self.load_duration and self.load_duration > 1e8:
+            parts.append(f"model load {self.load_duration / 1e9:.2f}s")
+        if self.tokens_per_second is not None:
+            parts.append(f"{self.tokens_per_second:.1f} tokens/s")
+        if self.finished_at is not None:
+            parts.append(f"total {self.finished_at - self.started:.2f}s")
+        if self.cancelled:
+            parts.append("stopped")
+        if self.server:
+            parts.append(f"via {self.server.split('://')[-1]}")
+        return " | ".join(parts)
+
+
+class ChatSession:
+    """
+    A stateful conversation about one stored result, sent through Ollama's
+    /api/chat endpoint. The system message and earlier turns are resent
+    byte-for-byte, so Ollama can reuse its KV cache for that prefix and only
+    evaluate the new turn; keep_alive keeps the model loaded between turns.
+
+    Each turn goes to the least busy backend of the Ollama pool; server limits
+    it to one URL or a comma-separated list (default: every pooled backend).
+
+    Common questions are answered straight from the result's driver summary
+    (direct_answers), and opening questions already answered for the same
+    drivers come from the answer cache (answer_cache); neither calls Ollama.
+    """
+
+    def __init__(self, fetch_id, server=None, model=DEFAULT_OLLAMA_MODEL, keep_alive=DEFAULT_KEEP_ALIVE,
+                 top_k=8, retrieval="bm25", max_history_turns=6, pool=None, direct_answers=True,
+                 answer_cache=True):
+        self.fetch_id = fetch_id
+        self.server = server
+        self.pool = pool or get_ollama_pool()
+        self.model = model
+        self.keep_alive = keep_alive
+        self.top_k = top_k
+        self.retrieval = retrieval
+        self.max_history_turns = max_history_turns
+        self.direct_answers = direct_answers
+        self.answer_cache = answer_cache
+        self.content_hash, self.summary = get_summary(fetch_id)
+        # The summary is part of the fixed prefix, so the model sees the overview on every turn
+        self.system_message = {
+            "role": "system",
+            "content": ("You answer questions about Dell driver information. "
+                        "Use only the context provided.\n\n" + build_product_context(fetch_id)
+                        + "\n\n" + summary_context(self.summary))
+        }
+        # Messages exactly as sent to the model, including retrieved driver context
+        self.history = []
+
+    def build_messages(self, query):
+        # The drivers relevant to this question travel with the question itself, so
+        # earlier turns stay identical and remain a cacheable prefix
+        embedding_server = self.pool.ranked(servers=self.server)[0] if self.retrieval == "embeddings" else None
+        driver_context = build_driver_context(self.fetch_id, query, top_k=self.top_k,
+                                              method=self.retrieval, server=embedding_server)
+        user_message = {
+            "role": "user",
+            "content": f"Context information:\n{driver_context}\n\nUser query:\n{query}"
+        }
+        history = self.history[-2 * self.max_history_turns:] if self.max_history_turns else []
+        return [self.system_message] + history + [user_message], user_message
+
+    def instant_answer(self, query):
+        """Return (answer, source) for a question that needs no model call, or (None, None)."""
+        if self.direct_answers:
+            try:
+                answer = answer_question(self.summary, query)
+            except Exception:
+                # A summary the answers can't handle shouldn't cost the user their reply; the model still answers
+                logger.exception("Error answering from the driver summary")
+                answer = None
+            if answer is not None:
+                return answer, "summary"
+        # Later turns depend on the conversation so far, so only opening questions are cached
+        question = normalize_question(query)
+        if self.answer_cache and not self.history and question:
+            try:
+                answer = get_store().get_answer(self.content_hash, question, self.model)
+            except sqlite3.Error as e:
+                logger.warning(f"Error reading the answer cache: {str(e)}")
+                answer = None
+            if answer is not None:
+                return answer, "cache"
+        return None, None
+
+    def stream(self, query, stats=None, cancel_event=None):
+        """
+        Generator yielding response text as Ollama produces it. Reads the NDJSON
+        stream incrementally; stops early when cancel_event is set or the consumer
+        closes the generator, which also closes the connection so Ollama stops
+        generating. A backend that fails before the first token is put into
+        backoff and the next one is tried. Instant answers (see instant_answer)
+        are yielded whole. Timings are recorded on stats if one is passed.
+        """
+        if stats is None:
+            stats = StreamStats()
+        reply = []
+
+        answer, source = self.instant_answer(query)
+        if answer is not None:
+            stats.source = source
+            stats.finished_at = time.monotonic()
+            CHAT_ANSWERS.labels(source).inc()
+            self.history.extend([{"role": "user", "content": query}, {"role": "assistant", "content": answer}])
+            yield answer
+            return
+
+        try:
+            # The span covers retrieval and every backend tried, for chats from the app and the API alike
+            with span("ollama_chat", fetch_id=self.fetch_id, model=self.model):
+                first_turn = not self.history
+                messages, user_message = self.build_messages(query)
+                error = None
+                for server in self.pool.ranked(self.model, self.server):
+                    stats.server = server
+                    started = time.monotonic()
+                    try:
+                        with self.pool.request(server):
+                            for token in self._stream_from(server, messages, stats, cancel_event):
+                                reply.append(token)
+                                yield token
+                    except OllamaError as e:
+                        self.pool.record(server, False, time.monotonic() - started, error=str(e))
+                        error = e
+                        if e.retryable:
+                            continue
+                        break
+                    self.pool.record(server, True, time.monotonic() - started, first_token=stats.time_to_first_token)
+                    error = None
+                    break
+                if error is not None:
+                    yield str(error)
+
+                if reply:
+                    answer = "".join(reply)
+                    self.history.extend([user_message, {"role": "assistant", "content": answer}])
+                    CHAT_ANSWERS.labels("ollama").inc()
+                    question = normalize_question(query)
+                    if self.answer_cache and first_turn and question and error is None and not stats.cancelled:
+                        try:
+                            get_store().save_answer(self.content_hash, question, answer, self.model)
+                        except sqlite3.Error as e:
+                            # The answer was already streamed; failing to cache it only costs the next asker
+                            logger.warning(f"Error saving to the answer cache: {str(e)}")
+
+        except GeneratorExit:
+            stats.cancelled = True
+            raise
+        except Exception as e:
+            yield f"Error communicating with Ollama: {str(e)}"
+        finally:
+            stats.finished_at = time.monotonic()
+            STAGE_SECONDS.labels("ollama_chat").observe(stats.finished_at - stats.started)
+            OLLAMA_TOKENS.inc(stats.eval_count or stats.tokens)
+
+    def _stream_from(self, server, messages, stats, cancel_event):
+        # Tokens from one backend; failures raise OllamaError, retryable until the first token
+        produced = False
+        try:
+            with get_http_client().stream(
+                "POST",
+                f"{server}/api/chat",
+                json={
+                    "model": self.model,
+                    "messages": messages,
+                    "stream": True,
+                    "keep_alive": self.keep_alive
+                },
+                timeout=300
+            ) as response:
+                if response.status_code != 200:
+                    raise OllamaError(f"Error: Unable to get response from Ollama. Status code: {response.status_code}")
+
+                for line in response.iter_lines():
+                    if cancel_event is not None and cancel_event.is_set():
+                        stats.cancelled = True
+                        break
+                    if not line:
+                        continue
+
+                    chunk = json.loads(line)
+                    if "error" in chunk:
+                        raise OllamaError(f"Error from Ollama: {chunk['error']}", retryable=not produced)
+
+                    token = chunk.get("message", {}).get("content", "")
+                    if token:
+                        if stats.first_token_at is None:
+                            stats.first_token_at = time.monotonic()
+                            OLLAMA_FIRST_TOKEN_SECONDS.observe(stats.time_to_first_token)
+                        stats.tokens += 1
+                        produced = True
+                        yield token
+
+                    if chunk.get("done"):
+                        stats.record_final_chunk(chunk)
+                        break
+        except (OllamaError, GeneratorExit):
+            raise
+        except Exception as e:
+            raise OllamaError(f"Error communicating with Ollama: {str(e)}", retryable=not produced) from e
+
+
+# Function to stream a one-off answer from Ollama token by token
+def stream_chat_with_ollama(fetch_id, query, server=None, model=DEFAULT_OLLAMA_MODEL,
+                            stats=None, cancel_event=None, top_k=8, retrieval="bm25"):
+    session = ChatSession(fetch_id, server=server, model=model, top_k=top_k, retrieval=retrieval)
+    yield from session.stream(query, stats=stats, cancel_event=cancel_event)
+
+
+# Chat function with Ollama
+def chat_with_ollama(fetch_id, query, server=None, model=DEFAULT_OLLAMA_MODEL):
+    response = "".join(stream_chat_with_ollama(fetch_id, query, server=server, model=model))
+    return response or "No response from Ollama"
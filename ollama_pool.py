@@ -0,0 +1,286 @@
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from http_client import get_http_client
+from metrics import OLLAMA_BACKEND_UP, OLLAMA_OUTSTANDING, OLLAMA_REQUEST_SECONDS
+
+# Comma-separated Ollama servers; OLLAMA_SERVER is the single-server form
+DEFAULT_OLLAMA_SERVERS = os.environ.get("OLLAMA_SERVERS", os.environ.get("OLLAMA_SERVER", "http://localhost:11434"))
+# How long Ollama keeps a model (and its KV cache) loaded between requests
+DEFAULT_KEEP_ALIVE = os.environ.get("OLLAMA_KEEP_ALIVE", "30m")
+
+
+# Function to split a comma-separated server list into normalized URLs
+def parse_servers(servers):
+    if isinstance(servers, str):
+        servers = servers.split(",")
+    return list(dict.fromkeys(server.strip().rstrip("/") for server in servers if server and server.strip()))
+
+
+# Function to compare model names the way Ollama does ("llama3" means "llama3:latest")
+def model_matches(available, model):
+    return available == model or available == f"{model}:latest" or available.split(":")[0] == model
+
+
+class OllamaPool:
+    """
+    Ollama backends behind least-outstanding-requests routing. Each chat is
+    sent to the healthy backend with the fewest requests in flight (ties go to
+    the one with the lower first-token latency, and backends known to have the
+    model come first). Backends that fail a request or a health check are
+    skipped for an exponentially growing backoff, like the driver endpoints.
+    Servers beyond the configured ones (e.g. typed into the sidebar) leave
+    the pool once unused for idle_timeout seconds.
+    """
+
+    def __init__(self, servers=None, health_interval=30, base_backoff=5, max_backoff=300, idle_timeout=600):
+        self.health_interval = health_interval
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.idle_timeout = idle_timeout
+        self.lock = threading.Lock()
+        self.backends = {}
+        self._health_thread = None
+        # (server, model) -> (succeeded, when); failed warm-ups are retried once per health interval
+        self._warmed = {}
+        for server in parse_servers(servers or DEFAULT_OLLAMA_SERVERS):
+            self.add(server, configured=True)
+
+    def add(self, server, configured=False):
+        server = server.rstrip("/")
+        with self.lock:
+            if server in self.backends:
+                self.backends[server]["last_used"] = time.time()
+            else:
+                self.backends[server] = {
+                    "configured": configured,
+                    "last_used": time.time(),
+                    "outstanding": 0,
+                    "requests": 0,
+                    "failures": 0,
+                    "consecutive_failures": 0,
+                    "latency": None,
+                    "first_token": None,
+                    "healthy": None,
+                    "models": None,
+                    "open_until": 0,
+                    "last_error": None,
+                    "warm_error": None,
+                }
+        return server
+
+    def ranked(self, model=None, servers=None):
+        """Backends to try for a request, best first. Backends in backoff are skipped unless all are."""
+        candidates = [self.add(server) for server in parse_servers(servers)] if servers else None
+        now = time.time()
+        with self.lock:
+            names = candidates or list(self.backends)
+            available = [name for name in names if self.backends[name]["open_until"] <= now]
+            if not available:
+                return [min(names, key=lambda name: self.backends[name]["open_until"])]
+
+            def sort_key(name):
+                backend = self.backends[name]
+                has_model = backend["models"] is None or model is None or any(
+                    model_matches(available_model, model) for available_model in backend["models"])
+                latency = backend["first_token"]
+                return (not has_model, backend["outstanding"], latency if latency is not None else float("inf"))
+
+            return sorted(available, key=sort_key)
+
+    def metric_label(self, server):
+        """Backend label for metrics: configured servers by URL, anything typed into the sidebar as "other"."""
+        backend = self.backends.get(server)
+        return server if backend is not None and backend["configured"] else "other"
+
+    @contextmanager
+    def request(self, server):
+        """Count a request as outstanding on a backend for the duration of the block."""
+        self.add(server)
+        with self.lock:
+            backend = self.backends[server]
+            backend["outstanding"] += 1
+            backend["requests"] += 1
+            label = self.metric_label(server)
+        # Counted up and down, since every unconfigured backend shares the "other" label
+        OLLAMA_OUTSTANDING.labels(label).inc()
+        try:
+            yield
+        finally:
+            with self.lock:
+                backend["outstanding"] -= 1
+            OLLAMA_OUTSTANDING.labels(label).dec()
+
+    def record(self, server, ok, latency=None, first_token=None, error=None):
+        with self.lock:
+            backend = self.backends.get(server)
+            if backend is None:
+                # Left the pool meanwhile (see check_all)
+                return
+            if latency is not None:
+                backend["latency"] = latency if backend["latency"] is None else 0.7 * backend["latency"] + 0.3 * latency
+            if first_token is not None:
+                backend["first_token"] = (first_token if backend["first_token"] is None
+                                          else 0.7 * backend["first_token"] + 0.3 * first_token)
+            if ok:
+                backend["consecutive_failures"] = 0
+                backend["open_until"] = 0
+                backend["healthy"] = True
+                backend["last_error"] = None
+            else:
+                backend["failures"] += 1
+                backend["consecutive_failures"] += 1
+                backoff = min(self.max_backoff, self.base_backoff * 2 ** (backend["consecutive_failures"] - 1))
+                backend["open_until"] = time.time() + backoff
+                backend["healthy"] = False
+                backend["last_error"] = error
+            label = self.metric_label(server)
+            if backend["configured"]:
+                # Health of the "other" bucket would be whichever of its backends answered last
+                OLLAMA_BACKEND_UP.labels(label).set(1 if backend["healthy"] else 0)
+        if latency is not None:
+            OLLAMA_REQUEST_SECONDS.labels(label, "ok" if ok else "error").observe(latency)
+
+    def check(self, server):
+        """Health check: list the backend's models; a failure puts it into backoff."""
+        started = time.monotonic()
+        try:
+            response = get_http_client().get(f"{server}/api/tags", timeout=5)
+            response.raise_for_status()
+            models = [model.get("name") for model in response.json().get("models", [])]
+        except Exception as e:
+            self.record(server, False, error=str(e))
+            return False
+        with self.lock:
+            if server in self.backends:
+                self.backends[server]["models"] = models
+        self.record(server, True)
+        OLLAMA_REQUEST_SECONDS.labels(self.metric_label(server), "health").observe(time.monotonic() - started)
+        return True
+
+    def check_all(self):
+        cutoff = time.time() - self.idle_timeout
+        with self.lock:
+            for server, backend in list(self.backends.items()):
+                if not backend["configured"] and backend["outstanding"] == 0 and backend["last_used"] < cutoff:
+                    del self.backends[server]
+            servers = list(self.backends)
+        return {server: self.check(server) for server in servers}
+
+    def start_health_checks(self):
+        """Check every backend now and then every health_interval seconds in a daemon thread."""
+        with self.lock:
+            if self._health_thread is not None:
+                return
+            self._health_thread = threading.Thread(target=self._health_loop, name="ollama-health", daemon=True)
+        self._health_thread.start()
+
+    def _health_loop(self):
+        while True:
+            self.check_all()
+            time.sleep(self.health_interval)
+
+    def models(self):
+        """Model names available on any healthy backend (None until a health check has run or while all are down)."""
+        now = time.time()
+        with self.lock:
+            # Backends in backoff after a failed request or health check don't count
+            known = [backend["models"] for backend in self.backends.values()
+                     if backend["models"] is not None and backend["open_until"] <= now]
+        if not known:
+            return None
+        return sorted({model[:-len(":latest")] if model.endswith(":latest") else model
+                       for models in known for model in models})
+
+    def warm_up(self, model, keep_alive=DEFAULT_KEEP_ALIVE, servers=None, background=True):
+        """
+        Load model on each backend that has it ahead of the first chat (an
+        empty generate request only loads the model and keeps it for
+        keep_alive), so the first turn doesn't pay the load time. Each
+        model/backend pair is warmed once; a failed warm-up is retried after
+        health_interval, and doesn't affect routing.
+        """
+        targets = [self.add(server) for server in parse_servers(servers)] if servers else None
+        now = time.time()
+        with self.lock:
+            pending = []
+            for server in targets or list(self.backends):
+                state = self._warmed.get((server, model))
+                if state is None or (not state[0] and now - state[1] >= self.health_interval):
+                    # Claimed now, so reruns don't start it again while it is in flight
+                    self._warmed[(server, model)] = (True, now)
+                    pending.append(server)
+        for server in pending:
+            if background:
+                threading.Thread(target=self._warm, args=(server, model, keep_alive),
+                                 name="ollama-warm-up", daemon=True).start()
+            else:
+                self._warm(server, model, keep_alive)
+        return pending
+
+    def _warm(self, server, model, keep_alive):
+        with self.lock:
+            known = self.backends[server]["models"] if server in self.backends else None
+        if known is None and self.check(server):
+            with self.lock:
+                known = self.backends[server]["models"]
+        if known is None or not any(model_matches(available, model) for available in known):
+            # Unreachable, or the model isn't pulled there: nothing to load
+            self._warm_failed(server, model, "unreachable" if known is None else f"model {model} not available")
+            return
+        started = time.monotonic()
+        try:
+            with self.request(server):
+                response = get_http_client().post(f"{server}/api/generate",
+                                                  json={"model": model, "keep_alive": keep_alive}, timeout=300)
+            response.raise_for_status()
+        except Exception as e:
+            OLLAMA_REQUEST_SECONDS.labels(self.metric_label(server), "warm_up_error").observe(time.monotonic() - started)
+            self._warm_failed(server, model, str(e))
+            return
+        OLLAMA_REQUEST_SECONDS.labels(self.metric_label(server), "warm_up").observe(time.monotonic() - started)
+        with self.lock:
+            if server in self.backends:
+                self.backends[server]["warm_error"] = None
+
+    def _warm_failed(self, server, model, error):
+        # Kept apart from request health: a backend without the model still serves other chats
+        with self.lock:
+            self._warmed[(server, model)] = (False, time.time())
+            if server in self.backends:
+                self.backends[server]["warm_error"] = error
+
+    def snapshot(self):
+        """Per-backend stats for display: queue depth, latency, health."""
+        now = time.time()
+        with self.lock:
+            rows = []
+            for server, backend in self.backends.items():
+                rows.append({
+                    "server": server,
+                    "healthy": backend["healthy"],
+                    "outstanding": backend["outstanding"],
+                    "requests": backend["requests"],
+                    "failures": backend["failures"],
+                    "first_token_s": round(backend["first_token"], 3) if backend["first_token"] is not None else None,
+                    "latency_s": round(backend["latency"], 3) if backend["latency"] is not None else None,
+                    "models": ", ".join(backend["models"] or []),
+                    "backoff_s": max(0, round(backend["open_until"] - now)),
+                    "warm_up_error": backend["warm_error"],
+                })
+            return rows
+
+
+_default_pool = None
+_default_pool_lock = threading.Lock()
+
+
+# Function to get the process-wide Ollama backend pool
+def get_ollama_pool():
+    global _default_pool
+    with _default_pool_lock:
+        if _default_pool is None:
+            _default_pool = OllamaPool(health_interval=float(os.environ.get("OLLAMA_HEALTH_INTERVAL", 30)))
+        return _default_pool
@@ -0,0 +1,241 @@
+import argparse
+import csv
+import io
+import os
+import sys
+import tempfile
+import threading
+from collections import OrderedDict
+from datetime import datetime
+
+from jinja2 import Environment, FileSystemLoader, select_autoescape
+
+from diffing import snapshot_hash
+from store import DRIVER_COLUMNS, get_store
+
+# xlsxwriter is optional; without it the XLSX report isn't offered
+try:
+    import xlsxwriter
+except ImportError:
+    xlsxwriter = None
+
+TEMPLATE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "templates")
+
+# Columns of the tabular (CSV/XLSX) reports: one row per driver per service tag
+REPORT_COLUMNS = ["service_tag", "product_name", "retrieved"] + DRIVER_COLUMNS
+
+# Single-result formats and their media types
+RESULT_FORMATS = {
+    "md": "text/markdown; charset=utf-8",
+    "html": "text/html; charset=utf-8",
+    "csv": "text/csv; charset=utf-8",
+}
+# Fleet-wide report formats and their media types
+REPORT_FORMATS = {
+    "csv": "text/csv; charset=utf-8",
+    "html": "text/html; charset=utf-8",
+}
+if xlsxwriter is not None:
+    REPORT_FORMATS["xlsx"] = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+
+# Template filter: ISO timestamp as shown in reports
+def format_datetime(value):
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    return value.strftime("%Y-%m-%d %H:%M:%S")
+
+
+# Templates are compiled once per process and reused for every render
+_environment = Environment(
+    loader=FileSystemLoader(TEMPLATE_DIR),
+    autoescape=select_autoescape(["html.j2"], default_for_string=False),
+    trim_blocks=True,
+    lstrip_blocks=True,
+)
+_environment.filters["datetime"] = format_datetime
+_environment.globals["numbered"] = lambda items: enumerate(items, 1)
+
+
+# Function to join many small text pieces into chunks of about chunk_size characters
+def coalesce(pieces, chunk_size=65536):
+    buffer = []
+    size = 0
+    for piece in pieces:
+        buffer.append(piece)
+        size += len(piece)
+        if size >= chunk_size:
+            yield "".join(buffer)
+            buffer = []
+            size = 0
+    if buffer:
+        yield "".join(buffer)
+
+
+# Function to yield the rows of the tabular reports for one result
+def report_rows(result):
+    product_name = result["product_info"].get("product_name", "")
+    retrieved = format_datetime(result["timestamp"])
+    for driver in result["drivers"]:
+        yield [result["service_tag"], product_name, retrieved] + [driver.get(key, "") for key in DRIVER_COLUMNS]
+
+
+# Function to stream results as CSV text, one result's rows at a time
+def iter_csv(results):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(REPORT_COLUMNS)
+    for result in results:
+        writer.writerows(report_rows(result))
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+# Function to stream the fleet HTML report as text
+def iter_html(results):
+    template = _environment.get_template("fleet.html.j2")
+    return template.generate(results=results, generated=datetime.now())
+
+
+# Function to stream the fleet XLSX report as bytes
+def iter_xlsx(results, chunk_size=65536):
+    """
+    XLSX is a zip that can only be finished once every row is known, so it is
+    built in a temporary file; constant_memory mode writes each row out as
+    soon as the next one starts, keeping memory flat for large fleets.
+    """
+    if xlsxwriter is None:
+        raise ValueError("XLSX reports need the xlsxwriter package (pip install xlsxwriter)")
+    handle, path = tempfile.mkstemp(suffix=".xlsx")
+    os.close(handle)
+    try:
+        workbook = xlsxwriter.Workbook(path, {"constant_memory": True, "strings_to_urls": False})
+        sheet = workbook.add_worksheet("Drivers")
+        header = workbook.add_format({"bold": True, "font_color": "white", "bg_color": "#007DB8"})
+        sheet.write_row(0, 0, REPORT_COLUMNS, header)
+        sheet.freeze_panes(1, 0)
+        row_number = 1
+        for result in results:
+            for row in report_rows(result):
+                sheet.write_row(row_number, 0, row)
+                row_number += 1
+        sheet.autofilter(0, 0, max(row_number - 1, 1), len(REPORT_COLUMNS) - 1)
+        workbook.close()
+        with open(path, "rb") as f:
+            while True:
+                chunk = f.read(chunk_size)
+                if not chunk:
+                    break
+                yield chunk
+    finally:
+        os.remove(path)
+
+
+# Function to stream a fleet-wide report built from stored results
+def iter_report(results, report_format="csv"):
+    """
+    results is any iterable of stored results, e.g. ResultStore.iter_latest();
+    only one result is held at a time. Yields bytes.
+    """
+    if report_format == "xlsx":
+        yield from iter_xlsx(results)
+        return
+    if report_format == "csv":
+        pieces = iter_csv(results)
+    elif report_format == "html":
+        pieces = iter_html(results)
+    else:
+        raise ValueError(f"Unknown report format: {report_format}")
+    for chunk in coalesce(pieces):
+        yield chunk.encode("utf-8")
+
+
+class RenderCache:
+    """
+    Rendered single-result documents, keyed by format and a hash of the
+    content that goes into them, so a result is rendered once however often
+    it is viewed or downloaded. Least recently used entries are dropped once
+    the cached text exceeds max_chars.
+    """
+
+    def __init__(self, max_chars=64 * 1024 * 1024):
+        self.max_chars = max_chars
+        self.entries = OrderedDict()
+        self.size = 0
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                return self.entries[key]
+        return None
+
+    def put(self, key, text):
+        with self.lock:
+            if key in self.entries:
+                return
+            self.entries[key] = text
+            self.size += len(text)
+            while self.size > self.max_chars and len(self.entries) > 1:
+                _, dropped = self.entries.popitem(last=False)
+                self.size -= len(dropped)
+
+
+_render_cache = RenderCache(int(os.environ.get("DELL_RENDER_CACHE_MB", 64)) * 1024 * 1024)
+
+
+# Function to compute the cache key of a rendered result
+def content_key(result, result_format):
+    # Stored results carry the hash computed when they were saved; others are hashed here
+    content = result.get("snapshot_hash") or snapshot_hash(result["product_info"], result["drivers"])
+    return (result_format, result["service_tag"], result["timestamp"], result.get("last_checked"), content)
+
+
+# Function to render one stored result, cached by content
+def render_result(result, result_format="md"):
+    if result_format not in RESULT_FORMATS:
+        raise ValueError(f"Unknown result format: {result_format}")
+    key = content_key(result, result_format)
+    text = _render_cache.get(key)
+    if text is None:
+        if result_format == "csv":
+            pieces = iter_csv([result])
+        else:
+            template = _environment.get_template(f"result.{result_format}.j2")
+            pieces = template.generate(result=result, product_info=result["product_info"])
+        text = "".join(pieces)
+        _render_cache.put(key, text)
+    return text
+
+
+# Function to build the download file name of a fleet report
+def report_file_name(report_format):
+    return f"dell_fleet_report_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{report_format}"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Fleet-wide driver reports from the result store.")
+    parser.add_argument("--format", choices=sorted(REPORT_FORMATS), default="csv")
+    parser.add_argument("--output", help="Output file (default: a timestamped file name; '-' for stdout)")
+    parser.add_argument("--tags", nargs="+", help="Service tags to include (default: every stored tag)")
+    args = parser.parse_args(argv)
+
+    results = get_store().iter_latest([tag.upper() for tag in args.tags] if args.tags else None)
+    output = args.output or report_file_name(args.format)
+    if output == "-":
+        for chunk in iter_report(results, args.format):
+            sys.stdout.buffer.write(chunk)
+        return 0
+    with open(output, "wb") as f:
+        for chunk in iter_report(results, args.format):
+            f.write(chunk)
+    print(f"Report written to {output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,213 @@
+import json
+import logging
+import math
+import os
+import re
+import threading
+import time
+from collections import Counter, OrderedDict
+
+from http_client import get_http_client
+from store import get_store
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+logger = logging.getLogger("dell.retrieval")
+
+# Fields that describe a driver, in the order they are shown to the model
+DRIVER_FIELDS = [
+    ("category", "Category"),
+    ("version", "Version"),
+    ("release_date", "Release Date"),
+    ("importance", "Importance"),
+    ("description", "Description"),
+    ("download_url", "Download URL"),
+]
+
+
+def tokenize(text):
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+# Function to turn the drivers of a stored result into one chunk per driver
+def load_driver_chunks(fetch_id):
+    data = get_store().get_result(fetch_id)
+    if data is None:
+        raise ValueError(f"No stored result with fetch id {fetch_id}")
+
+    chunks = []
+    for driver in data.get("drivers", []):
+        lines = [f"### {driver.get('name', 'Unknown Driver')}"]
+        for key, label in DRIVER_FIELDS:
+            if driver.get(key):
+                lines.append(f"**{label}:** {driver[key]}")
+        # The category is repeated in the searchable text so category questions match strongly
+        search_text = " ".join(str(driver.get(key) or "") for key in
+                               ("name", "category", "category", "version", "importance", "description"))
+        chunks.append({"text": "\n".join(lines), "search_text": search_text, "driver": driver})
+    return data, chunks
+
+
+class BM25Index:
+    """Okapi BM25 over driver chunks."""
+
+    def __init__(self, chunks, k1=1.5, b=0.75):
+        self.chunks = chunks
+        self.k1 = k1
+        self.b = b
+        self.doc_terms = [Counter(tokenize(chunk["search_text"])) for chunk in chunks]
+        self.doc_lengths = [sum(terms.values()) for terms in self.doc_terms]
+        self.avg_length = sum(self.doc_lengths) / len(self.doc_lengths) if chunks else 0
+        document_frequency = Counter()
+        for terms in self.doc_terms:
+            document_frequency.update(terms.keys())
+        total = len(chunks)
+        self.idf = {term: math.log(1 + (total - df + 0.5) / (df + 0.5)) for term, df in document_frequency.items()}
+
+    def search(self, query, top_k=8):
+        query_terms = [term for term in tokenize(query) if term in self.idf]
+        scores = []
+        for index, terms in enumerate(self.doc_terms):
+            score = 0.0
+            length_norm = self.k1 * (1 - self.b + self.b * self.doc_lengths[index] / (self.avg_length or 1))
+            for term in query_terms:
+                frequency = terms.get(term)
+                if frequency:
+                    score += self.idf[term] * frequency * (self.k1 + 1) / (frequency + length_norm)
+            scores.append((score, index))
+        scores.sort(key=lambda item: (-item[0], item[1]))
+        return [self.chunks[index] for score, index in scores[:top_k]]
+
+
+class EmbeddingIndex:
+    """
+    Cosine similarity over embeddings from Ollama's embeddings API. Vectors are
+    saved under data/index so each result file is embedded only once.
+    """
+
+    def __init__(self, chunks, cache_path, server, model):
+        self.chunks = chunks
+        self.server = server.rstrip('/')
+        self.model = model
+        self.vectors = None
+        if os.path.exists(cache_path):
+            with open(cache_path, 'r', encoding='utf-8') as f:
+                self.vectors = json.load(f)
+        if not self.vectors or len(self.vectors) != len(chunks):
+            self.vectors = [self._embed(chunk["text"]) for chunk in chunks]
+            os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+            with open(cache_path, 'w', encoding='utf-8') as f:
+                json.dump(self.vectors, f)
+
+    def _embed(self, text):
+        response = get_http_client().post(f"{self.server}/api/embeddings",
+                                          json={"model": self.model, "prompt": text}, timeout=120)
+        response.raise_for_status()
+        return response.json()["embedding"]
+
+    @staticmethod
+    def _cosine(a, b):
+        dot = sum(x * y for x, y in zip(a, b))
+        norm = math.sqrt(sum(x * x for x in a)) * math.sqrt(sum(y * y for y in b))
+        return dot / norm if norm else 0.0
+
+    def search(self, query, top_k=8):
+        query_vector = self._embed(query)
+        scores = sorted(((self._cosine(query_vector, vector), index) for index, vector in enumerate(self.vectors)),
+                        key=lambda item: (-item[0], item[1]))
+        return [self.chunks[index] for score, index in scores[:top_k]]
+
+
+_index_cache = OrderedDict()
+_index_cache_lock = threading.Lock()
+INDEX_CACHE_SIZE = 32
+
+# Embedding indexes that failed recently, by cache key -> time of the failure; BM25 is used
+# until EMBEDDING_RETRY_AFTER seconds have passed, then the embeddings API is tried again
+_embedding_failures = {}
+EMBEDDING_RETRY_AFTER = float(os.environ.get("DELL_EMBEDDING_RETRY_AFTER", 300))
+
+
+# Function to note that an embedding index can't be used for now
+def embedding_failed(fetch_id, embedding_model="nomic-embed-text"):
+    key = (fetch_id, "embeddings", embedding_model)
+    with _index_cache_lock:
+        _embedding_failures[key] = time.monotonic()
+        _index_cache.pop(key, None)
+
+
+# Function to get the (cached) retrieval index for a stored result
+def get_index(fetch_id, method="bm25", server=None, embedding_model="nomic-embed-text"):
+    """
+    Return (result_data, index). Stored results never change, so indexes are
+    cached per fetch id. method="embeddings" uses Ollama embeddings; while the
+    embeddings API is failing the BM25 index is returned instead (see
+    embedding_failed), and embeddings are tried again after EMBEDDING_RETRY_AFTER.
+    """
+    if method != "embeddings" or not server:
+        method = "bm25"
+    key = (fetch_id, method, embedding_model if method == "embeddings" else None)
+    with _index_cache_lock:
+        if key in _index_cache:
+            _index_cache.move_to_end(key)
+            return _index_cache[key]
+        failed_at = _embedding_failures.get(key)
+    if failed_at is not None and time.monotonic() - failed_at < EMBEDDING_RETRY_AFTER:
+        return get_index(fetch_id)
+
+    data, chunks = load_driver_chunks(fetch_id)
+    if method == "embeddings":
+        cache_path = os.path.join("data", "index", f"fetch_{fetch_id}.{embedding_model}.json")
+        try:
+            index = EmbeddingIndex(chunks, cache_path, server, embedding_model)
+        except Exception as e:
+            logger.warning(f"Embeddings unavailable for fetch {fetch_id}, using BM25: {str(e)}")
+            embedding_failed(fetch_id, embedding_model)
+            return get_index(fetch_id)
+        with _index_cache_lock:
+            _embedding_failures.pop(key, None)
+    else:
+        index = BM25Index(chunks)
+
+    with _index_cache_lock:
+        _index_cache[key] = (data, index)
+        while len(_index_cache) > INDEX_CACHE_SIZE:
+            _index_cache.popitem(last=False)
+    return data, index
+
+
+# Function to describe the product a stored result is about
+def build_product_context(fetch_id):
+    data, index = get_index(fetch_id)
+    product_info = data.get("product_info", {})
+
+    lines = [f"# Dell Driver Information for {data.get('service_tag', 'Unknown')}",
+             f"## Product: {product_info.get('product_name', 'Unknown Dell Device')}"]
+    if "product_line" in product_info:
+        lines.append(f"**Product Line:** {product_info['product_line']}")
+    if "system_config" in product_info:
+        lines.append(f"**System Configuration:** {product_info['system_config']}")
+    lines.append(f"{len(data.get('drivers', []))} drivers are available in total.")
+    return "\n\n".join(lines)
+
+
+# Function to build a bounded context block with only the drivers relevant to a query
+def build_driver_context(fetch_id, query, top_k=8, method="bm25", server=None):
+    data, index = get_index(fetch_id, method=method, server=server)
+    drivers = data.get("drivers", [])
+
+    if len(drivers) <= top_k:
+        relevant = index.chunks
+    else:
+        try:
+            relevant = index.search(query, top_k=top_k)
+        except Exception as e:
+            if not isinstance(index, EmbeddingIndex):
+                raise
+            # Embedding the query failed (e.g. Ollama went away): answer from BM25 instead
+            logger.warning(f"Embedding the query failed for fetch {fetch_id}, using BM25: {str(e)}")
+            embedding_failed(fetch_id, index.model)
+            relevant = get_index(fetch_id)[1].search(query, top_k=top_k)
+    lines = [f"## Relevant Drivers ({len(relevant)} of {len(drivers)} available)"]
+    lines.extend(chunk["text"] for chunk in relevant)
+    return "\n\n".join(lines)
@@ -0,0 +1,505 @@
+import argparse
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+from datetime import datetime
+
+from diffing import diff_drivers, driver_hash, snapshot_hash
+
+# Columns of a normalized driver record, in output order
+DRIVER_COLUMNS = ["name", "category", "version", "release_date", "importance", "description", "download_url"]
+
+# Release date formats seen in Dell responses, tried in order
+RELEASE_DATE_FORMATS = ["%Y-%m-%d", "%Y-%m-%dT%H:%M:%S", "%Y-%m-%dT%H:%M:%SZ", "%d %b %Y", "%b %d, %Y",
+                        "%m/%d/%Y", "%d/%m/%Y", "%B %d, %Y", "%d %B %Y"]
+
+
+# Function to normalize a release date to YYYY-MM-DD so it can be indexed and compared
+def normalize_release_date(value):
+    if not value:
+        return None
+    value = str(value).strip()
+    if len(value) >= 19 and value[4] == "-" and value[10] == "T":
+        value = value[:19]
+    for date_format in RELEASE_DATE_FORMATS:
+        try:
+            return datetime.strptime(value, date_format).strftime("%Y-%m-%d")
+        except ValueError:
+            continue
+    return None
+
+
+# Function to hash every stored field of a driver record, used to deduplicate records
+def record_hash(driver):
+    content = json.dumps([driver.get(key) for key in DRIVER_COLUMNS], default=str)
+    return hashlib.sha1(content.encode("utf-8")).hexdigest()
+
+
+class ResultStore:
+    """
+    SQLite store of lookup results: one row per fetch (fetch history) and one
+    normalized row per distinct driver record, indexed by service tag, product,
+    driver name, category and release date. Fetches reference driver records
+    by id, so tags of the same product model share their records. JSON and
+    Markdown are exported from here on demand rather than written for every lookup.
+    """
+
+    def __init__(self, path="data/results.db"):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA foreign_keys=ON")
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS fetches (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                service_tag TEXT NOT NULL,
+                fetched_at TEXT NOT NULL,
+                product_name TEXT,
+                product_line TEXT,
+                system_config TEXT,
+                driver_count INTEGER NOT NULL DEFAULT 0,
+                drivers_found INTEGER NOT NULL DEFAULT 1,
+                snapshot_hash TEXT NOT NULL,
+                checked_at TEXT,
+                catalog_fetch_id INTEGER,
+                UNIQUE (service_tag, fetched_at)
+            );
+            CREATE INDEX IF NOT EXISTS idx_fetches_product ON fetches (product_name);
+
+            CREATE TABLE IF NOT EXISTS driver_records (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                record_hash TEXT NOT NULL UNIQUE,
+                content_hash TEXT NOT NULL,
+                name TEXT NOT NULL,
+                category TEXT,
+                version TEXT,
+                release_date TEXT,
+                release_date_iso TEXT,
+                importance TEXT,
+                description TEXT,
+                download_url TEXT
+            );
+            CREATE INDEX IF NOT EXISTS idx_records_name ON driver_records (name);
+            CREATE INDEX IF NOT EXISTS idx_records_category ON driver_records (category, release_date_iso);
+            CREATE INDEX IF NOT EXISTS idx_records_release ON driver_records (release_date_iso);
+
+            CREATE TABLE IF NOT EXISTS fetch_drivers (
+                fetch_id INTEGER NOT NULL REFERENCES fetches (id) ON DELETE CASCADE,
+                position INTEGER NOT NULL,
+                record_id INTEGER NOT NULL REFERENCES driver_records (id),
+                PRIMARY KEY (fetch_id, position)
+            ) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS idx_fetch_drivers_record ON fetch_drivers (record_id);
+
+            CREATE TABLE IF NOT EXISTS driver_changes (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                service_tag TEXT NOT NULL,
+                fetch_id INTEGER NOT NULL REFERENCES fetches (id) ON DELETE CASCADE,
+                previous_fetch_id INTEGER REFERENCES fetches (id) ON DELETE SET NULL,
+                change TEXT NOT NULL,
+                name TEXT NOT NULL,
+                category TEXT,
+                old_version TEXT,
+                new_version TEXT,
+                old_release_date TEXT,
+                new_release_date TEXT,
+                detected_at TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_changes_detected ON driver_changes (detected_at);
+            CREATE INDEX IF NOT EXISTS idx_changes_tag ON driver_changes (service_tag, detected_at);
+            CREATE INDEX IF NOT EXISTS idx_changes_fetch ON driver_changes (fetch_id);
+
+            CREATE TABLE IF NOT EXISTS summaries (
+                snapshot_hash TEXT PRIMARY KEY,
+                version INTEGER NOT NULL,
+                summary TEXT NOT NULL,
+                created_at TEXT NOT NULL
+            );
+
+            CREATE TABLE IF NOT EXISTS answers (
+                snapshot_hash TEXT NOT NULL,
+                model TEXT NOT NULL,
+                question TEXT NOT NULL,
+                answer TEXT NOT NULL,
+                created_at TEXT NOT NULL,
+                hits INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (snapshot_hash, model, question)
+            ) WITHOUT ROWID;
+        """)
+        self.conn.commit()
+
+    def _link_drivers(self, fetch_id, drivers):
+        # Reuse an existing record for drivers already stored by any fetch, insert the rest
+        self.conn.executemany(
+            "INSERT OR IGNORE INTO driver_records (record_hash, content_hash, name, category, version, release_date, "
+            "release_date_iso, importance, description, download_url) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            [(record_hash(driver), driver_hash(driver), driver.get("name"), driver.get("category"),
+              driver.get("version"), driver.get("release_date"), normalize_release_date(driver.get("release_date")),
+              driver.get("importance"), driver.get("description"), driver.get("download_url"))
+             for driver in drivers]
+        )
+        links = []
+        for position, driver in enumerate(drivers):
+            row = self.conn.execute("SELECT id FROM driver_records WHERE record_hash = ?",
+                                    (record_hash(driver),)).fetchone()
+            links.append((fetch_id, position, row["id"]))
+        self.conn.executemany("INSERT INTO fetch_drivers (fetch_id, position, record_id) VALUES (?, ?, ?)", links)
+
+    def _fetch_drivers(self, fetch_id, columns=DRIVER_COLUMNS):
+        rows = self.conn.execute(
+            f"SELECT r.{', r.'.join(columns)} FROM fetch_drivers fd JOIN driver_records r ON r.id = fd.record_id "
+            f"WHERE fd.fetch_id = ? ORDER BY fd.position", (fetch_id,)
+        ).fetchall()
+        return [{key: row[key] for key in columns if row[key] is not None} for row in rows]
+
+    def save_result(self, result):
+        """Store a result dict (service_tag, product_info, timestamp, drivers) and return its fetch id."""
+        return self.save_snapshot(result)[0]
+
+    def save_snapshot(self, result):
+        """
+        Store a result, comparing it with the previous snapshot for the tag.
+
+        If nothing changed, no new rows are written: the previous fetch is marked
+        as re-checked and its id returned. Otherwise the new snapshot is stored
+        and added/updated/removed drivers are recorded in driver_changes.
+        Results without real driver data (drivers_found False, e.g. only the
+        support-site link) are stored but never diffed; an unchanged result
+        after such a placeholder is stored again so it becomes the tag's latest
+        fetch. Results whose drivers
+        came from a product catalog carry catalog_fetch_id and never mark a
+        fetch as re-checked, since Dell wasn't asked.
+        Returns (fetch_id, {"added": n, "updated": n, "removed": n, "unchanged": bool}).
+        """
+        service_tag = result["service_tag"]
+        fetched_at = result.get("timestamp") or datetime.now().isoformat()
+        product_info = result.get("product_info", {})
+        drivers = result.get("drivers", [])
+        drivers_found = bool(result.get("drivers_found", True))
+        catalog_fetch_id = result.get("catalog_fetch_id")
+        current_snapshot = snapshot_hash(product_info, drivers)
+        summary = {"added": 0, "updated": 0, "removed": 0, "unchanged": False}
+        system_config = product_info.get("system_config")
+        if system_config is not None and not isinstance(system_config, str):
+            system_config = json.dumps(system_config)
+
+        with self.lock:
+            existing = self.conn.execute("SELECT id FROM fetches WHERE service_tag = ? AND fetched_at = ?",
+                                         (service_tag, fetched_at)).fetchone()
+            if existing is not None:
+                # Already stored (e.g. importing the same file twice)
+                summary["unchanged"] = True
+                return existing["id"], summary
+
+            previous = None
+            if drivers_found:
+                previous = self.conn.execute(
+                    "SELECT id, snapshot_hash, fetched_at FROM fetches WHERE service_tag = ? AND drivers_found = 1 "
+                    "AND fetched_at < ? ORDER BY fetched_at DESC LIMIT 1", (service_tag, fetched_at)
+                ).fetchone()
+
+            # A placeholder stored since the previous snapshot would otherwise stay the tag's latest fetch
+            placeholder_since = previous is not None and self.conn.execute(
+                "SELECT 1 FROM fetches WHERE service_tag = ? AND drivers_found = 0 AND fetched_at > ? "
+                "AND fetched_at < ? LIMIT 1", (service_tag, previous["fetched_at"], fetched_at)
+            ).fetchone() is not None
+
+            if previous is not None and previous["snapshot_hash"] == current_snapshot and not placeholder_since:
+                if catalog_fetch_id is None:
+                    self.conn.execute("UPDATE fetches SET checked_at = ? WHERE id = ?", (fetched_at, previous["id"]))
+                    self.conn.commit()
+                summary["unchanged"] = True
+                return previous["id"], summary
+
+            cursor = self.conn.execute(
+                "INSERT INTO fetches (service_tag, fetched_at, product_name, product_line, system_config, "
+                "driver_count, drivers_found, snapshot_hash, checked_at, catalog_fetch_id) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (service_tag, fetched_at, product_info.get("product_name"), product_info.get("product_line"),
+                 system_config, len(drivers), int(drivers_found), current_snapshot, fetched_at, catalog_fetch_id)
+            )
+            fetch_id = cursor.lastrowid
+            self._link_drivers(fetch_id, drivers)
+
+            if previous is not None:
+                previous_drivers = self._fetch_drivers(previous["id"], ["name", "category", "version", "release_date"])
+                changes = diff_drivers(previous_drivers, drivers)
+                rows = [("added", None, driver) for driver in changes["added"]]
+                rows += [("updated", old, new) for old, new in changes["updated"]]
+                rows += [("removed", driver, None) for driver in changes["removed"]]
+                self.conn.executemany(
+                    "INSERT INTO driver_changes (service_tag, fetch_id, previous_fetch_id, change, name, category, "
+                    "old_version, new_version, old_release_date, new_release_date, detected_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    [(service_tag, fetch_id, previous["id"], change, (new or old).get("name"),
+                      (new or old).get("category"), old and old.get("version"), new and new.get("version"),
+                      old and old.get("release_date"), new and new.get("release_date"), fetched_at)
+                     for change, old, new in rows]
+                )
+                summary.update({change: len(changes[change]) for change in ("added", "updated", "removed")})
+            self.conn.commit()
+        return fetch_id, summary
+
+    def changes(self, service_tag=None, fetch_id=None, since=None, limit=10000):
+        """Delta feed of driver changes, oldest first."""
+        conditions = []
+        params = []
+        if service_tag:
+            conditions.append("service_tag = ?")
+            params.append(service_tag)
+        if fetch_id is not None:
+            conditions.append("fetch_id = ?")
+            params.append(fetch_id)
+        if since:
+            conditions.append("detected_at > ?")
+            params.append(since)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        with self.lock:
+            rows = self.conn.execute(
+                f"SELECT service_tag, fetch_id, previous_fetch_id, change, name, category, old_version, new_version, "
+                f"old_release_date, new_release_date, detected_at FROM driver_changes {where} "
+                f"ORDER BY detected_at, id LIMIT ?", params + [limit]
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def has_fetch(self, service_tag, fetched_at):
+        # An unchanged result is stored as a re-check of an earlier fetch rather than as a fetch of its own
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT 1 FROM fetches WHERE service_tag = ? "
+                "AND (fetched_at = ? OR (fetched_at < ? AND checked_at >= ?))",
+                (service_tag, fetched_at, fetched_at, fetched_at)).fetchone()
+        return row is not None
+
+    def get_result(self, fetch_id):
+        """Rebuild the result dict for a fetch, in the same shape the lookup produced."""
+        with self.lock:
+            fetch = self.conn.execute("SELECT * FROM fetches WHERE id = ?", (fetch_id,)).fetchone()
+            if fetch is None:
+                return None
+            drivers = self._fetch_drivers(fetch_id)
+
+        product_info = {"product_name": fetch["product_name"]}
+        if fetch["product_line"] is not None:
+            product_info["product_line"] = fetch["product_line"]
+        if fetch["system_config"] is not None:
+            product_info["system_config"] = fetch["system_config"]
+        return {
+            "fetch_id": fetch["id"],
+            "service_tag": fetch["service_tag"],
+            "product_info": product_info,
+            "timestamp": fetch["fetched_at"],
+            "last_checked": fetch["checked_at"] or fetch["fetched_at"],
+            "snapshot_hash": fetch["snapshot_hash"],
+            "drivers_found": bool(fetch["drivers_found"]),
+            "drivers": drivers,
+        }
+
+    def drivers_found(self, fetch_id):
+        """Whether a fetch holds real driver data rather than a placeholder (None for an unknown fetch id)."""
+        with self.lock:
+            row = self.conn.execute("SELECT drivers_found FROM fetches WHERE id = ?", (fetch_id,)).fetchone()
+        return bool(row["drivers_found"]) if row else None
+
+    def fetch_snapshot_hash(self, fetch_id):
+        """Content hash of a fetch (None for an unknown fetch id)."""
+        with self.lock:
+            row = self.conn.execute("SELECT snapshot_hash FROM fetches WHERE id = ?", (fetch_id,)).fetchone()
+        return row["snapshot_hash"] if row else None
+
+    def get_summary(self, content_hash, version):
+        """Precomputed driver summary of a snapshot in the given layout version (see summaries.py), or None."""
+        with self.lock:
+            row = self.conn.execute("SELECT summary FROM summaries WHERE snapshot_hash = ? AND version = ?",
+                                    (content_hash, version)).fetchone()
+        return json.loads(row["summary"]) if row else None
+
+    def has_summary(self, content_hash, version):
+        with self.lock:
+            row = self.conn.execute("SELECT 1 FROM summaries WHERE snapshot_hash = ? AND version = ?",
+                                    (content_hash, version)).fetchone()
+        return row is not None
+
+    def save_summary(self, content_hash, version, summary):
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO summaries (snapshot_hash, version, summary, created_at) VALUES (?, ?, ?, ?)",
+                (content_hash, version, json.dumps(summary), datetime.now().isoformat()))
+            self.conn.commit()
+
+    def get_answer(self, content_hash, question, model):
+        """Cached chat answer of a model to a normalized question about a snapshot, or None."""
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT answer FROM answers WHERE snapshot_hash = ? AND model = ? AND question = ?",
+                (content_hash, model, question)).fetchone()
+            if row is None:
+                return None
+            self.conn.execute("UPDATE answers SET hits = hits + 1 WHERE snapshot_hash = ? AND model = ? AND question = ?",
+                              (content_hash, model, question))
+            self.conn.commit()
+        return row["answer"]
+
+    def save_answer(self, content_hash, question, answer, model):
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO answers (snapshot_hash, model, question, answer, created_at) "
+                "VALUES (?, ?, ?, ?, ?)", (content_hash, model, question, answer, datetime.now().isoformat()))
+            self.conn.commit()
+
+    def clear_answers(self):
+        with self.lock:
+            self.conn.execute("DELETE FROM answers")
+            self.conn.commit()
+
+    def product_catalog(self, product_name, max_age):
+        """
+        Shared driver catalog for a product model: the drivers of the most
+        recent fetch for any tag of that product that came from Dell (not from
+        a catalog) and was fetched or re-checked within max_age seconds.
+        Returns {"fetch_id", "service_tag", "checked_at", "drivers"} or None.
+        """
+        cutoff = datetime.fromtimestamp(datetime.now().timestamp() - max_age).isoformat()
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT id, service_tag, COALESCE(checked_at, fetched_at) AS checked_at FROM fetches "
+                "WHERE product_name = ? AND drivers_found = 1 AND catalog_fetch_id IS NULL "
+                "AND COALESCE(checked_at, fetched_at) >= ? ORDER BY checked_at DESC LIMIT 1",
+                (product_name, cutoff)
+            ).fetchone()
+            if row is None:
+                return None
+            return {"fetch_id": row["id"], "service_tag": row["service_tag"], "checked_at": row["checked_at"],
+                    "drivers": self._fetch_drivers(row["id"])}
+
+    def latest_fetch_id(self, service_tag):
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT id FROM fetches WHERE service_tag = ? ORDER BY fetched_at DESC LIMIT 1", (service_tag,)
+            ).fetchone()
+        return row["id"] if row else None
+
+    def latest(self, service_tag):
+        fetch_id = self.latest_fetch_id(service_tag)
+        return self.get_result(fetch_id) if fetch_id is not None else None
+
+    def iter_latest(self, service_tags=None):
+        """Latest result for each tag (every stored tag by default), loaded one at a time for streamed exports."""
+        for service_tag in self.list_tags() if service_tags is None else service_tags:
+            result = self.latest(service_tag)
+            if result is not None:
+                yield result
+
+    def history(self, service_tag, limit=50):
+        """Fetch history for a tag, newest first."""
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT id, fetched_at, checked_at, product_name, driver_count FROM fetches "
+                "WHERE service_tag = ? ORDER BY fetched_at DESC LIMIT ?", (service_tag, limit)
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def list_tags(self):
+        with self.lock:
+            rows = self.conn.execute("SELECT DISTINCT service_tag FROM fetches ORDER BY service_tag").fetchall()
+        return [row["service_tag"] for row in rows]
+
+    def find_drivers(self, service_tag=None, product=None, name=None, category=None,
+                     released_before=None, released_after=None, latest_only=True, limit=1000):
+        """
+        Query driver records across tags, e.g. every tag whose latest BIOS was
+        released before a date: find_drivers(category="BIOS", released_before="2023-01-01").
+        """
+        conditions = []
+        params = []
+        if latest_only:
+            conditions.append("f.fetched_at = (SELECT MAX(fetched_at) FROM fetches WHERE service_tag = f.service_tag)")
+        if service_tag:
+            conditions.append("f.service_tag = ?")
+            params.append(service_tag)
+        if product:
+            conditions.append("f.product_name = ?")
+            params.append(product)
+        if name:
+            conditions.append("d.name LIKE ?")
+            params.append(f"%{name}%")
+        if category:
+            conditions.append("d.category = ?")
+            params.append(category)
+        if released_before:
+            conditions.append("d.release_date_iso < ?")
+            params.append(released_before)
+        if released_after:
+            conditions.append("d.release_date_iso > ?")
+            params.append(released_after)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        with self.lock:
+            rows = self.conn.execute(
+                f"SELECT f.service_tag, f.product_name, f.fetched_at, d.{', d.'.join(DRIVER_COLUMNS)} "
+                f"FROM fetch_drivers fd JOIN fetches f ON f.id = fd.fetch_id "
+                f"JOIN driver_records d ON d.id = fd.record_id {where} "
+                f"ORDER BY f.service_tag, fd.position LIMIT ?", params + [limit]
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def import_json_directory(self, directory="data/json"):
+        """One-time import of the timestamped JSON files written by earlier versions."""
+        imported = 0
+        if not os.path.isdir(directory):
+            return imported
+        for file_name in sorted(os.listdir(directory)):
+            if not file_name.endswith(".json"):
+                continue
+            try:
+                with open(os.path.join(directory, file_name), 'r', encoding='utf-8') as f:
+                    result = json.load(f)
+                if "service_tag" in result and not self.has_fetch(result["service_tag"], result.get("timestamp")):
+                    self.save_result(result)
+                    imported += 1
+            except (OSError, ValueError):
+                continue
+        return imported
+
+
+_default_store = None
+_default_store_lock = threading.Lock()
+
+
+# Function to get the process-wide result store
+def get_store():
+    global _default_store
+    with _default_store_lock:
+        if _default_store is None:
+            _default_store = ResultStore(path=os.environ.get("DELL_RESULTS_PATH", "data/results.db"))
+        return _default_store
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Manage the driver result store.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    import_parser = subparsers.add_parser("import", help="Import existing JSON result files")
+    import_parser.add_argument("directory", nargs="?", default="data/json")
+    changes_parser = subparsers.add_parser("changes", help="Print driver changes as NDJSON")
+    changes_parser.add_argument("--since", help="Only changes detected after this ISO timestamp")
+    changes_parser.add_argument("--tag", help="Only changes for this service tag")
+    args = parser.parse_args(argv)
+
+    if args.command == "import":
+        imported = get_store().import_json_directory(args.directory)
+        print(f"Imported {imported} result files from {args.directory}")
+    elif args.command == "changes":
+        service_tag = args.tag.upper() if args.tag else None
+        for change in get_store().changes(service_tag=service_tag, since=args.since):
+            print(json.dumps(change))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,236 @@
+import re
+
+from diffing import snapshot_hash
+from store import get_store, normalize_release_date
+
+# Bump when the summary layout changes, so stored summaries are rebuilt
+SUMMARY_VERSION = 1
+
+# How many drivers a direct answer lists before cutting off
+MAX_LISTED = 25
+
+QUESTION_PATTERN = re.compile(r"[a-z0-9]+")
+
+# Words that carry no meaning for matching a question to a summary answer
+QUESTION_STOPWORDS = {
+    "a", "an", "the", "is", "are", "was", "be", "what", "whats", "s", "which", "who", "for", "of", "on", "in",
+    "to", "my", "this", "that", "me", "there", "any", "do", "does", "i", "it", "its", "please", "can", "you",
+    "tell", "we", "our", "have", "has", "get", "available", "version", "versions", "system", "device", "and",
+    "or", "with", "from", "about", "out", "here",
+}
+
+# Spelling variants folded together, so "newest drivers" and "latest driver" are the same question
+QUESTION_SYNONYMS = {
+    "drivers": "driver", "updates": "update", "newest": "latest", "recent": "latest", "current": "latest",
+    "last": "latest", "critical": "urgent", "urgently": "urgent", "recommend": "recommended",
+    "categories": "category", "number": "count", "many": "count", "how": "count", "firmwares": "firmware",
+    "listing": "list", "show": "list", "all": "list", "give": "list", "wifi": "wireless",
+}
+
+# Words that only make a question more polite or more general; understood but not an intent
+GENERIC_TERMS = {"driver", "update", "download", "link", "dell"}
+
+
+# Function to turn a question into the words that decide its answer
+def question_terms(question):
+    terms = []
+    for word in QUESTION_PATTERN.findall(question.lower()):
+        word = QUESTION_SYNONYMS.get(word, word)
+        if word not in QUESTION_STOPWORDS and word not in terms:
+            terms.append(word)
+    return terms
+
+
+# Function to normalize a question into an answer cache key (case, punctuation and spacing don't matter)
+def normalize_question(question):
+    # Every word is kept in order: "is the BIOS newer than the chipset?" is another question reversed
+    return " ".join(QUESTION_PATTERN.findall(question.lower()))
+
+
+# Function to sort drivers newest first (drivers without a readable date go last)
+def newest_first(drivers):
+    # Many drivers share a release date; each distinct date is parsed once
+    dates = {}
+
+    def release_key(driver):
+        value = driver.get("release_date")
+        if value not in dates:
+            dates[value] = normalize_release_date(value) or ""
+        return dates[value]
+
+    return sorted(drivers, key=release_key, reverse=True)
+
+
+# Function to keep only the fields a summary needs from a driver
+def compact_driver(driver):
+    return {key: driver[key] for key in ("name", "category", "version", "release_date", "importance", "download_url")
+            if driver.get(key)}
+
+
+# Function to derive the structured summary of a result
+def build_summary(result):
+    """
+    Summary of one result's drivers: every category (newest first), the latest
+    driver per category, Urgent and Recommended updates and the newest
+    releases. Drivers are compacted to the fields answers need.
+    """
+    drivers = newest_first([compact_driver(driver) for driver in result.get("drivers", [])])
+    by_category = {}
+    by_importance = {}
+    for driver in drivers:
+        by_category.setdefault(driver.get("category") or "Other", []).append(driver)
+        by_importance.setdefault((driver.get("importance") or "").lower(), []).append(driver)
+    return {
+        "service_tag": result.get("service_tag"),
+        "product_name": result.get("product_info", {}).get("product_name"),
+        "drivers_found": bool(result.get("drivers_found", True)),
+        "driver_count": len(drivers),
+        "by_category": by_category,
+        "latest_by_category": {category: entries[0] for category, entries in by_category.items()},
+        "urgent": by_importance.get("urgent", []),
+        "recommended": by_importance.get("recommended", []),
+        "newest": drivers[:10],
+    }
+
+
+# Function to get the (precomputed) summary of a stored result
+def get_summary(fetch_id, store=None, result=None):
+    """
+    Return (content_hash, summary). Summaries are stored per content hash, so
+    a result is summarized once no matter how many fetches or tags share its
+    drivers; missing or outdated summaries are built now. result may be
+    passed when the caller already has it in memory.
+    """
+    if store is None:
+        store = get_store()
+    content_hash = store.fetch_snapshot_hash(fetch_id)
+    if content_hash is not None:
+        summary = store.get_summary(content_hash, SUMMARY_VERSION)
+        if summary is not None:
+            return content_hash, summary
+    if result is None:
+        result = store.get_result(fetch_id)
+        if result is None:
+            raise ValueError(f"No stored result with fetch id {fetch_id}")
+    if content_hash is None:
+        content_hash = snapshot_hash(result["product_info"], result["drivers"])
+    summary = build_summary(result)
+    store.save_summary(content_hash, SUMMARY_VERSION, summary)
+    return content_hash, summary
+
+
+# Function to summarize a result right after its lookup (a no-op if its drivers were summarized before)
+def precompute_summary(fetch_id, result, store=None):
+    if store is None:
+        store = get_store()
+    content_hash = store.fetch_snapshot_hash(fetch_id)
+    if content_hash is None or not store.has_summary(content_hash, SUMMARY_VERSION):
+        get_summary(fetch_id, store=store, result=result)
+
+
+# Function to describe one driver on a single line
+def driver_line(driver):
+    details = [detail for detail in (driver.get("release_date"), driver.get("importance")) if detail]
+    line = f"{driver.get('name', 'Unknown Driver')} {driver.get('version', '')}".strip()
+    if details:
+        line += f" ({', '.join(details)})"
+    return line
+
+
+# Function to render a list of drivers as Markdown bullets
+def driver_list(title, drivers):
+    lines = [f"**{title} ({len(drivers)}):**"]
+    for driver in drivers[:MAX_LISTED]:
+        line = f"- {driver_line(driver)}"
+        if driver.get("download_url"):
+            line += f" - [Download]({driver['download_url']})"
+        lines.append(line)
+    if len(drivers) > MAX_LISTED:
+        lines.append(f"- ... and {len(drivers) - MAX_LISTED} more")
+    return "\n".join(lines)
+
+
+# Function to build the compact summary sent to the model with every chat
+def summary_context(summary):
+    lines = ["## Driver Summary",
+             "Categories: " + ", ".join(f"{category} ({len(entries)})"
+                                        for category, entries in sorted(summary["by_category"].items())),
+             "Latest per category:"]
+    lines.extend(f"- {category}: {driver_line(driver)}"
+                 for category, driver in sorted(summary["latest_by_category"].items()))
+    for key, label in (("urgent", "Urgent updates"), ("recommended", "Recommended updates")):
+        drivers = summary[key]
+        if drivers:
+            listed = "; ".join(driver_line(driver) for driver in drivers[:10])
+            more = f"; ... and {len(drivers) - 10} more" if len(drivers) > 10 else ""
+            lines.append(f"{label} ({len(drivers)}): {listed}{more}")
+    return "\n".join(lines)
+
+
+# Function to find the categories a question names
+def matching_categories(summary, terms):
+    matched = []
+    used = set()
+    for category in summary["by_category"]:
+        category_terms = set(question_terms(category)) - GENERIC_TERMS
+        hits = category_terms.intersection(terms)
+        if hits:
+            matched.append(category)
+            used.update(hits)
+    return matched, used
+
+
+# Function to answer a common question directly from a summary
+def answer_question(summary, question):
+    """
+    Answer questions such as "what's the latest BIOS?", "which updates are
+    Urgent?" or "list network drivers" from the summary alone. Returns
+    Markdown, or None when the question has any word the summary can't
+    account for, so everything else still goes to the model.
+    """
+    if not summary or not summary.get("drivers_found") or not summary["driver_count"]:
+        return None
+    terms = set(question_terms(question))
+    categories, category_terms = matching_categories(summary, terms)
+    intents = terms & {"latest", "urgent", "recommended", "count", "list", "category"}
+    if not intents and not categories:
+        return None
+    if terms - intents - category_terms - GENERIC_TERMS:
+        return None
+
+    def in_categories(drivers):
+        return [driver for driver in drivers if driver.get("category") in categories] if categories else drivers
+
+    scope = f" {' / '.join(categories)}" if categories else ""
+    if "urgent" in intents or "recommended" in intents:
+        sections = []
+        for key, label in (("urgent", "Urgent"), ("recommended", "Recommended")):
+            if key in intents:
+                drivers = in_categories(summary[key])
+                sections.append(driver_list(f"{label}{scope} updates", drivers) if drivers
+                                else f"No{scope} drivers are marked {label}.")
+        return "\n\n".join(sections)
+    if "count" in intents:
+        if categories:
+            return "\n".join(f"There are {len(summary['by_category'][category])} {category} drivers."
+                             for category in categories)
+        return (f"There are {summary['driver_count']} drivers in {len(summary['by_category'])} categories: "
+                + ", ".join(f"{category} ({len(entries)})" for category, entries in summary["by_category"].items())
+                + ".")
+    if "category" in intents and not categories:
+        return driver_list("Categories", [{"name": category, "version": f"({len(entries)} drivers)"}
+                                          for category, entries in sorted(summary["by_category"].items())])
+    if "latest" in intents:
+        if not categories:
+            return driver_list("Newest releases", summary["newest"])
+        lines = []
+        for category in categories:
+            driver = summary["latest_by_category"][category]
+            line = f"The latest **{category}** driver is **{driver_line(driver)}**."
+            if driver.get("download_url"):
+                line += f" [Download]({driver['download_url']})"
+            lines.append(line)
+        return "\n\n".join(lines)
+    # "list drivers" names no category, so every category is listed
+    listed = categories or sorted(summary["by_category"])
+    return "\n\n".join(driver_list(f"{category} drivers", summary["by_category"][category]) for category in listed)
@@ -0,0 +1,72 @@
+import os
+import sys
+import tempfile
+from contextlib import contextmanager
+from types import SimpleNamespace
+
+import pytest
+
+# The modules live at the repository root rather than in a package
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# Lookups set up logging on first use; keep their log files out of the working tree
+os.environ.setdefault("DELL_LOG_DIR", tempfile.mkdtemp(prefix="dell-test-logs-"))
+
+from store import ResultStore  # noqa: E402
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = ResultStore(path=str(tmp_path / "results.db"))
+    yield store
+    store.conn.close()
+
+
+# Function to build a lookup result the way get_dell_drivers returns it
+def make_result(service_tag="ABC1234", drivers=None, timestamp="2024-05-01T10:00:00", drivers_found=True,
+                product_name="Latitude 5440"):
+    return {
+        "service_tag": service_tag,
+        "product_info": {"product_name": product_name},
+        "timestamp": timestamp,
+        "drivers": drivers if drivers is not None else [],
+        "drivers_found": drivers_found,
+    }
+
+
+# Throttle without the interactive random delay
+@contextmanager
+def no_delay(url, delay=None):
+    yield
+
+
+@pytest.fixture
+def dell(tmp_path, monkeypatch, store):
+    """
+    Lookups against the benchmark suite's local Dell stand-in, with their own
+    response cache, endpoint selector, result store and payload directory.
+    """
+    import endpoints
+    from benchmarks.mock_server import MockServer
+    from cache import ResponseCache
+    from dell_api import get_dell_drivers
+    from endpoints import EndpointSelector
+    from logging_setup import PayloadDumps
+
+    with MockServer(driver_count=20) as server:
+        monkeypatch.setattr(endpoints, "DELL_BASE_URL", server.base_url)
+        stand_in = SimpleNamespace(
+            server=server,
+            store=store,
+            cache=ResponseCache(path=str(tmp_path / "cache.db")),
+            selector=EndpointSelector(path=str(tmp_path / "endpoint_stats.json")),
+            dumps=PayloadDumps(directory=str(tmp_path / "payloads"), sample_rate=0),
+        )
+
+        def lookup(service_tag, **kwargs):
+            options = dict(throttle=no_delay, cache=stand_in.cache, selector=stand_in.selector, store=store,
+                           dumps=stand_in.dumps)
+            options.update(kwargs)
+            return get_dell_drivers(service_tag, **options)
+
+        stand_in.lookup = lookup
+        yield stand_in
@@ -0,0 +1,96 @@
+import csv
+import io
+import json
+import zipfile
+
+import pytest
+
+pytest.importorskip("httpx")
+
+from fastapi.testclient import TestClient  # noqa: E402
+
+import api  # noqa: E402
+import jobs  # noqa: E402
+from jobs import JobQueue  # noqa: E402
+
+
+@pytest.fixture
+def client(dell, tmp_path, monkeypatch):
+    """The API with its store, cache, job queue and lookups pointed at the Dell stand-in."""
+    def lookup(service_tag, throttle=None, **kwargs):
+        # Jobs pass throttle=None for the interactive default, which the stand-in replaces with no delay
+        if throttle is not None:
+            kwargs["throttle"] = throttle
+        return dell.lookup(service_tag, **kwargs)
+
+    queue = JobQueue(path=str(tmp_path / "jobs.db"))
+    monkeypatch.setattr(api, "get_dell_drivers", lookup)
+    monkeypatch.setattr(jobs, "get_dell_drivers", lookup)
+    monkeypatch.setattr(api, "get_store", lambda: dell.store)
+    monkeypatch.setattr(api, "get_cache", lambda: dell.cache)
+    monkeypatch.setattr(api, "get_job_queue", lambda: queue)
+    with TestClient(api.app) as client:
+        client.queue = queue
+        yield client
+
+
+def test_lookup_returns_and_stores_the_result(client):
+    response = client.post("/lookup", json={"service_tag": "abc1234"})
+    assert response.status_code == 200
+    assert response.json()["service_tag"] == "ABC1234"
+    assert len(response.json()["drivers"]) == 20
+
+    assert client.get("/results").json() == {"service_tags": ["ABC1234"]}
+    assert client.get("/results/ABC1234").json()["fetch_id"] == response.json()["fetch_id"]
+    assert client.get("/results/ABC1234/markdown").text.startswith("#")
+    assert client.get("/results/XYZ9876").status_code == 404
+
+
+def test_invalid_tags_are_rejected(client):
+    assert client.post("/lookup", json={"service_tag": "not a tag!"}).status_code == 422
+    assert client.post("/batch", json={"service_tags": []}).status_code == 422
+
+
+def test_jobs_run_in_the_background(client):
+    response = client.post("/jobs", json={"service_tag": "ABC1234"})
+    assert response.status_code == 202
+    job = client.queue.wait(response.json()["id"], timeout=10)
+    assert job["status"] == "done"
+    assert client.get(f"/jobs/{job['id']}").json()["fetch_id"] == job["fetch_id"]
+    assert client.get("/jobs/unknown").status_code == 404
+
+
+def test_batch_queues_a_job_per_tag(client):
+    response = client.post("/batch", json={"service_tags": ["ABC1234", "DEF5678", "abc1234"], "rate": 50})
+    assert response.status_code == 202
+    queued = response.json()
+    assert sorted(queued) == ["ABC1234", "DEF5678"]
+    for job in queued.values():
+        assert client.queue.wait(job["id"], timeout=10)["status"] == "done"
+    assert client.get("/results").json() == {"service_tags": ["ABC1234", "DEF5678"]}
+
+
+def test_export_streams_every_stored_result(client):
+    for tag in ("ABC1234", "DEF5678"):
+        client.post("/lookup", json={"service_tag": tag})
+
+    response = client.get("/export?format=zip")
+    assert response.status_code == 200
+    names = zipfile.ZipFile(io.BytesIO(response.content)).namelist()
+    assert len([name for name in names if name.endswith(".json")]) == 2
+
+    lines = client.get("/export?format=ndjson&service_tags=DEF5678").text.splitlines()
+    assert [json.loads(line)["service_tag"] for line in lines] == ["DEF5678"]
+    assert client.get("/export?format=tar").status_code == 422
+
+
+def test_report_is_built_from_stored_results(client):
+    client.post("/lookup", json={"service_tag": "ABC1234"})
+    response = client.get("/report?format=csv")
+    assert response.status_code == 200
+    rows = list(csv.DictReader(io.StringIO(response.text)))
+    assert len(rows) == 20
+    assert "attachment" in response.headers["content-disposition"]
+
+    assert client.get("/results/ABC1234/report?format=html").text.lstrip().startswith("<")
+    assert client.get("/report?format=pdf").status_code == 422
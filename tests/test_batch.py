@@ -0,0 +1,56 @@
+import threading
+
+import batch
+from batch import HostLimiter, RateBudget, run_batch
+from conftest import make_result
+from http_client import HttpClient
+
+
+def test_placeholder_results_count_as_failures(store, monkeypatch):
+    def fake_lookup(service_tag, throttle=None, store=None):
+        if service_tag == "BROKEN1":
+            raise RuntimeError("connection reset")
+        fetch_id, _ = store.save_snapshot(make_result(service_tag, drivers_found=service_tag != "EMPTY01"))
+        return fetch_id
+
+    monkeypatch.setattr(batch, "get_dell_drivers", fake_lookup)
+    seen = []
+    results = run_batch(["ABC1234", "EMPTY01", "BROKEN1"], workers=2, store=store,
+                        on_progress=lambda tag, progress: seen.append((progress.completed, progress.failed)))
+    assert isinstance(results["ABC1234"], int)
+    assert results["EMPTY01"].startswith("Error: no drivers found")
+    assert results["BROKEN1"] == "Error: connection reset"
+    assert seen[-1] == (1, 2)
+
+
+class CountingBudget(RateBudget):
+    def __init__(self):
+        super().__init__(rate=1000, burst=1000)
+        self.acquired = 0
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        self.acquired += 1
+        super().acquire()
+
+
+def test_retries_draw_from_the_rate_budget(monkeypatch):
+    budget = CountingBudget()
+    limiter = HostLimiter(per_host=2, budget=budget)
+    client = HttpClient(max_retries=3, backoff=0, http2=False)
+    statuses = iter([503, 503, 200])
+
+    class Response:
+        def __init__(self, status_code):
+            self.status_code = status_code
+            self.headers = {}
+
+        def close(self):
+            pass
+
+    monkeypatch.setattr(client.session, "request", lambda *args, **kwargs: Response(next(statuses)))
+    with limiter.throttle("https://www.dell.com/support") as before_retry:
+        response = client.get("https://www.dell.com/support", before_retry=before_retry)
+    assert response.status_code == 200
+    # One token for the request and one for each of its two retries
+    assert budget.acquired == 3
@@ -0,0 +1,51 @@
+from cache import ResponseCache
+
+
+def test_entries_expire_after_their_kind_ttl(tmp_path):
+    cache = ResponseCache(path=str(tmp_path / "cache.db"), ttls={"product": 3600, "drivers": 0})
+    cache.put("https://example.test/product", "ABC1234", "product", b"{}")
+    cache.put("https://example.test/drivers", "ABC1234", "drivers", b"[]", etag='"v1"')
+    assert cache.get("https://example.test/product", "product").fresh
+    stale = cache.get("https://example.test/drivers", "drivers")
+    assert not stale.fresh
+    assert stale.etag == '"v1"'
+    assert cache.get("https://example.test/missing", "drivers") is None
+
+
+def test_fresh_responses_are_served_without_asking_dell(dell):
+    dell.lookup("ABC1234", catalog_ttl=0)
+    requests = dict(dell.server.requests)
+    result = dell.store.get_result(dell.lookup("ABC1234", catalog_ttl=0))
+    assert len(result["drivers"]) == 20
+    assert dell.server.requests == requests
+
+
+def test_expired_responses_are_revalidated(dell):
+    dell.cache.ttls = {"product": 0, "drivers": 0}
+    first = dell.lookup("ABC1234", catalog_ttl=0)
+    # Unchanged at Dell: answered with 304 and served from the cache
+    assert dell.lookup("ABC1234", catalog_ttl=0) == first
+    assert dell.cache.revalidations == 2
+
+    # Changed at Dell: the new body replaces the cached one
+    dell.server.driver_count = 25
+    result = dell.store.get_result(dell.lookup("ABC1234", catalog_ttl=0))
+    assert len(result["drivers"]) == 25
+    assert dell.cache.revalidations == 3
+
+
+def test_large_bodies_are_stored_and_read_in_chunks(tmp_path):
+    cache = ResponseCache(path=str(tmp_path / "cache.db"))
+    body = bytes(range(256)) * 1000
+    spool = tmp_path / "body.part"
+    spool.write_bytes(body)
+    cache.put_file("https://example.test/drivers", "ABC1234", "drivers", str(spool), etag='"v1"', chunk_size=4096)
+
+    cached = cache.get("https://example.test/drivers", "drivers", with_body=False)
+    assert cached.content is None
+    assert cached.size == len(body)
+    assert cached.etag == '"v1"'
+    chunks = list(cache.iter_body("https://example.test/drivers", chunk_size=65536))
+    assert max(len(chunk) for chunk in chunks) == 65536
+    assert b"".join(chunks) == body
+    assert cache.get("https://example.test/drivers", "drivers").content == body
@@ -0,0 +1,41 @@
+import time
+import zlib
+
+import pytest
+
+import dell_api
+
+
+# Function to name the product the stand-in reports for a tag (see MockDellHandler.do_GET)
+def product_of(server, service_tag):
+    return f"Latitude {5400 + zlib.crc32(service_tag.encode()) % server.models}"
+
+
+def test_lookup_stores_the_drivers(dell):
+    result = dell.store.get_result(dell.lookup("ABC1234"))
+    assert result["drivers_found"]
+    assert len(result["drivers"]) == 20
+    assert result["product_info"]["product_name"] == product_of(dell.server, "ABC1234")
+
+
+def test_failed_catalog_fill_releases_its_waiters(dell, monkeypatch):
+    def broken_save(result):
+        raise RuntimeError("disk full")
+
+    monkeypatch.setattr(dell.store, "save_snapshot", broken_save)
+    with pytest.raises(RuntimeError):
+        dell.lookup("ABC1234")
+    assert dell_api._catalog_fills == {}
+
+
+def test_waiting_for_a_stuck_catalog_fill_times_out(dell, monkeypatch):
+    monkeypatch.setattr(dell_api, "CATALOG_FILL_TIMEOUT", 0.2)
+    fill, filling = dell_api.claim_catalog_fill(product_of(dell.server, "ABC1234"))
+    assert filling
+    try:
+        started = time.monotonic()
+        result = dell.store.get_result(dell.lookup("ABC1234"))
+        assert result["drivers_found"]
+        assert time.monotonic() - started < 5
+    finally:
+        dell_api.finish_catalog_fill(product_of(dell.server, "ABC1234"), fill)
@@ -0,0 +1,99 @@
+import json
+
+import pytest
+
+from benchmarks.parsing import synthetic_response
+from dell_api import DriverListResponse, parse_driver_body
+from driver_schemas import DriverStreamParser, SupportPageParser, parse_drivers
+
+SMALL_BODIES = [
+    json.dumps({"TotalCount": 2, "Score": -1.5e3, "Drivers": [
+        {"DriverName": "BIOS", "DriverVersion": "1.2.0", "Size": 10.25, "FileFrmtInfo": {"HttpFileLocation": "u1"}},
+        {"DriverName": "Audio \\u00e9", "DriverType": "Audio", "Flags": [True, False, None], "Rank": 12}],
+        "Done": True}).encode(),
+    json.dumps([{"title": "Network", "driverVersion": "23.40", "releaseDate": "15 Feb 2024", "n": 1e-7},
+                {"title": "Chipset", "driverType": "Chipset", "n": 100}]).encode(),
+]
+
+
+# Function to stream a body through the parser in the given pieces
+def stream(pieces):
+    parser = DriverStreamParser()
+    records = []
+    for piece in pieces:
+        records.extend(parser.feed(piece))
+    records.extend(parser.close())
+    return parser.format_name, [record.to_dict() for record in records]
+
+
+@pytest.mark.parametrize("body", SMALL_BODIES)
+def test_every_two_way_split_matches_the_whole_body_parser(body):
+    format_name, records = parse_drivers(body)
+    expected = (format_name, [record.to_dict() for record in records])
+    for split in range(len(body) + 1):
+        assert stream([body[:split], body[split:]]) == expected, split
+
+
+@pytest.mark.parametrize("body", SMALL_BODIES)
+def test_byte_by_byte_matches_the_whole_body_parser(body):
+    format_name, records = parse_drivers(body)
+    assert stream([body[index:index + 1] for index in range(len(body))]) == \
+        (format_name, [record.to_dict() for record in records])
+
+
+def test_number_cut_off_by_a_chunk_boundary():
+    # "1." and "1e" decode as 1 on their own; the rest of the number is in the next chunk
+    for first, second in ((b'{"A": 1.', b'5, "Drivers": []}'), (b'{"A": 1e', b'3, "Drivers": []}'),
+                          (b'{"A": 1', b'0, "Drivers": []}')):
+        assert stream([first, second]) == ("drivers_object", [])
+
+
+def test_truncated_body_is_rejected():
+    body = SMALL_BODIES[0]
+    with pytest.raises(ValueError):
+        stream([body[:-5]])
+
+
+def test_unknown_shape_has_no_format():
+    assert stream([b'{"error": "not found"}'])[0] is None
+    assert stream([b'"nope"'])[0] is None
+
+
+@pytest.mark.parametrize("threshold", [0, 1024, 10 ** 9])
+def test_whole_body_and_streamed_parsing_agree(threshold):
+    body = synthetic_response(300)
+    chunks = [body[start:start + 4096] for start in range(0, len(body), 4096)]
+    result = parse_driver_body(DriverListResponse(200), chunks, stream_threshold=threshold)
+    assert result.format_name == "drivers_object"
+    assert result.size == len(body)
+    assert [record.to_dict() for record in result.records] == \
+        [record.to_dict() for record in parse_drivers(body)[1]]
+
+
+@pytest.mark.parametrize("threshold", [0, 10 ** 9])
+def test_invalid_body_raises_value_error(threshold):
+    with pytest.raises(ValueError):
+        parse_driver_body(DriverListResponse(200), [b'{"Drivers": [{"DriverName": '], stream_threshold=threshold)
+
+
+PAGE = (b'<html><head><title>Latitude 5440 - Support</title></head><body>'
+        b'<script>var config = {"drivers": [not json]};</script>'
+        b'<script type="application/json">{"page": {"drivers": [{"DriverName": "BIOS", "DriverVersion": "1.2"}, '
+        b'{"title": "Audio", "driverVersion": "6.0"}], "other": 1}}</script>'
+        + b"<div>filler</div>" * 100 + b"</body></html>")
+
+
+def test_support_page_at_every_split():
+    for split in range(len(PAGE) + 1):
+        page = SupportPageParser()
+        page.feed(PAGE[:split])
+        page.feed(PAGE[split:])
+        page.close()
+        assert page.title == "Latitude 5440 - Support", split
+        assert [record.name for record in page.records] == ["BIOS", "Audio"], split
+
+
+def test_support_page_stops_once_title_and_drivers_are_found():
+    page = SupportPageParser()
+    end = PAGE.index(b"</script><div>") + len(b"</script>")
+    assert page.feed(PAGE[:end])
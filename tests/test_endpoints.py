@@ -0,0 +1,52 @@
+from endpoints import DRIVER_ENDPOINT_TEMPLATES, EndpointSelector
+
+
+def test_failures_open_the_circuit_with_growing_backoff(tmp_path):
+    selector = EndpointSelector(path=str(tmp_path / "endpoint_stats.json"), base_backoff=60)
+    template = DRIVER_ENDPOINT_TEMPLATES[0]
+    selector.record(template, False, 0.1, 503)
+    first = selector.stats[template]["open_until"]
+    selector.record(template, False, 0.1)
+    assert selector.stats[template]["open_until"] - first > 50
+    assert template not in selector.ranked()
+
+    selector.record(template, True, 0.1, 200)
+    assert selector.ranked()[0] == template
+
+
+def test_unknown_tags_do_not_count_against_the_endpoint(tmp_path):
+    selector = EndpointSelector(path=str(tmp_path / "endpoint_stats.json"))
+    template = DRIVER_ENDPOINT_TEMPLATES[0]
+    for status in (404, 200, 400):
+        selector.record(template, False, 0.1, status)
+    assert selector.stats[template]["failures"] == 0
+    assert template in selector.ranked()
+
+
+def test_blocked_and_throttled_responses_count_against_the_endpoint(tmp_path):
+    selector = EndpointSelector(path=str(tmp_path / "endpoint_stats.json"))
+    for template, status in zip(DRIVER_ENDPOINT_TEMPLATES, (403, 429)):
+        selector.record(template, False, 0.1, status)
+        assert template not in selector.ranked()
+
+
+def test_state_survives_a_restart(tmp_path):
+    path = str(tmp_path / "endpoint_stats.json")
+    selector = EndpointSelector(path=path)
+    selector.record(DRIVER_ENDPOINT_TEMPLATES[2], True, 0.1, 200)
+    selector.record(DRIVER_ENDPOINT_TEMPLATES[0], False, 0.1, 500)
+    restarted = EndpointSelector(path=path)
+    assert restarted.ranked()[0] == DRIVER_ENDPOINT_TEMPLATES[2]
+    assert DRIVER_ENDPOINT_TEMPLATES[0] not in restarted.ranked()
+    assert [p.name for p in tmp_path.iterdir()] == ["endpoint_stats.json"]
+
+
+def test_lookup_of_an_unknown_tag_leaves_the_endpoints_open(dell):
+    dell.lookup("N404ABC")
+    assert all(row["failures"] == 0 and row["backoff_s"] == 0 for row in dell.selector.snapshot())
+    assert dell.store.get_result(dell.lookup("ABC1234"))["drivers_found"]
+
+
+def test_lookup_of_a_blocked_tag_backs_the_endpoints_off(dell):
+    dell.lookup("F403ABC")
+    assert all(row["backoff_s"] > 0 for row in dell.selector.snapshot())
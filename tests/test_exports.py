@@ -0,0 +1,57 @@
+import io
+import json
+import zipfile
+
+from conftest import make_result
+from exports import export_file_name, iter_ndjson, iter_zip
+
+
+def drivers(count, version="1.0"):
+    return [{"name": f"Driver {index}", "category": "Network", "version": version, "release_date": "2024-01-10"}
+            for index in range(count)]
+
+
+def stored_results(store, tags):
+    for tag in tags:
+        store.save_result(make_result(service_tag=tag, drivers=drivers(3)))
+    return store.iter_latest()
+
+
+def test_zip_holds_a_json_and_a_markdown_file_per_result(store):
+    data = b"".join(iter_zip(stored_results(store, ["ABC1234", "DEF5678"])))
+    with zipfile.ZipFile(io.BytesIO(data)) as archive:
+        assert archive.testzip() is None
+        names = archive.namelist()
+        assert names == ["ABC1234_20240501_100000.json", "ABC1234_20240501_100000.md",
+                         "DEF5678_20240501_100000.json", "DEF5678_20240501_100000.md"]
+        record = json.loads(archive.read(names[2]))
+        assert record["service_tag"] == "DEF5678"
+        assert len(record["drivers"]) == 3
+        assert "Driver 2" in archive.read(names[3]).decode("utf-8")
+
+
+def test_zip_is_streamed_one_result_at_a_time():
+    consumed = []
+
+    def results():
+        for tag in ("ABC1234", "DEF5678", "GHI9012"):
+            consumed.append(tag)
+            yield make_result(service_tag=tag, drivers=drivers(200))
+
+    chunks = iter_zip(results())
+    first = next(chunks)
+    # The first entry's bytes go out before the next result has even been loaded
+    assert first.startswith(b"PK\x03\x04")
+    assert consumed == ["ABC1234"]
+    rest = list(chunks)
+    assert consumed == ["ABC1234", "DEF5678", "GHI9012"]
+    assert zipfile.ZipFile(io.BytesIO(first + b"".join(rest))).testzip() is None
+
+
+def test_ndjson_has_one_result_per_line(store):
+    lines = b"".join(iter_ndjson(stored_results(store, ["ABC1234", "DEF5678"]))).decode("utf-8").splitlines()
+    assert [json.loads(line)["service_tag"] for line in lines] == ["ABC1234", "DEF5678"]
+
+
+def test_export_file_names_carry_the_lookup_time():
+    assert export_file_name(make_result(timestamp="2024-05-01T10:20:30"), "md") == "ABC1234_20240501_102030.md"
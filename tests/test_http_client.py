@@ -0,0 +1,168 @@
+import socket
+import threading
+import time
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+
+import pytest
+import requests
+
+import http_client
+from http_client import HttpClient, parse_retry_after
+
+
+class ScriptedHandler(BaseHTTPRequestHandler):
+    """Answers each request with the next (status, headers) of the server's script, then 200."""
+
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _answer(self):
+        self.server.methods.append(self.command)
+        length = int(self.headers.get("Content-Length") or 0)
+        self.rfile.read(length)
+        status, headers = self.server.script.pop(0) if self.server.script else (200, {})
+        body = b"ok" if status == 200 else b"busy"
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    do_GET = _answer
+    do_POST = _answer
+
+
+@pytest.fixture
+def stub():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), ScriptedHandler)
+    server.script = []
+    server.methods = []
+    server.url = f"http://127.0.0.1:{server.server_address[1]}/"
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+# Function to get a local URL nothing listens on
+def unused_url():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    return f"http://127.0.0.1:{port}/"
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    """The delays the client waited, without waiting them (nor touching other threads' sleeps)."""
+    delays = []
+    monkeypatch.setattr(http_client, "time", SimpleNamespace(sleep=delays.append))
+    return delays
+
+
+def test_rate_limits_and_server_errors_are_retried(stub, sleeps):
+    stub.script = [(429, {}), (503, {}), (502, {})]
+    client = HttpClient(max_retries=3, backoff=0.5, http2=False)
+    response = client.get(stub.url)
+    assert response.status_code == 200
+    assert client.retries == 3
+    assert len(stub.methods) == 4
+
+
+def test_retries_give_up_after_max_retries(stub, sleeps):
+    stub.script = [(500, {})] * 5
+    client = HttpClient(max_retries=2, http2=False)
+    assert client.get(stub.url).status_code == 500
+    assert len(stub.methods) == 3
+
+
+def test_retry_after_seconds_is_honoured(stub, sleeps):
+    stub.script = [(429, {"Retry-After": "7"})]
+    client = HttpClient(max_retries=3, max_backoff=30, http2=False)
+    assert client.get(stub.url).status_code == 200
+    assert sleeps == [7.0]
+
+
+def test_retry_after_date_is_honoured_and_capped(stub, sleeps):
+    stub.script = [(503, {"Retry-After": formatdate(time.time() + 20, usegmt=True)}),
+                   (503, {"Retry-After": formatdate(time.time() + 3600, usegmt=True)})]
+    client = HttpClient(max_retries=3, max_backoff=60, http2=False)
+    assert client.get(stub.url).status_code == 200
+    assert 15 <= sleeps[0] <= 20
+    assert sleeps[1] == 60
+
+
+def test_parse_retry_after():
+    assert parse_retry_after("3") == 3.0
+    assert parse_retry_after(formatdate(time.time() - 60, usegmt=True)) == 0.0
+    assert parse_retry_after("soon") is None
+    assert parse_retry_after(None) is None
+
+
+def test_backoff_is_jittered_below_the_exponential_ceiling(stub, sleeps):
+    stub.script = [(500, {})] * 4
+    client = HttpClient(max_retries=4, backoff=1.0, max_backoff=5, http2=False)
+    client.get(stub.url)
+    assert len(sleeps) == 4
+    for attempt, delay in enumerate(sleeps):
+        assert 0 <= delay <= min(5, 2 ** attempt)
+    # Full jitter rather than the ceiling itself
+    assert len(set(sleeps)) > 1
+
+
+def test_post_is_not_retried_on_server_errors(stub, sleeps):
+    stub.script = [(503, {})]
+    client = HttpClient(max_retries=3, http2=False)
+    assert client.post(stub.url, json={}).status_code == 503
+    assert stub.methods == ["POST"]
+    assert client.retries == 0
+
+
+def test_post_is_retried_when_it_cannot_connect(sleeps):
+    client = HttpClient(max_retries=2, http2=False)
+    with pytest.raises(requests.ConnectionError):
+        client.post(unused_url(), json={})
+    assert client.retries == 2
+
+
+def test_post_is_not_retried_after_the_connection_drops(stub, sleeps, monkeypatch):
+    client = HttpClient(max_retries=3, http2=False)
+    calls = []
+
+    def dropped(*args, **kwargs):
+        calls.append(args)
+        raise requests.ConnectionError("Connection aborted.")
+
+    monkeypatch.setattr(client.session, "request", dropped)
+    with pytest.raises(requests.ConnectionError):
+        client.post(stub.url)
+    assert len(calls) == 1
+    with pytest.raises(requests.ConnectionError):
+        client.get(stub.url)
+    assert len(calls) == 5
+
+
+def test_opening_a_stream_is_retried(stub, sleeps):
+    stub.script = [(503, {}), (429, {"Retry-After": "1"})]
+    client = HttpClient(max_retries=3, http2=False)
+    retried = []
+    with client.stream("GET", stub.url, before_retry=lambda: retried.append(True)) as response:
+        assert response.status_code == 200
+        assert b"".join(http_client.iter_body(response)) == b"ok"
+    assert len(retried) == 2
+    assert sleeps[1] == 1.0
+
+
+def test_streamed_post_is_not_retried_on_server_errors(stub, sleeps):
+    stub.script = [(503, {})]
+    client = HttpClient(max_retries=3, http2=False)
+    with client.stream("POST", stub.url, json={}) as response:
+        assert response.status_code == 503
+    assert stub.methods == ["POST"]
+
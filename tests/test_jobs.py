@@ -0,0 +1,121 @@
+import sqlite3
+import threading
+import time
+
+import pytest
+
+import jobs
+from jobs import JobQueue
+
+
+@pytest.fixture
+def lookups(monkeypatch):
+    """Stand-in for get_dell_drivers that records its calls and waits for release."""
+    calls = []
+    release = threading.Event()
+
+    def fake_lookup(service_tag, log_callback=None, hedge=1, throttle=None):
+        calls.append(service_tag)
+        release.wait(5)
+        return 42
+
+    monkeypatch.setattr(jobs, "get_dell_drivers", fake_lookup)
+    return calls, release
+
+
+def insert_job(queue, job_id, status, heartbeat_at, owner="crashed-process"):
+    with queue.lock:
+        queue.conn.execute(
+            "INSERT INTO jobs (id, service_tag, status, owner, heartbeat_at, created_at, updated_at) "
+            "VALUES (?, 'ABC1234', ?, ?, ?, ?, ?)", (job_id, status, owner, heartbeat_at, heartbeat_at, heartbeat_at))
+        queue.conn.commit()
+
+
+def test_submit_shares_the_in_flight_job(tmp_path, lookups):
+    calls, release = lookups
+    queue = JobQueue(path=str(tmp_path / "jobs.db"), workers=2)
+    first = queue.submit("ABC1234")
+    second = queue.submit("ABC1234")
+    assert first == second
+    release.set()
+    assert queue.wait(first, timeout=5)["status"] == "done"
+    assert calls == ["ABC1234"]
+    # Once finished, a new lookup starts a new job
+    third = queue.submit("ABC1234")
+    assert third != first
+    assert queue.wait(third, timeout=5)["status"] == "done"
+
+
+def test_jobs_of_a_dead_process_are_run_again_at_startup(tmp_path, lookups):
+    calls, release = lookups
+    release.set()
+    path = str(tmp_path / "jobs.db")
+    queue = JobQueue(path=path, stale_after=30)
+    insert_job(queue, "orphan", "running", time.time() - 120)
+    restarted = JobQueue(path=path, stale_after=30)
+    job = restarted.wait("orphan", timeout=5)
+    assert job["status"] == "done"
+    assert job["owner"] == restarted.owner
+    assert calls == ["ABC1234"]
+
+
+def test_submit_takes_over_a_job_whose_heartbeat_stopped(tmp_path, lookups):
+    calls, release = lookups
+    release.set()
+    queue = JobQueue(path=str(tmp_path / "jobs.db"), heartbeat_interval=60, stale_after=1)
+    # Left running by a process that crashed moments ago, so startup recovery didn't catch it
+    insert_job(queue, "orphan", "running", time.time() - 0.5)
+    time.sleep(0.6)
+    assert queue.submit("ABC1234") == "orphan"
+    assert queue.wait("orphan", timeout=5)["status"] == "done"
+
+
+def test_live_jobs_keep_their_heartbeat(tmp_path, lookups):
+    calls, release = lookups
+    queue = JobQueue(path=str(tmp_path / "jobs.db"), heartbeat_interval=0.1, stale_after=0.5)
+    job_id = queue.submit("ABC1234")
+    time.sleep(1)
+    other = JobQueue(path=str(tmp_path / "jobs.db"), heartbeat_interval=0.1, stale_after=0.5)
+    assert other.recover() == []
+    assert queue.get(job_id)["owner"] == queue.owner
+    release.set()
+    assert queue.wait(job_id, timeout=5)["status"] == "done"
+    assert calls == ["ABC1234"]
+
+
+class RacingConnection:
+    """Connection whose first job insert loses to another process's job for the tag, which then finishes."""
+
+    def __init__(self, conn, path):
+        self.conn = conn
+        self.other = sqlite3.connect(path)
+        self.raced = False
+
+    def __getattr__(self, name):
+        return getattr(self.conn, name)
+
+    def execute(self, sql, *args):
+        if sql.startswith("INSERT INTO jobs") and not self.raced:
+            self.raced = True
+            now = time.time()
+            self.other.execute("INSERT INTO jobs (id, service_tag, status, created_at, updated_at) "
+                               "VALUES ('other-process', 'ABC1234', 'running', ?, ?)", (now, now))
+            self.other.commit()
+        return self.conn.execute(sql, *args)
+
+    def rollback(self):
+        self.conn.rollback()
+        self.other.execute("UPDATE jobs SET status = 'done' WHERE id = 'other-process'")
+        self.other.commit()
+
+def test_submit_queues_again_when_the_conflicting_job_already_finished(tmp_path, lookups):
+    calls, release = lookups
+    path = str(tmp_path / "jobs.db")
+    queue = JobQueue(path=path)
+    queue.conn = RacingConnection(queue.conn, path)
+    job_id = queue.submit("ABC1234")
+    assert queue.conn.raced
+    assert job_id != "other-process"
+    release.set()
+    assert queue.wait(job_id, timeout=5)["status"] == "done"
+    assert calls == ["ABC1234"]
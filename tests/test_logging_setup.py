@@ -0,0 +1,75 @@
+import json
+import logging
+import os
+import queue
+import time
+
+from logging_setup import DroppingQueueHandler, JsonFormatter, LookupContextFilter, PayloadDumps, lookup_context
+
+
+def record(message="Fetching drivers", **extra):
+    record = logging.makeLogRecord({"name": "dell.dell_api", "levelname": "INFO", "levelno": logging.INFO,
+                                    "msg": message})
+    for key, value in extra.items():
+        setattr(record, key, value)
+    return record
+
+
+# Function to format a record the way the file handler does, after the queue handler's filter
+def formatted(entry):
+    LookupContextFilter().filter(entry)
+    return json.loads(JsonFormatter().format(entry))
+
+
+def test_records_carry_the_lookup_correlation_id():
+    with lookup_context("ABC1234") as lookup_id:
+        entry = formatted(record(endpoint="driver-api"))
+    assert entry["lookup_id"] == lookup_id
+    assert entry["service_tag"] == "ABC1234"
+    assert entry["message"] == "Fetching drivers"
+    assert entry["endpoint"] == "driver-api"
+    assert "lookup_id" not in formatted(record())
+
+
+def test_nested_lookups_of_the_same_tag_keep_the_outer_id():
+    with lookup_context("ABC1234", lookup_id="job-1"):
+        with lookup_context("ABC1234") as inner:
+            assert inner == "job-1"
+        with lookup_context("DEF5678") as other:
+            assert other != "job-1"
+            assert formatted(record())["service_tag"] == "DEF5678"
+
+
+def test_full_queue_drops_records_instead_of_blocking():
+    handler = DroppingQueueHandler(queue.Queue(maxsize=2))
+    started = time.monotonic()
+    for index in range(5):
+        handler.emit(record(f"message {index}"))
+    assert time.monotonic() - started < 1
+    assert handler.queue.qsize() == 2
+    assert handler.dropped == 3
+
+
+def test_payloads_are_kept_for_a_sample_of_lookups(tmp_path):
+    assert not any(PayloadDumps(directory=str(tmp_path), sample_rate=0).sampled() for _ in range(50))
+    assert all(PayloadDumps(directory=str(tmp_path), sample_rate=1).sampled() for _ in range(50))
+
+
+def test_oldest_payloads_are_pruned(tmp_path):
+    dumps = PayloadDumps(directory=str(tmp_path), max_files=3, prune_every=1)
+    for index in range(5):
+        path = dumps.write(f"TAG{index}", "driver_api", b"{}")
+        os.utime(path, (1000 + index, 1000 + index))
+    assert sorted(os.listdir(tmp_path)) == ["TAG2_driver_api.json", "TAG3_driver_api.json",
+                                            "TAG4_driver_api.json"]
+
+
+def test_payloads_are_pruned_by_size(tmp_path):
+    dumps = PayloadDumps(directory=str(tmp_path), max_bytes=250, prune_every=100)
+    for index in range(4):
+        path = dumps.write(f"TAG{index}", "driver_api", b"x" * 100)
+        os.utime(path, (1000 + index, 1000 + index))
+    # Pruning waits for every prune_every-th write
+    assert len(os.listdir(tmp_path)) == 4
+    assert dumps.prune() == 2
+    assert sorted(os.listdir(tmp_path)) == ["TAG2_driver_api.json", "TAG3_driver_api.json"]
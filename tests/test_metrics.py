@@ -0,0 +1,62 @@
+from contextlib import nullcontext
+
+import pytest
+from prometheus_client import REGISTRY
+
+import metrics
+from metrics import LOOKUPS_IN_FLIGHT, instrumented_lookup, render_metrics, span, timed
+
+
+# Function to read how many observations a histogram has for some labels
+def observations(name, **labels):
+    return REGISTRY.get_sample_value(f"{name}_count", labels) or 0
+
+
+def test_span_is_a_no_op_without_opentelemetry(monkeypatch):
+    monkeypatch.setattr(metrics, "_tracer", None)
+    with span("get_dell_drivers", service_tag="ABC1234") as current:
+        assert current is None
+
+
+def test_span_uses_the_tracer_when_available(monkeypatch):
+    started = []
+
+    class Tracer:
+        def start_as_current_span(self, name, attributes=None):
+            started.append((name, attributes))
+            return nullcontext("span")
+
+    monkeypatch.setattr(metrics, "_tracer", Tracer())
+    with span("ollama_chat", model="llama3") as current:
+        assert current == "span"
+    assert started == [("ollama_chat", {"model": "llama3"})]
+
+
+def test_timed_observes_the_stage_even_when_it_fails():
+    before = observations("dell_stage_duration_seconds", stage="test_stage")
+    with timed("test_stage"):
+        pass
+    with pytest.raises(RuntimeError):
+        with timed("test_stage"):
+            raise RuntimeError("failed")
+    assert observations("dell_stage_duration_seconds", stage="test_stage") == before + 2
+
+
+def test_lookups_are_counted_by_outcome():
+    @instrumented_lookup
+    def lookup(service_tag, fail=False):
+        assert LOOKUPS_IN_FLIGHT._value.get() >= 1
+        if fail:
+            raise ValueError(service_tag)
+        return 7
+
+    ok_before = observations("dell_lookup_duration_seconds", outcome="ok")
+    error_before = observations("dell_lookup_duration_seconds", outcome="error")
+    assert lookup("ABC1234") == 7
+    with pytest.raises(ValueError):
+        lookup("ABC1234", fail=True)
+    assert observations("dell_lookup_duration_seconds", outcome="ok") == ok_before + 1
+    assert observations("dell_lookup_duration_seconds", outcome="error") == error_before + 1
+    body, content_type = render_metrics()
+    assert b"dell_lookup_duration_seconds_count" in body
+    assert content_type.startswith("text/plain")
@@ -0,0 +1,128 @@
+import socket
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+import pytest
+
+import ollama_chat
+import retrieval
+import summaries
+from ollama_chat import ChatSession, StreamStats
+from ollama_pool import OllamaPool
+
+QUESTION = "What does the newest network driver fix?"
+
+
+@pytest.fixture
+def chat(dell, monkeypatch):
+    """A stored lookup to chat about, with the stand-in's Ollama API as the only backend."""
+    for module in (ollama_chat, retrieval, summaries):
+        monkeypatch.setattr(module, "get_store", lambda: dell.store)
+    monkeypatch.setattr(retrieval, "_index_cache", OrderedDict())
+    dell.server.chat_tokens = 5
+    dell.server.token_delay = 0.01
+    dell.fetch_id = dell.lookup("ABC1234")
+
+    def session(servers=None, **kwargs):
+        servers = servers or dell.server.base_url
+        return ChatSession(dell.fetch_id, server=servers, pool=OllamaPool(servers=servers), **kwargs)
+
+    dell.session = session
+    return dell
+
+
+# Function to get a local Ollama URL nothing listens on
+def unused_url():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    return f"http://127.0.0.1:{port}"
+
+
+def test_tokens_are_yielded_as_they_arrive(chat):
+    chat.server.token_delay = 0.1
+    session = chat.session(answer_cache=False)
+    stats = StreamStats()
+    arrivals = []
+    for token in session.stream(QUESTION, stats=stats):
+        arrivals.append((time.monotonic(), token))
+    assert [token for _, token in arrivals] == [f"token{index} " for index in range(5)]
+    # The first token is handed over long before the last one is written
+    assert arrivals[-1][0] - arrivals[0][0] >= 0.3
+    assert stats.tokens == 5
+
+
+def test_stats_report_first_token_and_prompt_eval(chat):
+    session = chat.session(answer_cache=False)
+    stats = StreamStats()
+    "".join(session.stream(QUESTION, stats=stats))
+    assert stats.time_to_first_token >= chat.server.first_token_delay
+    assert stats.eval_count == 5
+    assert stats.prompt_eval_count > 0
+    assert stats.server == chat.server.base_url
+    summary = stats.summary()
+    assert "first token" in summary
+    assert f"prompt eval {stats.prompt_eval_count} tokens" in summary
+
+
+def test_cancel_event_stops_the_stream(chat):
+    chat.server.chat_tokens = 50
+    chat.server.token_delay = 0.05
+    session = chat.session()
+    stats = StreamStats()
+    cancel_event = threading.Event()
+    tokens = []
+    for token in session.stream(QUESTION, stats=stats, cancel_event=cancel_event):
+        tokens.append(token)
+        cancel_event.set()
+    assert len(tokens) < 50
+    assert stats.cancelled
+    # A stopped answer is kept in the conversation but never cached
+    assert session.history[-1]["content"] == "".join(tokens)
+    assert chat.store.get_answer(session.content_hash, summaries.normalize_question(QUESTION), session.model) is None
+
+
+def test_closing_the_generator_stops_the_stream(chat):
+    chat.server.chat_tokens = 50
+    chat.server.token_delay = 0.05
+    session = chat.session()
+    stats = StreamStats()
+    tokens = session.stream(QUESTION, stats=stats)
+    assert next(tokens) == "token0 "
+    tokens.close()
+    assert stats.cancelled
+    assert stats.finished_at is not None
+    assert session.history == []
+
+
+def test_a_dead_backend_fails_over_before_the_first_token(chat):
+    dead = unused_url()
+    session = chat.session(servers=f"{dead},{chat.server.base_url}", answer_cache=False)
+    stats = StreamStats()
+    assert "".join(session.stream(QUESTION, stats=stats)).startswith("token0")
+    assert stats.server == chat.server.base_url
+    # The failed backend is put into backoff, so the next turn skips it
+    assert session.pool.ranked(servers=session.server) == [chat.server.base_url]
+
+
+def test_earlier_turns_are_resent_unchanged(chat):
+    session = chat.session(answer_cache=False)
+    "".join(session.stream(QUESTION))
+    "".join(session.stream("Why does that fix matter?"))
+    first, second = chat.server.chats
+    assert second[:len(first)] == first
+    assert second[len(first)]["role"] == "assistant"
+    assert second[len(first)]["content"] == "".join(f"token{index} " for index in range(5))
+    assert second[-1]["content"].endswith("Why does that fix matter?")
+
+
+def test_failing_to_cache_an_answer_keeps_the_reply(chat, monkeypatch):
+    def locked(*args):
+        raise sqlite3.OperationalError("database is locked")
+
+    monkeypatch.setattr(chat.store, "save_answer", locked)
+    session = chat.session()
+    assert "".join(session.stream(QUESTION)) == "".join(f"token{index} " for index in range(5))
+    assert len(session.history) == 2
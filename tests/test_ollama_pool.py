@@ -0,0 +1,24 @@
+from metrics import OLLAMA_OUTSTANDING
+from ollama_pool import OllamaPool
+
+
+def test_unconfigured_backends_share_one_metric_label():
+    pool = OllamaPool(servers="http://gpu1:11434")
+    pool.add("http://typed-in:11434")
+    assert pool.metric_label("http://gpu1:11434") == "http://gpu1:11434"
+    assert pool.metric_label("http://typed-in:11434") == "other"
+
+    before = OLLAMA_OUTSTANDING.labels("other")._value.get()
+    with pool.request("http://typed-in:11434"), pool.request("http://another:11434"):
+        assert OLLAMA_OUTSTANDING.labels("other")._value.get() == before + 2
+    assert OLLAMA_OUTSTANDING.labels("other")._value.get() == before
+
+
+def test_models_of_backends_in_backoff_are_not_listed():
+    pool = OllamaPool(servers="http://gpu1:11434,http://gpu2:11434")
+    pool.backends["http://gpu1:11434"]["models"] = ["llama3:latest"]
+    pool.backends["http://gpu2:11434"]["models"] = ["mistral:latest"]
+    assert pool.models() == ["llama3", "mistral"]
+
+    pool.record("http://gpu2:11434", False, error="connection refused")
+    assert pool.models() == ["llama3"]
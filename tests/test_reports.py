@@ -0,0 +1,93 @@
+import csv
+import io
+import zipfile
+
+import pytest
+
+import reports
+from conftest import make_result
+from reports import REPORT_COLUMNS, REPORT_FORMATS, RenderCache, iter_report, render_result
+
+
+def drivers(version="1.0"):
+    return [{"name": "System BIOS", "category": "BIOS", "version": version, "release_date": "2024-01-10"},
+            {"name": "Intel Wi-Fi <AX211>", "category": "Network", "version": "23.0", "release_date": "2024-02-01"}]
+
+
+@pytest.fixture
+def render_cache(monkeypatch):
+    cache = RenderCache()
+    monkeypatch.setattr(reports, "_render_cache", cache)
+    return cache
+
+
+@pytest.fixture
+def fleet(store):
+    store.save_result(make_result(service_tag="ABC1234", drivers=drivers()))
+    store.save_result(make_result(service_tag="DEF5678", drivers=drivers("1.2"), product_name="OptiPlex 7010"))
+    return store
+
+
+def test_csv_report_has_a_row_per_stored_driver(fleet):
+    text = b"".join(iter_report(fleet.iter_latest(), "csv")).decode("utf-8")
+    rows = list(csv.reader(io.StringIO(text)))
+    assert rows[0] == REPORT_COLUMNS
+    assert len(rows) == 5
+    assert {(row[0], row[1]) for row in rows[1:]} == {("ABC1234", "Latitude 5440"), ("DEF5678", "OptiPlex 7010")}
+    assert ["DEF5678", "OptiPlex 7010", "2024-05-01 10:00:00", "System BIOS", "BIOS", "1.2"] == rows[3][:6]
+
+
+def test_html_report_escapes_driver_fields(fleet):
+    html = b"".join(iter_report(fleet.iter_latest(), "html")).decode("utf-8")
+    assert "OptiPlex 7010" in html
+    assert "Intel Wi-Fi &lt;AX211&gt;" in html
+    assert "<AX211>" not in html
+
+
+@pytest.mark.skipif("xlsx" not in REPORT_FORMATS, reason="xlsxwriter is not installed")
+def test_xlsx_report_is_a_workbook_of_stored_drivers(fleet):
+    data = b"".join(iter_report(fleet.iter_latest(), "xlsx"))
+    with zipfile.ZipFile(io.BytesIO(data)) as workbook:
+        names = workbook.namelist()
+        assert "xl/worksheets/sheet1.xml" in names
+        strings = workbook.read("xl/sharedStrings.xml").decode("utf-8") if "xl/sharedStrings.xml" in names else ""
+        sheet = workbook.read("xl/worksheets/sheet1.xml").decode("utf-8")
+    # constant_memory mode writes strings inline rather than to the shared table
+    assert "DEF5678" in sheet + strings
+    assert 'ref="A1:' in sheet
+
+
+def test_unknown_formats_are_rejected(fleet):
+    with pytest.raises(ValueError):
+        list(iter_report(fleet.iter_latest(), "pdf"))
+    with pytest.raises(ValueError):
+        render_result(make_result(drivers=drivers()), "pdf")
+
+
+def test_rendered_results_are_cached_by_content(render_cache, monkeypatch):
+    result = make_result(drivers=drivers())
+    markdown = render_result(result, "md")
+    assert "System BIOS" in markdown
+    assert len(render_cache.entries) == 1
+
+    # The same content is served from the cache without rendering again
+    environment = reports._environment
+    monkeypatch.setattr(reports, "_environment", None)
+    assert render_result(make_result(drivers=drivers()), "md") is markdown
+    monkeypatch.setattr(reports, "_environment", environment)
+
+    # Changed drivers or another format are rendered afresh
+    assert "1.5" in render_result(make_result(drivers=drivers("1.5")), "md")
+    assert render_result(result, "html") != markdown
+    assert len(render_cache.entries) == 3
+
+
+def test_render_cache_drops_least_recently_used_entries():
+    cache = RenderCache(max_chars=10)
+    cache.put("a", "12345")
+    cache.put("b", "12345")
+    assert cache.get("a") == "12345"
+    cache.put("c", "12345")
+    assert cache.get("b") is None
+    assert cache.get("a") == "12345"
+    assert cache.size == 10
@@ -0,0 +1,55 @@
+from collections import OrderedDict
+
+import pytest
+
+import retrieval
+from conftest import make_result
+from retrieval import BM25Index, EmbeddingIndex, build_driver_context, get_index
+
+
+@pytest.fixture
+def fetch_id(store, tmp_path, monkeypatch):
+    # Embedding vectors are saved under data/index relative to the working directory
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(retrieval, "get_store", lambda: store)
+    monkeypatch.setattr(retrieval, "_index_cache", OrderedDict())
+    monkeypatch.setattr(retrieval, "_embedding_failures", {})
+    drivers = [{"name": f"Driver {number}", "category": "Audio" if number == 7 else "Chipset", "version": "1.0"}
+               for number in range(20)]
+    fetch_id, _ = store.save_snapshot(make_result(drivers=drivers))
+    return fetch_id
+
+
+def fake_embedding(self, text):
+    return [1.0, float(len(text))]
+
+
+def test_failed_embeddings_fall_back_to_bm25_until_the_retry_time(fetch_id, monkeypatch):
+    def unavailable(self, text):
+        raise ConnectionError("Ollama is down")
+
+    monkeypatch.setattr(EmbeddingIndex, "_embed", unavailable)
+    _, index = get_index(fetch_id, method="embeddings", server="http://ollama:11434")
+    assert isinstance(index, BM25Index)
+    # The fallback is cached as the BM25 index, not as the embedding index
+    assert get_index(fetch_id)[1] is index
+    assert (fetch_id, "embeddings", "nomic-embed-text") not in retrieval._index_cache
+
+    monkeypatch.setattr(EmbeddingIndex, "_embed", fake_embedding)
+    assert isinstance(get_index(fetch_id, method="embeddings", server="http://ollama:11434")[1], BM25Index)
+    monkeypatch.setattr(retrieval, "EMBEDDING_RETRY_AFTER", 0)
+    assert isinstance(get_index(fetch_id, method="embeddings", server="http://ollama:11434")[1], EmbeddingIndex)
+
+
+def test_query_embedding_failure_answers_from_bm25(fetch_id, monkeypatch):
+    monkeypatch.setattr(EmbeddingIndex, "_embed", fake_embedding)
+    assert isinstance(get_index(fetch_id, method="embeddings", server="http://ollama:11434")[1], EmbeddingIndex)
+
+    def unavailable(self, text):
+        raise ConnectionError("Ollama is down")
+
+    monkeypatch.setattr(EmbeddingIndex, "_embed", unavailable)
+    context = build_driver_context(fetch_id, "audio driver", top_k=3, method="embeddings",
+                                   server="http://ollama:11434")
+    assert "### Driver 7" in context
+    assert isinstance(get_index(fetch_id, method="embeddings", server="http://ollama:11434")[1], BM25Index)
@@ -0,0 +1,85 @@
+import json
+
+import store as store_module
+from conftest import make_result
+
+
+def driver(name, version, category="BIOS", release_date="2024-01-10"):
+    return {"name": name, "category": category, "version": version, "release_date": release_date}
+
+
+def test_snapshots_are_diffed_against_the_previous_one(store):
+    first, _ = store.save_snapshot(make_result(drivers=[driver("BIOS", "1.0"), driver("Audio", "2.0", "Audio")],
+                                               timestamp="2024-05-01T10:00:00"))
+    second, summary = store.save_snapshot(make_result(
+        drivers=[driver("BIOS", "1.1", release_date="2024-04-02"), driver("Chipset", "3.0", "Chipset")],
+        timestamp="2024-05-02T10:00:00"))
+    assert second != first
+    assert summary == {"added": 1, "updated": 1, "removed": 1, "unchanged": False}
+    changes = {change["change"]: change for change in store.changes(service_tag="ABC1234")}
+    assert changes["updated"]["old_version"] == "1.0" and changes["updated"]["new_version"] == "1.1"
+    assert changes["added"]["name"] == "Chipset"
+    assert changes["removed"]["name"] == "Audio"
+
+
+def test_unchanged_snapshot_only_marks_the_previous_fetch_checked(store):
+    drivers = [driver("BIOS", "1.0")]
+    first, _ = store.save_snapshot(make_result(drivers=drivers, timestamp="2024-05-01T10:00:00"))
+    again, summary = store.save_snapshot(make_result(drivers=drivers, timestamp="2024-05-02T10:00:00"))
+    assert again == first
+    assert summary["unchanged"]
+    assert store.get_result(first)["last_checked"] == "2024-05-02T10:00:00"
+    assert store.changes(service_tag="ABC1234") == []
+
+
+def test_placeholders_are_never_diffed(store):
+    drivers = [driver("BIOS", "1.0")]
+    first, _ = store.save_snapshot(make_result(drivers=drivers, timestamp="2024-05-01T10:00:00"))
+    placeholder, summary = store.save_snapshot(make_result(drivers=[], drivers_found=False,
+                                                           timestamp="2024-05-02T10:00:00"))
+    assert placeholder != first
+    assert summary == {"added": 0, "updated": 0, "removed": 0, "unchanged": False}
+    assert store.drivers_found(placeholder) is False
+
+    # The real drivers come back unchanged: stored again so they, not the placeholder, are the latest fetch
+    latest, summary = store.save_snapshot(make_result(drivers=drivers, timestamp="2024-05-03T10:00:00"))
+    assert latest not in (first, placeholder)
+    assert store.latest_fetch_id("ABC1234") == latest
+    assert store.changes(service_tag="ABC1234") == []
+
+
+def write_result_file(directory, result):
+    path = directory / f"{result['service_tag']}_{result['timestamp'].replace(':', '')}.json"
+    path.write_text(json.dumps(result), encoding="utf-8")
+
+
+def test_json_files_are_imported_once_as_snapshots(store, tmp_path):
+    directory = tmp_path / "json"
+    directory.mkdir()
+    write_result_file(directory, make_result(drivers=[driver("BIOS", "1.0")], timestamp="2024-05-01T10:00:00"))
+    write_result_file(directory, make_result(drivers=[driver("BIOS", "1.0")], timestamp="2024-05-02T10:00:00"))
+    write_result_file(directory, make_result(drivers=[driver("BIOS", "1.1")], timestamp="2024-05-03T10:00:00"))
+    (directory / "notes.txt").write_text("not a result")
+    (directory / "broken.json").write_text("{")
+
+    assert store.import_json_directory(str(directory)) == 3
+    # The unchanged second file only re-checked the first snapshot
+    assert [change["change"] for change in store.changes(service_tag="ABC1234")] == ["updated"]
+    latest = store.latest("ABC1234")
+    assert latest["timestamp"] == "2024-05-03T10:00:00"
+    assert latest["drivers"][0]["version"] == "1.1"
+
+    # Importing the same directory again adds nothing
+    assert store.import_json_directory(str(directory)) == 0
+    assert len(store.changes(service_tag="ABC1234")) == 1
+    assert store.import_json_directory(str(tmp_path / "missing")) == 0
+
+
+def test_import_command(store, tmp_path, monkeypatch, capsys):
+    directory = tmp_path / "json"
+    directory.mkdir()
+    write_result_file(directory, make_result(drivers=[driver("BIOS", "1.0")]))
+    monkeypatch.setattr(store_module, "get_store", lambda: store)
+    assert store_module.main(["import", str(directory)]) == 0
+    assert "Imported 1 result files" in capsys.readouterr().out
+    assert store.list_tags() == ["ABC1234"]
@@ -0,0 +1,79 @@
+import pytest
+
+from conftest import make_result
+from summaries import answer_question, build_summary, normalize_question
+
+DRIVERS = [
+    {"name": "Dell BIOS", "category": "BIOS", "version": "1.20.0", "release_date": "10 Mar 2024",
+     "importance": "Urgent", "download_url": "https://dl.dell.com/bios-1.20.0.exe"},
+    {"name": "Dell BIOS", "category": "BIOS", "version": "1.18.1", "release_date": "02 Jan 2024",
+     "importance": "Recommended"},
+    {"name": "Intel Wi-Fi", "category": "Network", "version": "23.40", "release_date": "15 Feb 2024",
+     "importance": "Recommended"},
+    {"name": "Realtek Audio", "category": "Audio", "version": "6.0.9", "release_date": "01 Dec 2023",
+     "importance": "Optional"},
+]
+
+
+@pytest.fixture
+def summary():
+    return build_summary(make_result(drivers=DRIVERS))
+
+
+def test_latest_in_category(summary):
+    answer = answer_question(summary, "What's the latest BIOS?")
+    assert "Dell BIOS 1.20.0" in answer
+    assert "bios-1.20.0.exe" in answer
+
+
+def test_urgent_updates(summary):
+    answer = answer_question(summary, "Which updates are urgent?")
+    assert "Urgent updates (1)" in answer
+    assert "1.18.1" not in answer
+
+
+def test_count(summary):
+    assert answer_question(summary, "How many drivers are there?").startswith("There are 4 drivers in 3 categories")
+
+
+@pytest.mark.parametrize("question", ["list drivers", "Show all drivers", "give me the list of drivers",
+                                      "list the updates"])
+def test_list_without_category_lists_every_category(summary, question):
+    answer = answer_question(summary, question)
+    assert answer
+    for category in ("Audio", "BIOS", "Network"):
+        assert f"**{category} drivers" in answer
+
+
+def test_list_one_category(summary):
+    answer = answer_question(summary, "list network drivers")
+    assert "Intel Wi-Fi" in answer
+    assert "Dell BIOS" not in answer
+
+
+def test_other_questions_go_to_the_model(summary):
+    assert answer_question(summary, "How do I install the BIOS update safely?") is None
+    assert answer_question(summary, "hello") is None
+
+
+def test_placeholder_results_are_never_answered():
+    placeholder = build_summary(make_result(drivers=[{"name": "Dell Support Website", "category": "Support"}],
+                                            drivers_found=False))
+    assert answer_question(placeholder, "list drivers") is None
+
+
+def test_normalized_questions_ignore_case_punctuation_and_spacing():
+    assert normalize_question("What's the  newest BIOS?") == normalize_question("what s the newest bios")
+
+
+def test_normalized_questions_keep_every_word_in_order():
+    assert (normalize_question("Is the BIOS newer than the chipset?")
+            != normalize_question("Is the chipset newer than the BIOS?"))
+    assert normalize_question("upgrade from 1.2 to 1.5") != normalize_question("upgrade from 1.5 to 1.2")
+    assert normalize_question("latest BIOS version") != normalize_question("latest BIOS")
+
+
+def test_answer_cache_is_kept_per_model(store):
+    store.save_answer("hash", "latest", "llama3 answer", "llama3")
+    assert store.get_answer("hash", "latest", "llama3") == "llama3 answer"
+    assert store.get_answer("hash", "latest", "mistral") is None